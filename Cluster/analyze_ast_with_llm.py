@@ -1,9 +1,12 @@
 import json
 import os
 import re
+import glob
 import logging
+import argparse
 import requests
-from typing import Dict, Any, List
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Any, List, Optional
 
 # Configure logging
 logging.basicConfig(
@@ -12,69 +15,144 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+# One alternation classifies every line: a newline and the leading
+# whitespace, then an import, class, method call/definition or decorator
+# line. Anchoring on a literal newline lets the regex engine skip straight
+# to line starts, and the (?=(...))\1 groups match the indentation and the
+# method name without backtracking into them.
+LINE_PATTERN = re.compile(
+    r"\n(?=(?P<indent>\s*))(?P=indent)(?:"
+    r"(?P<import>import.*)"
+    r"|(?P<class>class.*)"
+    r"|(?P<method>(?=(?P<method_name>\w+))(?P=method_name)\([^)\n]*\).*)"
+    r"|(?P<decorator>@.*)"
+    r")"
+)
+IMPORT_SOURCE_PATTERN = re.compile(r'from\s+[\'"](.+?)[\'"]')
+CLASS_NAME_PATTERN = re.compile(r'class\s+(\w+)')
+
+# File patterns used when batch mode is given a directory
+TYPESCRIPT_GLOBS = ('**/*.ts', '**/*.tsx')
+
 def parse_typescript_to_ast(content: str) -> Dict[str, Any]:
     """
     Parse TypeScript content into a simplified AST structure.
+    
+    Lines are classified in a single pass of LINE_PATTERN over the content.
+    Method lines are attached to the most recent class; before the first
+    class they are ignored.
     """
     ast = {
         "type": "Program",
         "body": []
     }
-    
-    # Split content into lines for analysis
-    lines = content.split('\n')
+    body = ast["body"]
     current_node = None
     
-    for line in lines:
-        line = line.strip()
+    # The leading newline lets the first line match like the others
+    for match in LINE_PATTERN.finditer('\n' + content):
+        kind = match.lastgroup
         
-        # Skip empty lines
-        if not line:
-            continue
-            
         # Detect imports
-        if line.startswith('import'):
-            node = {
+        if kind == 'import':
+            line = match.group('import').rstrip()
+            body.append({
                 "type": "ImportDeclaration",
                 "text": line,
-                "source": re.findall(r'from\s+[\'"](.+?)[\'"]', line)
-            }
-            ast["body"].append(node)
+                "source": IMPORT_SOURCE_PATTERN.findall(line)
+            })
             
         # Detect class declarations
-        elif line.startswith('class'):
-            class_name = re.findall(r'class\s+(\w+)', line)
-            node = {
+        elif kind == 'class':
+            line = match.group('class').rstrip()
+            class_name = CLASS_NAME_PATTERN.search(line)
+            current_node = {
                 "type": "ClassDeclaration",
-                "name": class_name[0] if class_name else "Unknown",
+                "name": class_name.group(1) if class_name else "Unknown",
                 "text": line,
                 "methods": [],
                 "properties": []
             }
-            current_node = node
-            ast["body"].append(node)
+            body.append(current_node)
             
         # Detect methods within classes
-        elif re.match(r'\s*\w+\([^)]*\)', line) and current_node and current_node["type"] == "ClassDeclaration":
-            method_name = re.findall(r'(\w+)\s*\(', line)
-            node = {
-                "type": "MethodDeclaration",
-                "name": method_name[0] if method_name else "Unknown",
-                "text": line,
-                "isAsync": "async" in line
-            }
-            current_node["methods"].append(node)
+        elif kind == 'method':
+            if current_node is not None:
+                line = match.group('method').rstrip()
+                current_node["methods"].append({
+                    "type": "MethodDeclaration",
+                    "name": match.group('method_name'),
+                    "text": line,
+                    "isAsync": "async" in line
+                })
             
         # Detect decorators
-        elif line.startswith('@'):
-            node = {
+        else:
+            body.append({
                 "type": "Decorator",
-                "text": line
-            }
-            ast["body"].append(node)
+                "text": match.group('decorator').rstrip()
+            })
     
     return ast
 
+def find_typescript_files(source: str) -> List[str]:
+    """
+    Expand a directory (searched recursively for .ts/.tsx files) or a glob pattern.
+    
+    Args:
+        source: Directory path or glob pattern (** is recursive)
+        
+    Returns:
+        Sorted list of file paths
+    """
+    if os.path.isdir(source):
+        paths = set()
+        for pattern in TYPESCRIPT_GLOBS:
+            paths.update(glob.glob(os.path.join(source, pattern), recursive=True))
+    else:
+        paths = set(glob.glob(source, recursive=True))
+    return sorted(path for path in paths if os.path.isfile(path))
+
+def _parse_file(path: str) -> Dict[str, Any]:
+    """
+    Parse one file for batch mode (process-pool entry point).
+    """
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            content = f.read()
+    except (OSError, UnicodeDecodeError) as e:
+        return {"file": path, "error": str(e)}
+    return {"file": path, "ast": parse_typescript_to_ast(content)}
+
+def parse_typescript_files(paths: List[str], output_file: str, workers: Optional[int] = None,
+                           chunksize: int = 64) -> Dict[str, int]:
+    """
+    Parse many TypeScript files across a process pool and write the ASTs as JSONL.
+    
+    Each output line is {"file": path, "ast": ...}, or {"file": path,
+    "error": ...} for unreadable files, in the order of paths.
+    
+    Args:
+        paths: Files to parse
+        output_file: JSONL file to write
+        workers: Number of processes (None for one per CPU)
+        chunksize: Files handed to a worker at a time
+        
+    Returns:
+        Dictionary with the number of parsed and failed files
+    """
+    counts = {"parsed": 0, "failed": 0}
+    with open(output_file, 'w', encoding='utf-8') as out, \
+            ProcessPoolExecutor(max_workers=workers) as executor:
+        for record in executor.map(_parse_file, paths, chunksize=chunksize):
+            if "error" in record:
+                counts["failed"] += 1
+                logger.warning(f"Failed to read {record['file']}: {record['error']}")
+            else:
+                counts["parsed"] += 1
+            out.write(json.dumps(record) + "\n")
+    return counts
+
 def analyze_ast_with_llm(ast: Dict[str, Any], api_key: str) -> Dict[str, Any]:
     """
     Send the AST to Fireworks.ai API for analysis.
@@ -130,6 +208,23 @@ Provide a detailed technical analysis with specific examples from the AST.
         return None
 
 def main():
+    parser = argparse.ArgumentParser(description='Parse TypeScript into simplified ASTs and analyze them with an LLM')
+    parser.add_argument('--batch', default=None,
+                        help='Directory or glob of TypeScript files to parse into JSONL (skips the LLM analysis)')
+    parser.add_argument('--output', default='typescript_asts.jsonl', help='JSONL output for --batch')
+    parser.add_argument('--workers', type=int, default=None, help='Processes for --batch (default: one per CPU)')
+    args = parser.parse_args()
+    
+    if args.batch:
+        paths = find_typescript_files(args.batch)
+        if not paths:
+            logger.error(f"No TypeScript files found for {args.batch}")
+            return
+        logger.info(f"Parsing {len(paths)} files with {args.workers or os.cpu_count()} workers...")
+        counts = parse_typescript_files(paths, args.output, args.workers)
+        logger.info(f"Saved {counts['parsed']} ASTs to {args.output} ({counts['failed']} files failed)")
+        return
+    
     # Read c0.txt
     try:
         with open('c0.txt', 'r', encoding='utf-8') as f:
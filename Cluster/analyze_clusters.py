@@ -1,6 +1,21 @@
+"""
+Analyze cluster_details.json for data sinks.
+
+Run from the repository root, either as python -m Cluster.analyze_clusters
+or as python Cluster/analyze_clusters.py.
+"""
 import json
 import os
-from cluster_data_sink_analyzer import ClusterDataSinkAnalyzer
+import sys
+import argparse
+
+if __package__ in (None, ''):
+    # Started as a script: import the shared modules and this package from the repository root
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    __package__ = 'Cluster'
+
+from llm_cache import DEFAULT_CACHE_PATH
+from .cluster_data_sink_analyzer import ClusterDataSinkAnalyzer
 
 # You should set this as an environment variable in production
 FIREWORKS_API_KEY = "YOUR_FIREWORKS_API_KEY"  
@@ -11,13 +26,27 @@ def load_cluster_data(file_path):
         return json.load(f)
 
 def main():
+    parser = argparse.ArgumentParser(description='Analyze code clusters for data sink services')
+    parser.add_argument('--cache-file', default=DEFAULT_CACHE_PATH, help='SQLite file for cached API responses')
+    parser.add_argument('--no-cache', action='store_true', help='Always call the API instead of using cached responses')
+    parser.add_argument('--cache-max-entries', type=int, default=None,
+                        help='Evict least recently used cached responses beyond this many entries')
+    parser.add_argument('--cache-max-bytes', type=int, default=None,
+                        help='Evict least recently used cached responses beyond this total size in bytes')
+    parser.add_argument('--cache-ttl', type=float, default=None, metavar='SECONDS',
+                        help='Expire cached responses after this many seconds')
+    args = parser.parse_args()
+    
     # Check if API key is provided
     if FIREWORKS_API_KEY == "YOUR_FIREWORKS_API_KEY":
         print("Please set your Fireworks API key in the script or as an environment variable.")
         return
     
     # Create the analyzer
-    analyzer = ClusterDataSinkAnalyzer(api_key=FIREWORKS_API_KEY)
+    analyzer = ClusterDataSinkAnalyzer(api_key=FIREWORKS_API_KEY,
+                                       cache_path=None if args.no_cache else args.cache_file,
+                                       cache_max_entries=args.cache_max_entries,
+                                       cache_max_bytes=args.cache_max_bytes, cache_ttl=args.cache_ttl)
     
     # Sample cluster data - in practice, this would come from your AST analysis
     # clusters = [
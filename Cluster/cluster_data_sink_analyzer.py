@@ -1,24 +1,42 @@
-import requests
 import json
 import os
 import time
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional
+
+# Shared helpers live in the repository root; run from there with python -m Cluster.<module>
+from llm_cache import ResponseCache
+from llm_client import FIREWORKS_COMPLETIONS_URL, CompletionError, RetryScheduler, post_completion
 
 class ClusterDataSinkAnalyzer:
-    def __init__(self, api_key: str, model: str = "accounts/fireworks/models/deepseek-r1"):
+    def __init__(self, api_key: str, model: str = "accounts/fireworks/models/deepseek-r1",
+                 cache_path: Optional[str] = None, max_attempts: int = 5, retry_budget: int = 50,
+                 cache_max_entries: Optional[int] = None, cache_max_bytes: Optional[int] = None,
+                 cache_ttl: Optional[float] = None):
         """
         Initialize the analyzer with Fireworks API credentials.
         
         Args:
             api_key: Fireworks.ai API key
             model: Model ID to use for analysis
+            cache_path: SQLite file for the response cache (None disables caching)
+            max_attempts: Maximum API attempts per cluster
+            retry_budget: Total API retries allowed per run
+            cache_max_entries: Evict least recently used responses beyond this count (None for no limit)
+            cache_max_bytes: Evict least recently used responses beyond this total size (None for no limit)
+            cache_ttl: Expire cached responses after this many seconds (None for no expiry)
         """
         self.api_key = api_key
         self.model = model
+        self.cache = ResponseCache(cache_path, max_entries=cache_max_entries, max_bytes=cache_max_bytes,
+                                   ttl=cache_ttl) if cache_path else None
+        self.last_request_sent = False
+        self.max_attempts = max_attempts
+        self.retry_budget = retry_budget
         self.headers = {
             "Authorization": f"Bearer {self.api_key}",
             "Content-Type": "application/json"
         }
+        self.base_url = FIREWORKS_COMPLETIONS_URL
         self.results = []
     
     def generate_cluster_prompt(self, cluster_data: Dict[str, Any]) -> str:
@@ -129,15 +147,39 @@ Provide specific technical details where possible, focusing on identifying the m
         Returns:
             Dictionary with analysis results
         """
+        try:
+            return self._analyze_cluster_once(cluster_data)
+        except CompletionError as e:
+            return self._build_result(cluster_data, str(e))
+    
+    def _analyze_cluster_once(self, cluster_data: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Make a single completion attempt for a cluster.
+        
+        Args:
+            cluster_data: Dictionary containing cluster information
+            
+        Returns:
+            Dictionary with analysis results
+            
+        Raises:
+            RetryableError: If the request was throttled or hit a transient error
+            CompletionError: If the request failed otherwise
+        """
+        self.last_request_sent = False
+        
         # Generate the prompt
         prompt = self.generate_cluster_prompt(cluster_data)
         
-        # Call the API
-        try:
-            response = requests.post(
-                "https://api.fireworks.ai/inference/v1/completions",
-                headers=self.headers,
-                json={
+        # Reuse a cached response for an identical request
+        analysis = self.cache.get(self.model, prompt, 1024, 0.2) if self.cache else None
+        if analysis is None:
+            # Call the API
+            self.last_request_sent = True
+            analysis = post_completion(
+                self.base_url,
+                self.headers,
+                {
                     "model": self.model,
                     "prompt": prompt,
                     "max_tokens": 1024,
@@ -145,16 +187,15 @@ Provide specific technical details where possible, focusing on identifying the m
                 },
                 timeout=30
             )
-            
-            if response.status_code == 200:
-                result = response.json()
-                analysis = result['choices'][0]['text']
-            else:
-                analysis = f"Error: {response.status_code}\n{response.text}"
-        except Exception as e:
-            analysis = f"Exception during API call: {str(e)}"
-        
-        # Return the results
+            if self.cache:
+                self.cache.put(self.model, prompt, 1024, 0.2, analysis)
+        
+        return self._build_result(cluster_data, analysis)
+    
+    def _build_result(self, cluster_data: Dict[str, Any], analysis: str) -> Dict[str, Any]:
+        """
+        Combine cluster information with its API analysis.
+        """
         return {
             "cluster_id": cluster_data.get("cluster_id"),
             "category": self._categorize_cluster(
@@ -170,6 +211,9 @@ Provide specific technical details where possible, focusing on identifying the m
         """
         Analyze all clusters and store the results.
         
+        Throttled or failed requests are retried by a RetryScheduler, which
+        moves on to the next cluster while a failed one waits out its backoff.
+        
         Args:
             clusters: List of cluster data dictionaries
             
@@ -177,13 +221,24 @@ Provide specific technical details where possible, focusing on identifying the m
             List of analysis results
         """
         self.results = []
-        for cluster in clusters:
+        
+        def attempt(cluster):
             print(f"Analyzing cluster {cluster.get('cluster_id')}...")
-            result = self.analyze_cluster(cluster)
-            self.results.append(result)
-            # Add a delay to avoid API rate limits
-            time.sleep(1)
+            try:
+                return self._analyze_cluster_once(cluster)
+            finally:
+                # Add a delay to avoid API rate limits
+                if self.last_request_sent:
+                    time.sleep(1)
         
+        def give_up(cluster, error):
+            return self._build_result(cluster, str(error))
+        
+        scheduler = RetryScheduler(max_attempts=self.max_attempts, retry_budget=self.retry_budget)
+        completed = scheduler.run(clusters, attempt, give_up)
+        
+        # compile_report sorts by cluster ID, so completion order is fine here
+        self.results = [result for _, result in completed]
         return self.results
     
     def compile_report(self, output_file: str = "data_sink_analysis_report.md") -> str:
@@ -207,6 +262,11 @@ Provide specific technical details where possible, focusing on identifying the m
         report += f"Analysis Date: {time.strftime('%Y-%m-%d %H:%M:%S')}\n"
         report += f"Total Clusters Analyzed: {len(sorted_results)}\n\n"
         
+        if self.cache:
+            stats = self.cache.stats()
+            report += (f"Response Cache: {stats['hits']} hits, {stats['misses']} misses, "
+                       f"{stats['evictions']} evictions ({stats['entries']} entries)\n\n")
+        
         # Add summary table
         report += "## Summary of Clusters\n\n"
         report += "| Cluster ID | Category | File Count |\n"
@@ -0,0 +1,502 @@
+import os
+import json
+import time
+import hashlib
+import argparse
+from collections import defaultdict
+from typing import List, Dict, Any, Optional, Tuple
+
+import numpy as np
+from scipy import sparse
+
+DEFAULT_AST_TEXT_DIR = 'AST'
+DEFAULT_FEATURE_CACHE = 'ast_features.npz'
+NGRAM_RANGE = (1, 3)
+WEIGHTINGS = ('count', 'tf', 'tfidf')
+NOISE_CLUSTER_ID = -1
+
+# Largest n-gram code space mapped to columns with a dense lookup table
+# (one byte per possible code); larger spaces fall back to sorting the codes
+DENSE_CODE_LIMIT = 1 << 26
+
+
+def read_sequences(ast_dir: str) -> Tuple[List[str], List[List[str]]]:
+    """
+    Read the flattened node-type sequences (one *.ts.txt file per source file).
+
+    Args:
+        ast_dir: Directory containing the sequence files
+
+    Returns:
+        Tuple of (sorted file names, node types of each file)
+    """
+    names = sorted(name for name in os.listdir(ast_dir) if name.endswith('.txt'))
+    sequences = []
+    for name in names:
+        with open(os.path.join(ast_dir, name), 'r', encoding='utf-8') as f:
+            sequences.append(f.read().split())
+    return names, sequences
+
+
+def corpus_key(ast_dir: str, names: List[str], ngram_range: Tuple[int, int]) -> str:
+    """
+    Fingerprint of the corpus files and n-gram settings, for cache invalidation.
+    """
+    digest = hashlib.sha256(repr(tuple(ngram_range)).encode('utf-8'))
+    for name in names:
+        stat = os.stat(os.path.join(ast_dir, name))
+        digest.update(f"\0{name}\0{stat.st_size}\0{stat.st_mtime_ns}".encode('utf-8'))
+    return digest.hexdigest()
+
+
+def encode_sequences(sequences: List[List[str]]) -> Tuple[np.ndarray, np.ndarray, List[str]]:
+    """
+    Map node types to integer IDs and concatenate the sequences.
+
+    Node types are lowercased, like the text vectorizer the stored
+    top_features were built with.
+
+    Args:
+        sequences: Node types of each file
+
+    Returns:
+        Tuple of (token IDs of all files, offsets of each file's first token
+        plus the total length, node type of each ID)
+    """
+    vocabulary = defaultdict()
+    vocabulary.default_factory = vocabulary.__len__
+    lookup = vocabulary.__getitem__
+
+    offsets = np.zeros(len(sequences) + 1, dtype=np.int64)
+    parts = []
+    for i, sequence in enumerate(sequences):
+        ids = np.array(list(map(lookup, map(str.lower, sequence))), dtype=np.int32)
+        parts.append(ids)
+        offsets[i + 1] = offsets[i] + len(ids)
+
+    token_ids = np.concatenate(parts) if parts else np.zeros(0, dtype=np.int32)
+    node_types = [None] * len(vocabulary)
+    for node_type, node_id in vocabulary.items():
+        node_types[node_id] = node_type
+    return token_ids, offsets, node_types
+
+
+def ngram_codes(token_ids: np.ndarray, offsets: np.ndarray, base: int,
+                ngram_range: Tuple[int, int] = NGRAM_RANGE) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Encode every n-gram of every file as one integer (see ngram_counts).
+
+    Windows that span two files or contain a negative (unknown) token ID
+    are dropped.
+
+    Args:
+        token_ids: Token IDs of all files, concatenated
+        offsets: Start of each file in token_ids, plus the total length
+        base: Number of distinct node types plus one
+        ngram_range: Smallest and largest n
+
+    Returns:
+        Tuple of (n-gram codes, file index of each code)
+    """
+    if base ** ngram_range[1] >= 2 ** 63:
+        raise ValueError(f"{base - 1} node types are too many for {ngram_range[1]}-gram codes")
+
+    file_count = len(offsets) - 1
+    digits = token_ids.astype(np.int64) + 1
+    file_of = np.repeat(np.arange(file_count, dtype=np.int64), np.diff(offsets))
+    # Running count of unknown tokens, to drop windows containing one
+    unknown = np.concatenate(([0], np.cumsum(digits <= 0))) if (digits <= 0).any() else None
+
+    codes = []
+    rows = []
+    for n in range(ngram_range[0], ngram_range[1] + 1):
+        windows = len(digits) - n + 1
+        if windows <= 0:
+            continue
+        code = digits[:windows].copy()
+        for i in range(1, n):
+            code *= base
+            code += digits[i:i + windows]
+        valid = file_of[:windows] == file_of[n - 1:n - 1 + windows]
+        if unknown is not None:
+            valid &= unknown[n:n + windows] == unknown[:windows]
+        codes.append(code[valid])
+        rows.append(file_of[:windows][valid])
+
+    if not codes:
+        return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)
+    return np.concatenate(codes), np.concatenate(rows)
+
+
+def decode_feature(code: int, node_types: List[str], base: Optional[int] = None) -> str:
+    """
+    Space-separated node types of an n-gram code.
+
+    Args:
+        code: N-gram code
+        node_types: Node type of each token ID
+        base: Base the code was built with (number of node types plus one if None)
+    """
+    base = base or len(node_types) + 1
+    code = int(code)
+    tokens = []
+    while code:
+        code, digit = divmod(code, base)
+        tokens.append(node_types[digit - 1])
+    return " ".join(reversed(tokens))
+
+
+def rank_features(scores: np.ndarray, features: np.ndarray, node_types: List[str], top: int = 5,
+                  base: Optional[int] = None) -> List[str]:
+    """
+    Names of the highest-scoring n-grams.
+
+    Every column scoring at least the top-th score is a candidate, so ties
+    at the cut-off are broken by name and the result does not depend on
+    column order.
+
+    Args:
+        scores: Score of each feature column
+        features: N-gram code of each column
+        node_types: Node type of each token ID
+        top: Number of n-grams to return
+        base: Base of the n-gram codes (see decode_feature)
+
+    Returns:
+        N-gram names, best first
+    """
+    if top <= 0:
+        return []
+    if len(scores) > top:
+        cutoff = np.partition(scores, len(scores) - top)[len(scores) - top]
+        candidates = np.flatnonzero(scores >= cutoff)
+    else:
+        candidates = np.arange(len(scores))
+    names = {column: decode_feature(features[column], node_types, base) for column in candidates.tolist()}
+    ranked = sorted(names, key=lambda column: (-scores[column], names[column]))
+    return [names[column] for column in ranked[:top]]
+
+
+def ngram_counts(token_ids: np.ndarray, offsets: np.ndarray, vocabulary_size: int,
+                 ngram_range: Tuple[int, int] = NGRAM_RANGE) -> Tuple[sparse.csr_matrix, np.ndarray]:
+    """
+    Count the n-grams of every file in bulk.
+
+    Each n-gram is encoded as one integer, the base-(V+1) number whose digits
+    are its token IDs plus one, so n-grams of different lengths never collide.
+    Windows that span two files are dropped.
+
+    Args:
+        token_ids: Token IDs of all files, concatenated
+        offsets: Start of each file in token_ids, plus the total length
+        vocabulary_size: Number of distinct node types (V)
+        ngram_range: Smallest and largest n
+
+    Returns:
+        Tuple of (files x features count matrix, sorted n-gram codes of the features)
+    """
+    base = vocabulary_size + 1
+    file_count = len(offsets) - 1
+    codes, rows = ngram_codes(token_ids, offsets, base, ngram_range)
+    if not len(codes):
+        return sparse.csr_matrix((file_count, 0), dtype=np.int32), np.zeros(0, dtype=np.int64)
+
+    if base ** ngram_range[1] <= DENSE_CODE_LIMIT:
+        present = np.zeros(base ** ngram_range[1], dtype=bool)
+        present[codes] = True
+        features = np.flatnonzero(present)
+        columns = (np.cumsum(present) - 1)[codes]
+    else:
+        features, columns = np.unique(codes, return_inverse=True)
+
+    counts = sparse.coo_matrix(
+        (np.ones(len(rows), dtype=np.int32), (rows, columns.ravel())),
+        shape=(file_count, len(features))
+    ).tocsr()
+    return counts, features
+
+
+def inverse_document_frequency(counts: sparse.csr_matrix) -> np.ndarray:
+    """
+    Smoothed IDF of each feature, ln((1 + n) / (1 + df)) + 1 (the scikit-learn default).
+    """
+    document_frequency = np.bincount(counts.indices, minlength=counts.shape[1])
+    return np.log((1 + counts.shape[0]) / (1 + document_frequency)) + 1
+
+
+def weight_counts(counts: sparse.csr_matrix, weighting: str = 'tfidf',
+                  idf: Optional[np.ndarray] = None) -> sparse.csr_matrix:
+    """
+    Weight a count matrix.
+
+    'count' returns the raw counts, 'tf' L2-normalizes each row, and 'tfidf'
+    multiplies by the IDF before normalizing (the scikit-learn
+    TfidfVectorizer defaults).
+
+    Args:
+        counts: Files x features count matrix
+        weighting: One of WEIGHTINGS
+        idf: IDF to apply for 'tfidf', e.g. one frozen from another corpus
+            (None computes it from counts)
+
+    Returns:
+        Weighted matrix (float64, except for 'count')
+    """
+    if weighting not in WEIGHTINGS:
+        raise ValueError(f"Unknown weighting: {weighting}")
+    if weighting == 'count':
+        return counts
+
+    weighted = counts.astype(np.float64)
+    if weighting == 'tfidf':
+        if idf is None:
+            idf = inverse_document_frequency(counts)
+        weighted.data *= idf[weighted.indices]
+
+    # Empty rows (files without known n-grams) keep a norm of 1
+    row_lengths = np.diff(weighted.indptr)
+    norms = np.sqrt(np.asarray(weighted.multiply(weighted).sum(axis=1)).ravel())
+    norms[row_lengths == 0] = 1.0
+    weighted.data /= np.repeat(norms, row_lengths)
+    return weighted
+
+
+def transform_sequences(sequences: List[List[str]], node_types: List[str], features: np.ndarray,
+                        ngram_range: Tuple[int, int] = NGRAM_RANGE) -> sparse.csr_matrix:
+    """
+    Count n-grams in an existing feature space (see FeatureMatrix.transform).
+
+    Args:
+        sequences: Node types of each file
+        node_types: Node type of each token ID of the feature space
+        features: Sorted n-gram codes of the feature columns
+        ngram_range: Smallest and largest n
+
+    Returns:
+        len(sequences) x len(features) count matrix
+    """
+    lookup = {node_type: node_id for node_id, node_type in enumerate(node_types)}
+    offsets = np.zeros(len(sequences) + 1, dtype=np.int64)
+    parts = []
+    for i, sequence in enumerate(sequences):
+        parts.append(np.array([lookup.get(token.lower(), -1) for token in sequence], dtype=np.int32))
+        offsets[i + 1] = offsets[i] + len(sequence)
+    token_ids = np.concatenate(parts) if parts else np.zeros(0, dtype=np.int32)
+
+    codes, rows = ngram_codes(token_ids, offsets, len(node_types) + 1, ngram_range)
+    columns = np.searchsorted(features, codes)
+    known = columns < len(features)
+    known[known] = features[columns[known]] == codes[known]
+    return sparse.coo_matrix(
+        (np.ones(np.count_nonzero(known), dtype=np.int32), (rows[known], columns[known])),
+        shape=(len(sequences), len(features))
+    ).tocsr()
+
+
+class FeatureMatrix:
+    """
+    N-gram count matrix of a corpus of node-type sequences.
+
+    Rows are files and columns are n-grams (see ngram_counts). The matrix,
+    vocabulary and file names are cached together in one .npz file.
+    """
+
+    def __init__(self, names: List[str], node_types: List[str], features: np.ndarray,
+                 counts: sparse.csr_matrix, ngram_range: Tuple[int, int] = NGRAM_RANGE, key: str = ''):
+        self.names = names
+        self.node_types = node_types
+        self.features = features
+        self.counts = counts
+        self.ngram_range = tuple(ngram_range)
+        self.key = key
+        self.rows = {name: row for row, name in enumerate(names)}
+        self._weighted = {}
+
+    @classmethod
+    def build(cls, ast_dir: str = DEFAULT_AST_TEXT_DIR,
+              ngram_range: Tuple[int, int] = NGRAM_RANGE) -> 'FeatureMatrix':
+        """
+        Build the matrix from the sequence files in ast_dir.
+        """
+        names, sequences = read_sequences(ast_dir)
+        token_ids, offsets, node_types = encode_sequences(sequences)
+        counts, features = ngram_counts(token_ids, offsets, len(node_types), ngram_range)
+        return cls(names, node_types, features, counts, ngram_range, corpus_key(ast_dir, names, ngram_range))
+
+    @classmethod
+    def load_or_build(cls, ast_dir: str = DEFAULT_AST_TEXT_DIR, cache_path: Optional[str] = DEFAULT_FEATURE_CACHE,
+                      ngram_range: Tuple[int, int] = NGRAM_RANGE) -> 'FeatureMatrix':
+        """
+        Load the cached matrix if it matches the corpus, otherwise build and cache it.
+
+        Args:
+            ast_dir: Directory containing the sequence files
+            cache_path: .npz cache file (None disables caching)
+            ngram_range: Smallest and largest n
+
+        Returns:
+            FeatureMatrix
+        """
+        if cache_path and os.path.exists(cache_path):
+            names = sorted(name for name in os.listdir(ast_dir) if name.endswith('.txt'))
+            key = corpus_key(ast_dir, names, ngram_range)
+            try:
+                cached = cls.load(cache_path)
+            except (OSError, ValueError, KeyError) as e:
+                print(f"Ignoring unreadable feature cache {cache_path}: {str(e)}")
+            else:
+                if cached.key == key:
+                    print(f"Loaded features from {cache_path}")
+                    return cached
+
+        matrix = cls.build(ast_dir, ngram_range)
+        if cache_path:
+            matrix.save(cache_path)
+            print(f"Features saved to {cache_path}")
+        return matrix
+
+    def save(self, path: str) -> None:
+        # Write through a file object so numpy does not append .npz to the name
+        with open(path, 'wb') as f:
+            np.savez_compressed(
+                f,
+                data=self.counts.data, indices=self.counts.indices, indptr=self.counts.indptr,
+                shape=np.array(self.counts.shape), features=self.features,
+                names=np.array(self.names, dtype=str), node_types=np.array(self.node_types, dtype=str),
+                ngram_range=np.array(self.ngram_range), key=np.array(self.key)
+            )
+
+    @classmethod
+    def load(cls, path: str) -> 'FeatureMatrix':
+        with np.load(path, allow_pickle=False) as cached:
+            counts = sparse.csr_matrix((cached['data'], cached['indices'], cached['indptr']),
+                                       shape=tuple(cached['shape']))
+            return cls(cached['names'].tolist(), cached['node_types'].tolist(), cached['features'], counts,
+                       tuple(cached['ngram_range'].tolist()), str(cached['key']))
+
+    def weighted(self, weighting: str = 'tfidf') -> sparse.csr_matrix:
+        """
+        The matrix under a weighting (see weight_counts), computed once.
+        """
+        if weighting not in self._weighted:
+            self._weighted[weighting] = weight_counts(self.counts, weighting)
+        return self._weighted[weighting]
+
+    def feature_name(self, column: int) -> str:
+        """
+        Space-separated node types of the n-gram in a column.
+        """
+        return decode_feature(self.features[column], self.node_types)
+
+    def transform(self, sequences: List[List[str]]) -> sparse.csr_matrix:
+        """
+        Count the n-grams of other files in this matrix's feature space.
+
+        Node types and n-grams the corpus never contained are ignored.
+
+        Args:
+            sequences: Node types of each file
+
+        Returns:
+            len(sequences) x features count matrix
+        """
+        return transform_sequences(sequences, self.node_types, self.features, self.ngram_range)
+
+    def rows_for_paths(self, file_paths: List[str]) -> List[int]:
+        """
+        Rows of the files in a cluster's file_paths (matched by basename, with or without .txt).
+        """
+        rows = []
+        for path in file_paths:
+            name = os.path.basename(path.replace('\\', '/'))
+            row = self.rows.get(name)
+            if row is None:
+                row = self.rows.get(f"{name}.txt")
+            if row is not None:
+                rows.append(row)
+        return rows
+
+    def top_features(self, rows: List[int], top: int = 5, weighting: str = 'tf') -> List[str]:
+        """
+        Highest-weighted n-grams on average over some rows (see rank_features).
+
+        Args:
+            rows: Matrix rows (files of one cluster)
+            top: Number of n-grams to return
+            weighting: One of WEIGHTINGS
+
+        Returns:
+            N-gram names, best first
+        """
+        if not rows:
+            return []
+        scores = np.asarray(self.weighted(weighting)[rows].mean(axis=0)).ravel()
+        return rank_features(scores, self.features, self.node_types, top)
+
+
+def recompute_top_features(clusters: List[Dict[str, Any]], matrix: FeatureMatrix, top: int = 5,
+                           weighting: str = 'tf', include_noise: bool = False) -> List[Dict[str, Any]]:
+    """
+    Recompute top_features for each cluster from the feature matrix.
+
+    Args:
+        clusters: Cluster dictionaries with file_paths
+        matrix: Feature matrix of the corpus
+        top: Number of n-grams per cluster
+        weighting: One of WEIGHTINGS
+        include_noise: Also recompute the noise cluster (-1), which has no features by convention
+
+    Returns:
+        Copies of the clusters with updated top_features
+    """
+    updated = []
+    for cluster in clusters:
+        cluster = dict(cluster)
+        if include_noise or cluster.get('cluster_id') != NOISE_CLUSTER_ID:
+            rows = matrix.rows_for_paths(cluster.get('file_paths', []))
+            if len(rows) < len(cluster.get('file_paths', [])):
+                print(f"Warning: {len(cluster['file_paths']) - len(rows)} files of cluster "
+                      f"{cluster.get('cluster_id')} have no sequence file")
+            cluster['top_features'] = ", ".join(matrix.top_features(rows, top, weighting))
+        updated.append(cluster)
+    return updated
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Build n-gram feature matrices from AST node-type sequences')
+    parser.add_argument('--ast-dir', default=DEFAULT_AST_TEXT_DIR, help='Directory of *.ts.txt node-type sequences')
+    parser.add_argument('--clusters', default='updated_clusters.json', help='Cluster JSON to recompute top_features for')
+    parser.add_argument('--output', default=None, help='Write the clusters with recomputed top_features to this file')
+    parser.add_argument('--cache', default=DEFAULT_FEATURE_CACHE, help='.npz file caching the count matrix')
+    parser.add_argument('--no-cache', action='store_true', help='Rebuild the matrix without reading or writing the cache')
+    parser.add_argument('--max-n', type=int, default=NGRAM_RANGE[1], help='Longest n-gram')
+    parser.add_argument('--weighting', choices=WEIGHTINGS, default='tf',
+                        help='Weighting for ranking top features (tf matches the stored top_features most closely)')
+    parser.add_argument('--top', type=int, default=5, help='Number of top features per cluster')
+    parser.add_argument('--include-noise', action='store_true', help='Also compute top_features for cluster -1')
+
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    matrix = FeatureMatrix.load_or_build(args.ast_dir, None if args.no_cache else args.cache, (1, args.max_n))
+    print(f"{matrix.counts.shape[0]} files x {matrix.counts.shape[1]} n-grams "
+          f"({len(matrix.node_types)} node types) in {time.perf_counter() - start:.2f}s")
+
+    with open(args.clusters, 'r', encoding='utf-8') as f:
+        clusters = json.load(f)
+
+    updated = recompute_top_features(clusters, matrix, args.top, args.weighting, args.include_noise)
+    unchanged = 0
+    for before, after in zip(clusters, updated):
+        same = before.get('top_features') == after['top_features']
+        unchanged += same
+        print(f"Cluster {after.get('cluster_id')}: {after['top_features']}{'' if same else '  (changed)'}")
+    print(f"{unchanged}/{len(updated)} clusters keep their stored top_features")
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(updated, f, indent=2)
+        print(f"Clusters saved to {args.output}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,295 @@
+import os
+import re
+import json
+import argparse
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from ast_loader import SubtreeInterner, load_ast_json, parse_ast_json
+
+INDEX_SUFFIX = '.index'
+INDEX_VERSION = 2
+
+# Levels of nested objects kept in a statement header: enough for
+# source.value of imports and declaration.id.name of exports
+HEADER_DEPTH = 3
+
+# A JSON string or a bracket; strings are matched whole so brackets inside
+# them are skipped
+_TOKEN_PATTERN = re.compile(rb'"(?:[^"\\]|\\.)*"|[\[\]{}]')
+_ARRAY_VALUE_PATTERN = re.compile(rb'\s*:\s*\[')
+
+
+def index_path(file_path: str) -> str:
+    """Path of the sidecar index of an *.ast.json file."""
+    return file_path + INDEX_SUFFIX
+
+
+def statement_header(node: Dict[str, Any], depth: int = HEADER_DEPTH) -> Dict[str, Any]:
+    """
+    Keep the scalar fields of a node and of its nested objects, down to depth levels.
+
+    Arrays are dropped, so a header stays small however large the node is.
+
+    Args:
+        node: Projected AST node
+        depth: Levels of objects to keep (1 keeps only the node's own scalars)
+
+    Returns:
+        Header of the node
+    """
+    header = {}
+    for key, value in node.items():
+        if isinstance(value, dict):
+            if depth > 1:
+                header[key] = statement_header(value, depth - 1)
+        elif not isinstance(value, list):
+            header[key] = value
+    return header
+
+
+def scan_statement_offsets(data: bytes) -> Optional[List[Tuple[int, int]]]:
+    """
+    Find the byte range of every object in the root object's "body" array.
+
+    Only strings and brackets are tokenized; scanning stops at the end of
+    the body, so the token stream that follows it is never read.
+
+    Args:
+        data: Contents of an ESTree JSON file
+
+    Returns:
+        List of (start, end) byte offsets, end exclusive, or None if the
+        root object has no "body" array
+    """
+    spans = []
+    depth = 0
+    in_body = False
+    start = None
+    for match in _TOKEN_PATTERN.finditer(data):
+        first = data[match.start()]
+        if first == 0x22:  # "
+            if depth == 1 and match.group() == b'"body"' and _ARRAY_VALUE_PATTERN.match(data, match.end()):
+                in_body = True
+            continue
+        if first == 0x7b or first == 0x5b:  # { [
+            depth += 1
+            if in_body and depth == 3 and first == 0x7b:
+                start = match.start()
+        else:
+            if in_body and depth == 3 and start is not None:
+                spans.append((start, match.end()))
+                start = None
+            elif in_body and depth == 2:
+                break
+            depth -= 1
+    return spans if in_body else None
+
+
+class ASTIndex:
+    """
+    Byte offsets, types and headers of the top-level statements of one *.ast.json file.
+
+    The index is stored next to the file as <name>.ast.json.index and is
+    rebuilt when the file's size or mtime no longer match. load() seeks to
+    and parses only the statements whose type is asked for; the others are
+    represented by their headers (see statement_header). Files whose root
+    has no "body" array are not split up and load() reads them whole.
+    """
+
+    def __init__(self, file_path: str, statements: Optional[List[Tuple[str, int, int, Dict[str, Any]]]],
+                 size: int, mtime_ns: int):
+        """
+        Initialize the index.
+
+        Args:
+            file_path: Path to the indexed *.ast.json file
+            statements: (type, start, end, header) per Program.body element,
+                or None if the root has no body
+            size: Size of the file when it was indexed
+            mtime_ns: Modification time of the file when it was indexed
+        """
+        self.file_path = file_path
+        self.statements = statements
+        self.size = size
+        self.mtime_ns = mtime_ns
+
+    @classmethod
+    def build(cls, file_path: str) -> 'ASTIndex':
+        """
+        Index a file by scanning it and parsing each statement once.
+
+        Args:
+            file_path: Path to the *.ast.json file
+
+        Returns:
+            New index (not saved)
+        """
+        stat = os.stat(file_path)
+        with open(file_path, 'rb') as f:
+            data = f.read()
+
+        spans = scan_statement_offsets(data)
+        if spans is None:
+            return cls(file_path, None, stat.st_size, stat.st_mtime_ns)
+        statements = []
+        for start, end in spans:
+            node = parse_ast_json(data[start:end])
+            statements.append((node.get('type', ''), start, end, statement_header(node)))
+        return cls(file_path, statements, stat.st_size, stat.st_mtime_ns)
+
+    @classmethod
+    def open(cls, file_path: str) -> 'ASTIndex':
+        """
+        Load a file's sidecar index, building and saving it if missing or stale.
+
+        Args:
+            file_path: Path to the *.ast.json file
+
+        Returns:
+            Up-to-date index
+        """
+        index = cls.load_sidecar(file_path)
+        if index is None:
+            index = cls.build(file_path)
+            try:
+                index.save()
+            except OSError as e:
+                print(f"Could not save index for {file_path}: {e}")
+        return index
+
+    @classmethod
+    def load_sidecar(cls, file_path: str) -> Optional['ASTIndex']:
+        """
+        Load a file's sidecar index if it exists and matches the file.
+
+        Args:
+            file_path: Path to the *.ast.json file
+
+        Returns:
+            The index, or None if it is missing, unreadable or stale
+        """
+        try:
+            stat = os.stat(file_path)
+            with open(index_path(file_path), 'r', encoding='utf-8') as f:
+                saved = json.load(f)
+        except (OSError, ValueError):
+            return None
+
+        if saved.get('version') != INDEX_VERSION or saved.get('size') != stat.st_size \
+                or saved.get('mtime_ns') != stat.st_mtime_ns:
+            return None
+        statements = saved['statements']
+        if statements is not None:
+            statements = [tuple(statement) for statement in statements]
+        return cls(file_path, statements, stat.st_size, stat.st_mtime_ns)
+
+    def save(self) -> str:
+        """
+        Write the sidecar index atomically.
+
+        Returns:
+            Path to the written index
+        """
+        path = index_path(self.file_path)
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({
+                'version': INDEX_VERSION,
+                'size': self.size,
+                'mtime_ns': self.mtime_ns,
+                'statements': None if self.statements is None else [list(statement) for statement in self.statements]
+            }, f, separators=(',', ':'))
+        os.replace(tmp_path, path)
+        return path
+
+    def bytes_needed(self, statement_types: Optional[Iterable[str]] = None) -> int:
+        """
+        Bytes load() parses for the given statement types (None for all).
+        """
+        if self.statements is None:
+            return self.size
+        wanted = None if statement_types is None else set(statement_types)
+        return sum(end - start for node_type, start, end, _ in self.statements
+                   if wanted is None or node_type in wanted)
+
+    def load(self, statement_types: Optional[Iterable[str]] = None,
+             interner: Optional[SubtreeInterner] = None) -> Dict[str, Any]:
+        """
+        Build a Program whose body holds the requested statements in full.
+
+        Statements of other types are replaced by their headers, in place,
+        so the body keeps every statement in source order. Root fields
+        other than type and body are not indexed. A file without a root
+        body is loaded whole with load_ast_json.
+
+        Args:
+            statement_types: Statement types to parse (None for all)
+            interner: SubtreeInterner to share identical subtrees through
+
+        Returns:
+            Program node
+        """
+        if self.statements is None:
+            return load_ast_json(self.file_path, interner)
+        wanted = None if statement_types is None else set(statement_types)
+        body = []
+        with open(self.file_path, 'rb') as f:
+            for node_type, start, end, header in self.statements:
+                if wanted is None or node_type in wanted:
+                    f.seek(start)
+                    body.append(parse_ast_json(f.read(end - start), interner))
+                else:
+                    body.append(header)
+        return {'type': 'Program', 'body': body}
+
+
+def load_ast_statements(file_path: str, statement_types: Optional[Iterable[str]] = None,
+                        interner: Optional[SubtreeInterner] = None) -> Dict[str, Any]:
+    """
+    Load the top-level statements of an *.ast.json file through its sidecar index.
+
+    Args:
+        file_path: Path to the *.ast.json file
+        statement_types: Statement types to parse in full (None for all);
+            the others are returned as headers
+        interner: SubtreeInterner to share identical subtrees through
+
+    Returns:
+        Program node
+    """
+    return ASTIndex.open(file_path).load(statement_types, interner)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Build byte-offset indexes of the top-level statements of AST files')
+    parser.add_argument('--ast-dir', default='AST_v2', help='Directory containing cluster_N directories')
+    parser.add_argument('--clusters', default=None, help='Comma-separated list of cluster IDs (default: all)')
+    parser.add_argument('--force', action='store_true', help='Rebuild indexes even if they are up to date')
+
+    args = parser.parse_args()
+
+    if args.clusters:
+        cluster_dirs = [os.path.join(args.ast_dir, f"cluster_{cid}") for cid in args.clusters.split(',')]
+    else:
+        cluster_dirs = sorted(
+            os.path.join(args.ast_dir, name) for name in os.listdir(args.ast_dir)
+            if name.startswith('cluster_')
+        )
+
+    built = fresh = 0
+    for cluster_dir in cluster_dirs:
+        for filename in sorted(os.listdir(cluster_dir)):
+            if not filename.endswith('.ast.json'):
+                continue
+            file_path = os.path.join(cluster_dir, filename)
+            if not args.force and ASTIndex.load_sidecar(file_path) is not None:
+                fresh += 1
+                continue
+            ASTIndex.build(file_path).save()
+            built += 1
+        print(f"Indexed {cluster_dir}")
+
+    print(f"Built {built} indexes ({fresh} up to date)")
+
+if __name__ == '__main__':
+    main()
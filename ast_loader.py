@@ -0,0 +1,339 @@
+import os
+import sys
+import json
+import hashlib
+from collections import OrderedDict
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+try:
+    import ijson
+except ImportError:  # Fall back to json.load with an object hook
+    ijson = None
+
+# Keys that no analysis stage reads. Position data (range/loc), the token
+# stream, comments and literal source text make up most of an ESTree dump.
+DROPPED_AST_KEYS = frozenset({'range', 'loc', 'tokens', 'comments', 'raw'})
+
+# Distinct subtrees a long-lived interner keeps between trims (the whole
+# AST_v2 corpus has about 85,000)
+DEFAULT_INTERNER_MAX_ENTRIES = 200000
+
+
+class SubtreeInterner:
+    """
+    Hash-conses JSON trees: identical objects and arrays share one instance.
+
+    Containers are interned bottom-up, once their children are canonical.
+    Each gets a 128-bit BLAKE2b digest of its keys, scalars and child
+    digests. Structurally identical subtrees get the same digest and are
+    replaced by the first instance seen, across every file loaded through
+    the same interner. Position data is already dropped by the loader, so
+    copies at different places in the source compare equal. Interned trees
+    are shared and must be treated as read-only.
+
+    Canonical instances are kept in least recently used order, so a
+    long-lived interner can be bounded with trim() between loads.
+    """
+
+    def __init__(self):
+        # digest -> canonical container (least recently used first); id(canonical) -> digest;
+        # digest -> occurrences
+        self.canonical = OrderedDict()
+        self.digests = {}
+        self.uses = {}
+        self.nodes_seen = 0
+        # Object key -> its length-prefixed encoding (keys are few and repeat)
+        self.key_bytes = {}
+
+    def intern(self, value: Any) -> Any:
+        """
+        Return the canonical instance of a dict or list whose children are already interned.
+        """
+        digest = self._digest(value)
+        self.nodes_seen += 1
+        canonical = self.canonical.get(digest)
+        if canonical is None:
+            self.canonical[digest] = value
+            self.digests[id(value)] = digest
+            self.uses[digest] = 1
+            return value
+        self.uses[digest] += 1
+        self.canonical.move_to_end(digest)
+        return canonical
+
+    def trim(self, max_entries: int) -> List[bytes]:
+        """
+        Forget the least recently used subtrees beyond max_entries.
+
+        Only call this between loads: a tree still being built may refer to
+        a subtree that is forgotten. Trees loaded earlier stay valid, their
+        forgotten subtrees are just no longer shared with later loads.
+
+        Args:
+            max_entries: Distinct subtrees to keep
+
+        Returns:
+            Digests of the forgotten subtrees
+        """
+        evicted = []
+        while len(self.canonical) > max_entries:
+            digest, value = self.canonical.popitem(last=False)
+            del self.digests[id(value)]
+            del self.uses[digest]
+            evicted.append(digest)
+        return evicted
+
+    def digest(self, node: Any) -> Optional[bytes]:
+        """
+        Structural digest of a canonical container (None for anything not interned here).
+        """
+        return self.digests.get(id(node))
+
+    def is_shared(self, node: Any) -> bool:
+        """
+        Whether a canonical container occurred more than once.
+        """
+        digest = self.digests.get(id(node))
+        return digest is not None and self.uses[digest] > 1
+
+    def stats(self) -> Dict[str, int]:
+        """
+        Containers interned and how many distinct ones are kept.
+        """
+        return {'nodes': self.nodes_seen, 'unique': len(self.canonical)}
+
+    def _digest(self, value: Any) -> bytes:
+        # Children are canonical and alive, so an id found in digests is a
+        # container child; anything else is a scalar
+        digests = self.digests
+        parts = []
+        append = parts.append
+        if isinstance(value, dict):
+            append(b'{')
+            key_bytes = self.key_bytes
+            for key, child in value.items():
+                encoded = key_bytes.get(key)
+                if encoded is None:
+                    raw = key.encode('utf-8')
+                    encoded = key_bytes[key] = len(raw).to_bytes(4, 'little') + raw
+                append(encoded)
+                child_digest = digests.get(id(child))
+                append(child_digest if child_digest is not None else _scalar_bytes(child))
+        else:
+            append(b'[')
+            for child in value:
+                child_digest = digests.get(id(child))
+                append(child_digest if child_digest is not None else _scalar_bytes(child))
+        return hashlib.blake2b(b''.join(parts), digest_size=16).digest()
+
+
+def _scalar_bytes(value: Any) -> bytes:
+    """
+    Unambiguous encoding of a JSON scalar for subtree digests.
+    """
+    if isinstance(value, str):
+        encoded = value.encode('utf-8')
+        return b's' + len(encoded).to_bytes(4, 'little') + encoded
+    if value is True:
+        return b'T'
+    if value is False:
+        return b'F'
+    if value is None:
+        return b'N'
+    if isinstance(value, int):
+        return b'i' + str(value).encode('ascii') + b';'
+    return b'f' + repr(value).encode('ascii') + b';'
+
+
+def _intern_node(node: Dict[str, Any], interner: SubtreeInterner) -> Dict[str, Any]:
+    """
+    Object hook for json.load: project a decoded object and intern it.
+
+    Objects are decoded bottom-up, so only arrays (which get no hook) need
+    interning here before the object itself.
+    """
+    node = _project_node(node)
+    for key, child in node.items():
+        if isinstance(child, list):
+            node[key] = _intern_array(child, interner)
+        elif isinstance(child, str):
+            node[key] = sys.intern(child)
+    return interner.intern(node)
+
+
+def _intern_array(array: list, interner: SubtreeInterner) -> list:
+    for i, item in enumerate(array):
+        if isinstance(item, list):
+            array[i] = _intern_array(item, interner)
+    return interner.intern(array)
+
+
+def _project_node(node: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Drop unused keys from a decoded JSON object (json.load object_hook).
+
+    Args:
+        node: Decoded JSON object
+
+    Returns:
+        The object without the dropped keys
+    """
+    for key in DROPPED_AST_KEYS.intersection(node):
+        del node[key]
+    return node
+
+
+def _build_projected_tree(events: Iterable[Tuple[str, Any]], interner: Optional[SubtreeInterner] = None) -> Any:
+    """
+    Build a JSON value from ijson basic_parse events, skipping dropped keys.
+
+    Subtrees under a dropped key are consumed without being materialized,
+    so position objects never exist as Python objects. With an interner,
+    each container is attached to its parent once complete, as its
+    canonical instance, and strings are interned with sys.intern.
+
+    Args:
+        events: Iterator of (event, value) pairs from ijson.basic_parse
+        interner: SubtreeInterner to share identical subtrees through
+
+    Returns:
+        The projected JSON value
+    """
+    stack = []
+    # Keys of the open containers in their parents (interning only)
+    pending_keys = []
+    key = None
+    drop_next = False
+    skip_depth = 0
+
+    for event, value in events:
+        # Inside a dropped container: only track nesting depth
+        if skip_depth:
+            if event == 'start_map' or event == 'start_array':
+                skip_depth += 1
+            elif event == 'end_map' or event == 'end_array':
+                skip_depth -= 1
+            continue
+
+        if event == 'map_key':
+            if value in DROPPED_AST_KEYS:
+                drop_next = True
+            else:
+                key = value if interner is None else sys.intern(value)
+            continue
+
+        if drop_next:
+            drop_next = False
+            if event == 'start_map' or event == 'start_array':
+                skip_depth = 1
+            continue
+
+        if event == 'end_map' or event == 'end_array':
+            finished = stack.pop()
+            if interner is not None:
+                finished = interner.intern(finished)
+                finished_key = pending_keys.pop()
+                if stack:
+                    parent = stack[-1]
+                    if isinstance(parent, list):
+                        parent.append(finished)
+                    else:
+                        parent[finished_key] = finished
+                    continue
+            if not stack:
+                return finished
+            continue
+
+        if event == 'start_map':
+            item = {}
+        elif event == 'start_array':
+            item = []
+        else:
+            item = value
+            if interner is not None and isinstance(item, str):
+                item = sys.intern(item)
+
+        if interner is not None and (event == 'start_map' or event == 'start_array'):
+            pending_keys.append(key)
+            stack.append(item)
+            continue
+
+        # Attach the value to its parent container
+        if stack:
+            parent = stack[-1]
+            if isinstance(parent, list):
+                parent.append(item)
+            else:
+                parent[key] = item
+        elif event != 'start_map' and event != 'start_array':
+            return item
+
+        if event == 'start_map' or event == 'start_array':
+            stack.append(item)
+
+    return None
+
+
+def parse_ast_json(data: bytes, interner: Optional[SubtreeInterner] = None) -> Any:
+    """
+    Parse an in-memory JSON fragment (e.g. one AST node) like load_ast_json.
+
+    Args:
+        data: UTF-8 encoded JSON
+        interner: SubtreeInterner to share identical subtrees through
+
+    Returns:
+        Projected JSON value
+    """
+    if interner is not None:
+        return json.loads(data, object_hook=lambda node: _intern_node(node, interner))
+    return json.loads(data, object_hook=_project_node)
+
+
+def list_ast_files(directory: str) -> List[Tuple[str, int, int]]:
+    """
+    Name, size and mtime_ns of every *.ast.json file in a directory.
+
+    Anything derived from a cluster directory compares this listing to tell
+    whether files were added, removed or changed since it was built.
+
+    Args:
+        directory: Cluster directory (missing directories have no files)
+
+    Returns:
+        List of (name, size, mtime_ns), sorted by name
+    """
+    files = []
+    if os.path.isdir(directory):
+        for entry in os.scandir(directory):
+            if entry.name.endswith('.ast.json'):
+                stat = entry.stat()
+                files.append((entry.name, stat.st_size, stat.st_mtime_ns))
+    files.sort()
+    return files
+
+
+def load_ast_json(file_path: str, interner: Optional[SubtreeInterner] = None) -> Dict[str, Any]:
+    """
+    Load an ESTree JSON file keeping only the data the analysis stages read.
+
+    With ijson installed the file is parsed incrementally and position data
+    is discarded as it streams; otherwise json.load prunes every object as
+    soon as it is decoded.
+
+    Args:
+        file_path: Path to the *.ast.json file
+        interner: SubtreeInterner shared across files, to reuse identical
+            subtrees instead of building copies (the result is read-only)
+
+    Returns:
+        Projected AST
+    """
+    if ijson is not None:
+        with open(file_path, 'rb') as f:
+            return _build_projected_tree(ijson.basic_parse(f, use_float=True), interner)
+
+    with open(file_path, 'r', encoding='utf-8') as f:
+        if interner is not None:
+            return json.load(f, object_hook=lambda node: _intern_node(node, interner))
+        return json.load(f, object_hook=_project_node)
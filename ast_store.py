@@ -0,0 +1,479 @@
+import os
+import mmap
+import struct
+import argparse
+from collections import deque
+from collections.abc import Mapping, Sequence
+from typing import Any, Optional, Iterator, Tuple
+
+from ast_loader import list_ast_files, load_ast_json
+
+STORE_FILENAME = 'cluster.aststore'
+STORE_MAGIC = b'ASTS'
+STORE_VERSION = 2
+
+# magic, version, files, nodes, strings, key strings, numbers, reserved
+_HEADER = struct.Struct('<4sIIIIIII')
+# name string id, root node, size and mtime_ns of the source file
+_FILE_ENTRY = struct.Struct('<iiqq')
+
+# Node kinds
+KIND_OBJECT = 0
+KIND_ARRAY = 1
+KIND_STRING = 2
+KIND_INT = 3
+KIND_FLOAT = 4
+KIND_TRUE = 5
+KIND_FALSE = 6
+KIND_NULL = 7
+
+# Per-node int32 columns, in on-disk order
+NODE_COLUMNS = ('kind', 'type_id', 'key_id', 'parent', 'first_child', 'child_count', 'payload')
+
+
+def _padding(offset: int) -> int:
+    """Bytes needed to align an offset to 8."""
+    return -offset % 8
+
+
+def _is_stale(cluster_dir: str, store_path: str) -> bool:
+    """
+    Check whether the store is missing, unreadable or out of date with the cluster.
+
+    Args:
+        cluster_dir: Path to the cluster directory
+        store_path: Path to the store file
+
+    Returns:
+        True if the store must be rebuilt
+    """
+    if not os.path.exists(store_path):
+        return True
+    try:
+        store = ASTStore(store_path)
+    except (OSError, ValueError):
+        return True
+    try:
+        return store.is_stale(cluster_dir)
+    finally:
+        store.close()
+
+
+class _StoreBuilder:
+    """Flattens JSON trees into breadth-first node columns."""
+
+    def __init__(self):
+        self.columns = {name: [] for name in NODE_COLUMNS}
+        self.numbers = []
+        self.key_strings = {}
+        self.value_strings = {}
+        self.files = []
+
+    def _key_id(self, name: str) -> int:
+        if name not in self.key_strings:
+            self.key_strings[name] = len(self.key_strings)
+        return self.key_strings[name]
+
+    def _value_id(self, text: str) -> int:
+        if text not in self.value_strings:
+            self.value_strings[text] = len(self.value_strings)
+        return self.value_strings[text]
+
+    def add_file(self, filename: str, ast_data: Any, size: int, mtime_ns: int) -> None:
+        """
+        Append one AST to the store.
+
+        Nodes are laid out breadth-first so the children of every node are
+        contiguous and each file occupies one contiguous node range.
+
+        Args:
+            filename: Name of the *.ast.json file
+            ast_data: Decoded (projected) AST
+            size: Size of the file when it was read
+            mtime_ns: Modification time of the file when it was read
+        """
+        columns = self.columns
+        root = len(columns['kind'])
+        self.files.append((self._value_id(filename), root, size, mtime_ns))
+
+        # Each queue entry is (value, parent index, key id)
+        queue = deque([(ast_data, -1, -1)])
+        while queue:
+            value, parent, key = queue.popleft()
+            index = len(columns['kind'])
+            type_id = -1
+            child_count = 0
+            payload = 0
+
+            if isinstance(value, dict):
+                kind = KIND_OBJECT
+                node_type = value.get('type')
+                if isinstance(node_type, str):
+                    type_id = self._key_id(node_type)
+                for child_key, child in value.items():
+                    queue.append((child, index, self._key_id(child_key)))
+                child_count = len(value)
+            elif isinstance(value, list):
+                kind = KIND_ARRAY
+                for child in value:
+                    queue.append((child, index, -1))
+                child_count = len(value)
+            elif isinstance(value, str):
+                kind = KIND_STRING
+                payload = self._value_id(value)
+            elif value is True:
+                kind = KIND_TRUE
+            elif value is False:
+                kind = KIND_FALSE
+            elif value is None:
+                kind = KIND_NULL
+            else:
+                kind = KIND_INT if isinstance(value, int) else KIND_FLOAT
+                payload = len(self.numbers)
+                self.numbers.append(value)
+
+            columns['kind'].append(kind)
+            columns['type_id'].append(type_id)
+            columns['key_id'].append(key)
+            columns['parent'].append(parent)
+            columns['first_child'].append(0)
+            columns['child_count'].append(child_count)
+            columns['payload'].append(payload)
+
+        # Children were queued in order, so first_child follows from the counts
+        next_child = root + 1
+        for index in range(root, len(columns['kind'])):
+            columns['first_child'][index] = next_child
+            next_child += columns['child_count'][index]
+
+    def write(self, store_path: str) -> None:
+        """
+        Serialize the collected columns to a store file.
+
+        Args:
+            store_path: Destination path
+        """
+        key_count = len(self.key_strings)
+        # Keys and node types come first in the shared string table so
+        # readers only need to index that prefix by name
+        strings = list(self.key_strings) + list(self.value_strings)
+        columns = self.columns
+        columns['payload'] = [
+            payload + key_count if kind == KIND_STRING else payload
+            for kind, payload in zip(columns['kind'], columns['payload'])
+        ]
+
+        encoded = [text.encode('utf-8') for text in strings]
+        offsets = [0]
+        for data in encoded:
+            offsets.append(offsets[-1] + len(data))
+
+        node_count = len(columns['kind'])
+        tmp_path = store_path + '.tmp'
+        with open(tmp_path, 'wb') as f:
+            f.write(_HEADER.pack(STORE_MAGIC, STORE_VERSION, len(self.files), node_count,
+                                 len(strings), key_count, len(self.numbers), 0))
+            for name_id, root, size, mtime_ns in self.files:
+                f.write(_FILE_ENTRY.pack(name_id + key_count, root, size, mtime_ns))
+            for name in NODE_COLUMNS:
+                f.write(struct.pack(f'<{node_count}i', *columns[name]))
+            # Keep the float64 section 8-byte aligned
+            f.write(b'\0' * _padding(f.tell()))
+            f.write(struct.pack(f'<{len(self.numbers)}d', *self.numbers))
+            f.write(struct.pack(f'<{len(offsets)}q', *offsets))
+            f.write(b''.join(encoded))
+        os.replace(tmp_path, store_path)
+
+
+def build_cluster_store(cluster_dir: str, store_path: Optional[str] = None) -> str:
+    """
+    Convert every *.ast.json file in a cluster into a single store file.
+
+    Args:
+        cluster_dir: Path to the cluster directory
+        store_path: Destination path (defaults to cluster.aststore in the cluster)
+
+    Returns:
+        Path to the written store
+    """
+    store_path = store_path or os.path.join(cluster_dir, STORE_FILENAME)
+    builder = _StoreBuilder()
+
+    # Stat before reading, so a file changed mid-build makes the store stale
+    for filename, size, mtime_ns in list_ast_files(cluster_dir):
+        builder.add_file(filename, load_ast_json(os.path.join(cluster_dir, filename)), size, mtime_ns)
+
+    builder.write(store_path)
+    return store_path
+
+
+class StoreNode(Mapping):
+    """Read-only dict view of an object node in an ASTStore."""
+
+    __slots__ = ('store', 'index')
+
+    def __init__(self, store: 'ASTStore', index: int):
+        self.store = store
+        self.index = index
+
+    def __getitem__(self, key: str) -> Any:
+        child = self.store.child(self.index, key)
+        if child < 0:
+            raise KeyError(key)
+        return self.store.value(child)
+
+    def get(self, key: str, default: Any = None) -> Any:
+        child = self.store.child(self.index, key)
+        return default if child < 0 else self.store.value(child)
+
+    def __contains__(self, key: object) -> bool:
+        return isinstance(key, str) and self.store.child(self.index, key) >= 0
+
+    def __iter__(self) -> Iterator[str]:
+        store = self.store
+        first = store.first_child[self.index]
+        for child in range(first, first + store.child_count[self.index]):
+            yield store.string(store.key_id[child])
+
+    def __len__(self) -> int:
+        return self.store.child_count[self.index]
+
+    def __eq__(self, other: object) -> bool:
+        return isinstance(other, Mapping) and dict(self.items()) == dict(other.items())
+
+    __hash__ = None
+
+
+class StoreArray(Sequence):
+    """Read-only list view of an array node in an ASTStore."""
+
+    __slots__ = ('store', 'index')
+
+    def __init__(self, store: 'ASTStore', index: int):
+        self.store = store
+        self.index = index
+
+    def __getitem__(self, position):
+        if isinstance(position, slice):
+            return [self[i] for i in range(*position.indices(len(self)))]
+        if position < 0:
+            position += len(self)
+        if not 0 <= position < len(self):
+            raise IndexError(position)
+        return self.store.value(self.store.first_child[self.index] + position)
+
+    def __iter__(self) -> Iterator[Any]:
+        store = self.store
+        first = store.first_child[self.index]
+        for child in range(first, first + store.child_count[self.index]):
+            yield store.value(child)
+
+    def __len__(self) -> int:
+        return self.store.child_count[self.index]
+
+    def __eq__(self, other: object) -> bool:
+        return isinstance(other, Sequence) and not isinstance(other, str) and list(self) == list(other)
+
+    __hash__ = None
+
+
+class ASTStore:
+    """
+    Memory-mapped columnar AST store for one cluster.
+
+    Every JSON value is a node; columns hold the node kind, interned node
+    type, the key it is stored under in its parent, the parent index, the
+    contiguous child range and a payload (string id or number index).
+    """
+
+    def __init__(self, store_path: str):
+        self.path = store_path
+        self._file = open(store_path, 'rb')
+        self._mmap = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        buf = memoryview(self._mmap)
+
+        magic, version, file_count, node_count, string_count, key_count, number_count, _ = \
+            _HEADER.unpack_from(buf, 0)
+        if magic != STORE_MAGIC or version != STORE_VERSION:
+            raise ValueError(f"{store_path} is not a version {STORE_VERSION} AST store")
+
+        offset = _HEADER.size
+        file_table = [_FILE_ENTRY.unpack_from(buf, offset + i * _FILE_ENTRY.size) for i in range(file_count)]
+        offset += file_count * _FILE_ENTRY.size
+
+        column_size = node_count * 4
+        self._column_offsets = {}
+        for name in NODE_COLUMNS:
+            self._column_offsets[name] = offset
+            setattr(self, name, buf[offset:offset + column_size].cast('i'))
+            offset += column_size
+
+        offset += _padding(offset)
+        self.numbers = buf[offset:offset + number_count * 8].cast('d')
+        offset += number_count * 8
+        self._string_offsets = buf[offset:offset + (string_count + 1) * 8].cast('q')
+        offset += (string_count + 1) * 8
+        self._string_base = offset
+        self._strings = {}
+
+        self.node_count = node_count
+        self.key_ids = {self.string(i): i for i in range(key_count)}
+
+        # (filename, first node, end node) per file
+        self.files = []
+        for i, (name_id, root, _, _) in enumerate(file_table):
+            end = file_table[i + 1][1] if i + 1 < file_count else node_count
+            self.files.append((self.string(name_id), root, end))
+        self._file_ranges = {root: (root, end) for _, root, end in self.files}
+        # (name, size, mtime_ns) of the files the store was built from, as list_ast_files gives them
+        self.listing = sorted((self.string(name_id), size, mtime_ns) for name_id, _, size, mtime_ns in file_table)
+
+    @classmethod
+    def open_for_cluster(cls, cluster_dir: str) -> Optional['ASTStore']:
+        """
+        Open the cluster's store if it was built from the AST files the cluster holds now.
+
+        Args:
+            cluster_dir: Path to the cluster directory
+
+        Returns:
+            ASTStore or None when the store is missing, of another version or stale
+        """
+        store_path = os.path.join(cluster_dir, STORE_FILENAME)
+        if not os.path.exists(store_path):
+            return None
+        try:
+            store = cls(store_path)
+        except ValueError:
+            return None
+        if store.is_stale(cluster_dir):
+            store.close()
+            return None
+        return store
+
+    def is_stale(self, cluster_dir: str) -> bool:
+        """
+        Whether files were added to, removed from or changed in the cluster since the store was built.
+        """
+        return self.listing != list_ast_files(cluster_dir)
+
+    def string(self, string_id: int) -> str:
+        """Decode an entry of the shared string table (cached)."""
+        text = self._strings.get(string_id)
+        if text is None:
+            start = self._string_base + self._string_offsets[string_id]
+            end = self._string_base + self._string_offsets[string_id + 1]
+            text = self._mmap[start:end].decode('utf-8')
+            self._strings[string_id] = text
+        return text
+
+    def child(self, index: int, key: str) -> int:
+        """
+        Find the child of an object node stored under a key.
+
+        Returns:
+            Child node index or -1
+        """
+        key_id = self.key_ids.get(key)
+        if key_id is None or self.kind[index] != KIND_OBJECT:
+            return -1
+        first = self.first_child[index]
+        key_column = self.key_id
+        for child in range(first, first + self.child_count[index]):
+            if key_column[child] == key_id:
+                return child
+        return -1
+
+    def value(self, index: int) -> Any:
+        """Return the Python value (or lazy view) for a node."""
+        kind = self.kind[index]
+        if kind == KIND_OBJECT:
+            return StoreNode(self, index)
+        if kind == KIND_ARRAY:
+            return StoreArray(self, index)
+        if kind == KIND_STRING:
+            return self.string(self.payload[index])
+        if kind == KIND_INT:
+            return int(self.numbers[self.payload[index]])
+        if kind == KIND_FLOAT:
+            return self.numbers[self.payload[index]]
+        if kind == KIND_TRUE:
+            return True
+        if kind == KIND_FALSE:
+            return False
+        return None
+
+    def node_type(self, index: int) -> str:
+        """Return the ESTree type of a node, or an empty string."""
+        type_id = self.type_id[index]
+        return self.string(type_id) if type_id >= 0 else ''
+
+    def file_range(self, index: int) -> Optional[Tuple[int, int]]:
+        """Return the node range of a file if the node is a file root."""
+        return self._file_ranges.get(index)
+
+    def find_nodes(self, node_type: str, start: int, end: int) -> Iterator[int]:
+        """
+        Yield indices of nodes of one type within a node range.
+
+        The type column is searched as raw bytes, so the scan runs at
+        memory speed instead of walking the tree.
+
+        Args:
+            node_type: ESTree node type (e.g. 'CallExpression')
+            start: First node index
+            end: End node index (exclusive)
+        """
+        type_id = self.key_ids.get(node_type)
+        if type_id is None:
+            return
+        pattern = struct.pack('<i', type_id)
+        base = self._column_offsets['type_id']
+        pos = self._mmap.find(pattern, base + start * 4, base + end * 4)
+        while pos >= 0:
+            if (pos - base) % 4 == 0:
+                yield (pos - base) // 4
+                pos = self._mmap.find(pattern, pos + 4, base + end * 4)
+            else:
+                pos = self._mmap.find(pattern, pos + 1, base + end * 4)
+
+    def iter_files(self) -> Iterator[Tuple[str, StoreNode, int, int]]:
+        """Yield (filename, root node, first index, end index) per file."""
+        for filename, root, end in self.files:
+            yield filename, StoreNode(self, root), root, end
+
+    def close(self) -> None:
+        for name in NODE_COLUMNS:
+            getattr(self, name).release()
+        self.numbers.release()
+        self._string_offsets.release()
+        self._mmap.close()
+        self._file.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Convert AST cluster directories into columnar AST stores')
+    parser.add_argument('--ast-dir', default='AST_v2', help='Directory containing cluster_N directories')
+    parser.add_argument('--clusters', default=None, help='Comma-separated list of cluster IDs (default: all)')
+    parser.add_argument('--force', action='store_true', help='Rebuild stores even if they are up to date')
+
+    args = parser.parse_args()
+
+    if args.clusters:
+        cluster_dirs = [os.path.join(args.ast_dir, f"cluster_{cid}") for cid in args.clusters.split(',')]
+    else:
+        cluster_dirs = sorted(
+            os.path.join(args.ast_dir, name) for name in os.listdir(args.ast_dir)
+            if name.startswith('cluster_')
+        )
+
+    for cluster_dir in cluster_dirs:
+        store_path = os.path.join(cluster_dir, STORE_FILENAME)
+        if not args.force and not _is_stale(cluster_dir, store_path):
+            print(f"Up to date: {store_path}")
+            continue
+        build_cluster_store(cluster_dir, store_path)
+        print(f"Wrote {store_path} ({os.path.getsize(store_path)} bytes)")
+
+if __name__ == '__main__':
+    main()
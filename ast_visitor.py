@@ -0,0 +1,340 @@
+from collections.abc import Mapping
+from typing import List, Dict, Any, Iterable, Optional, Set, Tuple
+
+from ast_store import StoreNode, StoreArray
+
+
+class ASTCollector:
+    """
+    Base class for analyses run by ASTVisitor.
+
+    visit_statement receives every top-level Program.body node in source
+    order. visit_node receives every node, anywhere in the tree, whose type
+    is listed in node_types.
+
+    statement_types lists the statement types visit_statement needs in
+    full. Other statements may arrive as index headers, which keep only
+    scalars and nested objects (see ast_index.statement_header). None means
+    every statement is needed in full.
+    """
+
+    node_types: Tuple[str, ...] = ()
+    statement_types: Optional[Tuple[str, ...]] = None
+
+    def begin_file(self, filename: str) -> None:
+        pass
+
+    def visit_statement(self, node: Mapping) -> None:
+        pass
+
+    def visit_node(self, node: Mapping) -> None:
+        pass
+
+    def end_file(self, filename: str) -> None:
+        pass
+
+
+class ASTVisitor:
+    """
+    Walks each AST once and dispatches nodes to registered collectors.
+    """
+
+    def __init__(self, collectors: List[ASTCollector], interner: Optional[Any] = None,
+                 memo: Optional[Dict[bytes, List[Mapping]]] = None):
+        """
+        Initialize the visitor.
+
+        Args:
+            collectors: Collectors to dispatch to
+            interner: SubtreeInterner the trees were loaded through. Subtrees
+                it saw more than once are walked once; later copies replay
+                the typed nodes found the first time.
+            memo: Typed nodes per subtree digest, shared between visitors
+                with the same collector types (a fresh dict if None)
+        """
+        self.collectors = collectors
+        self.interner = interner
+        self.memo = memo if memo is not None else {}
+        # Nodes walked (JSON trees) or scanned (store files), for tracing
+        self.nodes_visited = 0
+        # Shared subtrees replayed from the memo instead of walked
+        self.subtrees_reused = 0
+        self.statement_collectors = [
+            c for c in collectors if type(c).visit_statement is not ASTCollector.visit_statement
+        ]
+        self.dispatch = {}
+        for collector in collectors:
+            for node_type in collector.node_types:
+                self.dispatch.setdefault(node_type, []).append(collector)
+
+    def visit_file(self, filename: str, ast: Mapping) -> None:
+        """
+        Visit one file's AST.
+
+        Args:
+            filename: Name of the AST file
+            ast: Root node of the AST (dict or store view)
+        """
+        for collector in self.collectors:
+            collector.begin_file(filename)
+
+        if isinstance(ast, StoreNode) and ast.store.file_range(ast.index) is not None:
+            self._visit_store_file(ast)
+        elif isinstance(ast, Mapping):
+            self._visit_tree(ast)
+
+        for collector in self.collectors:
+            collector.end_file(filename)
+
+    def _visit_tree(self, ast: Mapping) -> None:
+        """
+        Iterative pre-order walk over a JSON tree.
+
+        With an interner, the typed nodes under each shared subtree are
+        recorded by digest while it is walked, between its entry and an end
+        marker on the stack, and replayed for every later copy.
+        """
+        dispatch = self.dispatch
+        statement_collectors = self.statement_collectors
+        interner = self.interner
+        memo = self.memo
+
+        # Each stack entry is (node, is_top_level_statement), or
+        # (None, (digest, start)) closing a subtree being recorded
+        stack = [(ast, False)]
+        visited = 0
+        # Typed nodes dispatched while at least one subtree is being recorded
+        typed = []
+        recording = 0
+        while stack:
+            node, is_statement = stack.pop()
+            if node is None:
+                digest, start = is_statement
+                memo[digest] = typed[start:]
+                recording -= 1
+                if not recording:
+                    typed.clear()
+                continue
+            visited += 1
+
+            if is_statement:
+                for collector in statement_collectors:
+                    collector.visit_statement(node)
+
+            node_type = node.get('type')
+            digest = None
+            # Program is never replayed: its body holds the statements
+            if interner is not None and node_type != 'Program' and interner.is_shared(node):
+                digest = interner.digest(node)
+                cached = memo.get(digest)
+                if cached is not None:
+                    for typed_node in cached:
+                        for collector in dispatch.get(typed_node['type'], ()):
+                            collector.visit_node(typed_node)
+                    if recording:
+                        typed.extend(cached)
+                    self.subtrees_reused += 1
+                    continue
+                stack.append((None, (digest, len(typed))))
+                recording += 1
+
+            if node_type in dispatch:
+                for collector in dispatch[node_type]:
+                    collector.visit_node(node)
+                if recording:
+                    typed.append(node)
+
+            is_program = node_type == 'Program'
+            children = []
+            for key, value in node.items():
+                if isinstance(value, Mapping):
+                    children.append((value, False))
+                elif isinstance(value, (list, StoreArray)):
+                    top_level = is_program and key == 'body'
+                    for item in value:
+                        if isinstance(item, Mapping):
+                            children.append((item, top_level))
+
+            # Push in reverse so nodes pop in source order
+            stack.extend(reversed(children))
+
+        self.nodes_visited += visited
+
+    def _visit_store_file(self, ast: StoreNode) -> None:
+        """
+        Visit a file stored in an ASTStore.
+
+        Statements are read from Program.body and typed nodes are found by
+        scanning the store's node-type column, so the tree is never walked.
+        """
+        if self.statement_collectors and ast.get('type') == 'Program':
+            for node in ast.get('body') or []:
+                if isinstance(node, Mapping):
+                    for collector in self.statement_collectors:
+                        collector.visit_statement(node)
+
+        store = ast.store
+        start, end = store.file_range(ast.index)
+        self.nodes_visited += end - start
+        for node_type, collectors in self.dispatch.items():
+            for index in store.find_nodes(node_type, start, end):
+                node = StoreNode(store, index)
+                for collector in collectors:
+                    collector.visit_node(node)
+
+
+def _count(counts: Dict[str, int], key: str) -> None:
+    if key in counts:
+        counts[key] += 1
+    else:
+        counts[key] = 1
+
+
+class DeclarationTypeCollector(ASTCollector):
+    """Counts top-level statement types."""
+
+    statement_types = ()
+
+    def __init__(self):
+        self.counts = {}
+
+    def visit_statement(self, node: Mapping) -> None:
+        _count(self.counts, node.get('type', ''))
+
+
+class ImportCollector(ASTCollector):
+    """Counts imported modules and records each file's import paths."""
+
+    statement_types = ()
+
+    def __init__(self):
+        self.module_counts = {}
+        self.file_imports = {}
+        self._current = None
+
+    def begin_file(self, filename: str) -> None:
+        self._current = self.file_imports.setdefault(filename, [])
+
+    def visit_statement(self, node: Mapping) -> None:
+        if node.get('type') != 'ImportDeclaration':
+            return
+        source = node.get('source')
+        module_name = source.get('value', '') if source else ''
+        if module_name:
+            _count(self.module_counts, module_name)
+            self._current.append(module_name)
+
+
+class ExportCollector(ASTCollector):
+    """Counts exported declaration types and records each file's exported names."""
+
+    statement_types = ()
+
+    def __init__(self):
+        self.type_counts = {}
+        self.file_exports = {}
+        self._current = None
+
+    def begin_file(self, filename: str) -> None:
+        self._current = self.file_exports.setdefault(filename, set())
+
+    def visit_statement(self, node: Mapping) -> None:
+        if node.get('type') not in ('ExportNamedDeclaration', 'ExportDefaultDeclaration'):
+            return
+        declaration = node.get('declaration')
+        if not declaration:
+            return
+
+        export_type = declaration.get('type', '')
+        if export_type:
+            _count(self.type_counts, export_type)
+
+        if declaration.get('id'):
+            exported_name = declaration['id'].get('name', '')
+            if exported_name:
+                self._current.add(exported_name)
+
+
+class ClassMethodCollector(ASTCollector):
+    """Counts method names of top-level class declarations."""
+
+    statement_types = ('ClassDeclaration',)
+
+    def __init__(self):
+        self.counts = {}
+
+    def visit_statement(self, node: Mapping) -> None:
+        if node.get('type') != 'ClassDeclaration' or 'body' not in node or 'body' not in node['body']:
+            return
+        for class_item in node['body']['body']:
+            if class_item.get('type') == 'MethodDefinition':
+                method_name = class_item.get('key', {}).get('name', '')
+                if method_name:
+                    _count(self.counts, method_name)
+
+
+class CallSiteCollector(ASTCollector):
+    """
+    Records member call sites (object name, method name) per file.
+
+    Call sites are resolved to services after all files are visited, since
+    that needs every file's exports.
+    """
+
+    node_types = ('CallExpression',)
+
+    def __init__(self):
+        self.file_calls = {}
+        self._current = None
+
+    def begin_file(self, filename: str) -> None:
+        self._current = self.file_calls.setdefault(filename, set())
+
+    def visit_node(self, node: Mapping) -> None:
+        callee = node.get('callee')
+        if not callee:
+            return
+
+        # Check for member expressions (e.g., serviceObj.method())
+        if callee.get('type') == 'MemberExpression' and callee.get('object') and callee.get('property'):
+            obj_name = callee['object'].get('name', '')
+            method_name = callee['property'].get('name', '')
+            self._current.add((obj_name, method_name))
+
+
+def required_statement_types(collectors: Iterable[ASTCollector]) -> Optional[Set[str]]:
+    """
+    Statement types a set of collectors needs in full.
+
+    Args:
+        collectors: Collectors to be run together
+
+    Returns:
+        Set of statement types, or None if some collector needs whole files
+    """
+    required = set()
+    for collector in collectors:
+        if collector.node_types:
+            return None
+        if type(collector).visit_statement is ASTCollector.visit_statement:
+            continue
+        if collector.statement_types is None:
+            return None
+        required.update(collector.statement_types)
+    return required
+
+
+def default_collectors() -> Dict[str, ASTCollector]:
+    """
+    Create the collectors behind extract_ast_patterns and extract_service_relationships.
+
+    Returns:
+        Dictionary mapping collector names to fresh collectors
+    """
+    return {
+        'declarations': DeclarationTypeCollector(),
+        'imports': ImportCollector(),
+        'exports': ExportCollector(),
+        'class_methods': ClassMethodCollector(),
+        'calls': CallSiteCollector()
+    }
@@ -0,0 +1,135 @@
+import io
+import os
+import gc
+import json
+import time
+import argparse
+import platform
+import tracemalloc
+import contextlib
+from typing import List, Dict, Any
+
+from ast_loader import DEFAULT_INTERNER_MAX_ENTRIES
+from v2_analyse_clusters import ASTClusterAnalyzer
+
+
+def cluster_ids_in(ast_dir: str) -> List[str]:
+    """
+    IDs of the cluster directories under ast_dir, in filename order.
+    """
+    return sorted(name[len('cluster_'):] for name in os.listdir(ast_dir)
+                  if name.startswith('cluster_') and os.path.isdir(os.path.join(ast_dir, name)))
+
+
+def new_analyzer(intern: bool, max_entries: int) -> ASTClusterAnalyzer:
+    """
+    Analyzer that parses the JSON files (stores are never interned).
+    """
+    return ASTClusterAnalyzer(api_key='', use_store=False, intern_subtrees=intern,
+                              intern_max_entries=max_entries)
+
+
+def time_run(cluster_ids: List[str], ast_dir: str, intern: bool, max_entries: int) -> Dict[str, Any]:
+    """
+    Load and walk every cluster in turn with one analyzer, as a run does.
+
+    Args:
+        cluster_ids: Clusters to process, in order
+        ast_dir: Base directory containing AST files
+        intern: Whether to intern subtrees
+        max_entries: Interned subtrees kept between clusters
+
+    Returns:
+        Load and feature-walk seconds, plus interner statistics
+    """
+    analyzer = new_analyzer(intern, max_entries)
+    load_seconds = walk_seconds = 0.0
+    for cluster_id in cluster_ids:
+        cluster_dir = os.path.join(ast_dir, f"cluster_{cluster_id}")
+        start = time.perf_counter()
+        ast_files = analyzer.load_ast_files(cluster_dir)
+        load_seconds += time.perf_counter() - start
+        start = time.perf_counter()
+        analyzer.extract_ast_features(ast_files)
+        walk_seconds += time.perf_counter() - start
+        del ast_files
+        analyzer._trim_shared_subtrees()
+
+    result = {'load_seconds': round(load_seconds, 3), 'walk_seconds': round(walk_seconds, 3)}
+    if analyzer.interner is not None:
+        stats = analyzer.interner.stats()
+        result['interned_nodes'] = stats['nodes']
+        result['retained_subtrees'] = stats['unique']
+        result['memoized_subtrees'] = len(analyzer.subtree_memo)
+    return result
+
+
+def measure_memory(cluster_ids: List[str], ast_dir: str, intern: bool, max_entries: int) -> Dict[str, float]:
+    """
+    Traced memory of the loaded trees, per cluster and for the whole corpus.
+
+    Every cluster stays loaded, so the last figure is what holding the
+    corpus costs; the interner's own tables are included.
+
+    Returns:
+        Largest single cluster and total corpus size in MB
+    """
+    analyzer = new_analyzer(intern, max_entries)
+    held = []
+    largest = 0
+    gc.collect()
+    tracemalloc.start()
+    start = tracemalloc.get_traced_memory()[0]
+    try:
+        for cluster_id in cluster_ids:
+            before = tracemalloc.get_traced_memory()[0]
+            held.append(analyzer.load_ast_files(os.path.join(ast_dir, f"cluster_{cluster_id}")))
+            largest = max(largest, tracemalloc.get_traced_memory()[0] - before)
+        total = tracemalloc.get_traced_memory()[0] - start
+    finally:
+        tracemalloc.stop()
+    return {'largest_cluster_mb': round(largest / (1024 * 1024), 1), 'corpus_mb': round(total / (1024 * 1024), 1)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Compare loading and walking AST_v2 clusters with and '
+                                                 'without subtree interning')
+    parser.add_argument('--ast-dir', default='AST_v2', help='Directory containing AST files')
+    parser.add_argument('--clusters', default=None, help='Comma-separated cluster IDs (default: all, in order)')
+    parser.add_argument('--max-entries', type=int, default=DEFAULT_INTERNER_MAX_ENTRIES,
+                        help='Interned subtrees kept between clusters')
+    parser.add_argument('--output', default=None, help='Write the results as JSON to this file')
+
+    args = parser.parse_args()
+    cluster_ids = args.clusters.split(',') if args.clusters else cluster_ids_in(args.ast_dir)
+
+    results = {
+        'meta': {
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'clusters': len(cluster_ids),
+            'max_entries': args.max_entries,
+            'created': time.strftime('%Y-%m-%d %H:%M:%S')
+        },
+        'results': {}
+    }
+    for mode, intern in (('plain', False), ('intern', True)):
+        print(f"Benchmarking {mode}...")
+        # Keep the analyzer's progress output out of the timings and the table
+        with contextlib.redirect_stdout(io.StringIO()):
+            result = time_run(cluster_ids, args.ast_dir, intern, args.max_entries)
+            result.update(measure_memory(cluster_ids, args.ast_dir, intern, args.max_entries))
+        results['results'][mode] = result
+
+    for mode, result in results['results'].items():
+        print(f"\n{mode}")
+        for name, value in result.items():
+            print(f"  {name:<22}{value:>12}")
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2)
+        print(f"\nResults saved to {args.output}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,260 @@
+import os
+import sys
+import json
+import math
+import time
+import asyncio
+import argparse
+import tempfile
+import functools
+import subprocess
+from typing import List, Dict, Any, Optional, Callable
+
+try:
+    import resource
+except ImportError:  # Not available on Windows
+    resource = None
+
+from mock_completions_server import MockCompletionsServer
+from v2_analyse_clusters import ASTClusterAnalyzer
+from report_writer import StreamingReportWriter
+from Cluster.cluster_data_sink_analyzer import ClusterDataSinkAnalyzer
+
+SCENARIOS = ('v2', 'v2-async', 'v2-batch', 'v2-stream', 'cluster-sink')
+
+
+def percentile(values: List[float], pct: float) -> float:
+    """
+    Nearest-rank percentile.
+
+    Args:
+        values: Samples
+        pct: Percentile between 0 and 100
+
+    Returns:
+        The percentile, or 0.0 without samples
+    """
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = max(1, math.ceil(pct / 100.0 * len(ordered)))
+    return ordered[min(rank, len(ordered)) - 1]
+
+
+def peak_memory_mb() -> Optional[float]:
+    """
+    Peak resident memory of this process and its finished children in MB.
+    """
+    if resource is None:
+        return None
+    peak = max(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+               resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss)
+    # ru_maxrss is in bytes on macOS and kilobytes elsewhere
+    return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+
+
+class ClusterTimer:
+    """
+    Records how long each cluster spends in completion calls.
+
+    Wraps an analyzer's per-attempt completion method on the instance, so
+    retries of one cluster add up to its latency. A batched call is
+    attributed in full to every cluster in the batch.
+    """
+
+    def __init__(self):
+        self.latencies = {}
+
+    def _add(self, cluster_ids: List[Any], elapsed: float) -> None:
+        for cluster_id in cluster_ids:
+            self.latencies[cluster_id] = self.latencies.get(cluster_id, 0.0) + elapsed
+
+    def wrap(self, obj: Any, name: str, cluster_ids: Callable[..., List[Any]]) -> None:
+        """
+        Time calls to obj.name.
+
+        Args:
+            obj: Analyzer instance
+            name: Method to wrap
+            cluster_ids: Maps the call arguments to the cluster IDs it serves
+        """
+        method = getattr(obj, name)
+
+        if asyncio.iscoroutinefunction(method):
+            @functools.wraps(method)
+            async def timed(*args, **kwargs):
+                start = time.perf_counter()
+                try:
+                    return await method(*args, **kwargs)
+                finally:
+                    self._add(cluster_ids(*args, **kwargs), time.perf_counter() - start)
+        else:
+            @functools.wraps(method)
+            def timed(*args, **kwargs):
+                start = time.perf_counter()
+                try:
+                    return method(*args, **kwargs)
+                finally:
+                    self._add(cluster_ids(*args, **kwargs), time.perf_counter() - start)
+
+        setattr(obj, name, timed)
+
+
+def list_cluster_ids(ast_dir: str) -> List[str]:
+    """
+    IDs of the cluster_N directories in ast_dir, in numeric order.
+    """
+    cluster_ids = [name[len('cluster_'):] for name in os.listdir(ast_dir)
+                   if name.startswith('cluster_') and os.path.isdir(os.path.join(ast_dir, name))]
+    return sorted(cluster_ids, key=lambda cluster_id: int(cluster_id) if cluster_id.lstrip('-').isdigit() else 0)
+
+
+def run_scenario(scenario: str, args: argparse.Namespace) -> Dict[str, Any]:
+    """
+    Run one scenario against a fresh mock server in this process.
+
+    Args:
+        scenario: One of SCENARIOS
+        args: Parsed command line arguments
+
+    Returns:
+        Dictionary of metrics
+    """
+    server = MockCompletionsServer(latency=args.latency, error_rate=args.error_rate,
+                                   retry_after=args.retry_after,
+                                   completion_tokens=args.completion_tokens).start()
+    timer = ClusterTimer()
+    cluster_ids = args.clusters.split(',') if args.clusters else list_cluster_ids(args.ast_dir)
+
+    try:
+        if scenario == 'cluster-sink':
+            with open(args.cluster_data, 'r', encoding='utf-8') as f:
+                clusters = json.load(f)
+            if args.clusters:
+                clusters = [cluster for cluster in clusters if str(cluster.get('cluster_id')) in cluster_ids]
+
+            analyzer = ClusterDataSinkAnalyzer(api_key='benchmark')
+            analyzer.base_url = server.url
+            timer.wrap(analyzer, '_analyze_cluster_once', lambda cluster: [cluster.get('cluster_id')])
+
+            start = time.perf_counter()
+            results = analyzer.analyze_all_clusters(clusters)
+            elapsed = time.perf_counter() - start
+        else:
+            analyzer = ASTClusterAnalyzer(api_key='benchmark')
+            analyzer.base_url = server.url
+            timer.wrap(analyzer, '_complete_cluster_once', lambda prepared: [prepared['cluster_id']])
+            timer.wrap(analyzer, '_complete_cluster_once_async', lambda prepared, client: [prepared['cluster_id']])
+            timer.wrap(analyzer, '_stream_cluster_once', lambda prepared, writer: [prepared['cluster_id']])
+            timer.wrap(analyzer, '_complete_batch_once', lambda batch: [p['cluster_id'] for p in batch])
+
+            start = time.perf_counter()
+            if scenario == 'v2-async':
+                results = asyncio.run(analyzer.analyze_multiple_clusters_async(
+                    cluster_ids, args.ast_dir, args.max_files, args.workers,
+                    max_concurrency=args.concurrency, requests_per_minute=None
+                ))
+            elif scenario == 'v2-stream':
+                with tempfile.TemporaryDirectory() as tmp:
+                    writer = StreamingReportWriter(os.path.join(tmp, 'report.md'))
+                    results = analyzer.analyze_multiple_clusters(cluster_ids, args.ast_dir, args.max_files,
+                                                                 args.workers, report_writer=writer)
+                    writer.finish(results)
+            else:
+                batch_tokens = args.batch_tokens if scenario == 'v2-batch' else 0
+                results = analyzer.analyze_multiple_clusters(cluster_ids, args.ast_dir, args.max_files,
+                                                             args.workers, batch_tokens=batch_tokens)
+            elapsed = time.perf_counter() - start
+    finally:
+        server.stop()
+
+    latencies = list(timer.latencies.values())
+    return {
+        'scenario': scenario,
+        'clusters': len(results),
+        'seconds': elapsed,
+        'clusters_per_second': len(results) / elapsed if elapsed else 0.0,
+        'p50': percentile(latencies, 50),
+        'p95': percentile(latencies, 95),
+        'p99': percentile(latencies, 99),
+        'peak_memory_mb': peak_memory_mb(),
+        'requests': server.stats['requests'],
+        'throttled': server.stats['throttled']
+    }
+
+
+def run_scenario_in_subprocess(scenario: str, verbose: bool) -> Dict[str, Any]:
+    """
+    Run a scenario in a child process so peak memory is measured per scenario.
+    """
+    with tempfile.TemporaryDirectory() as tmp:
+        result_file = os.path.join(tmp, 'result.json')
+        command = [sys.executable, os.path.abspath(__file__)] + sys.argv[1:] + \
+                  ['--run-scenario', scenario, '--result-file', result_file]
+        subprocess.run(command, check=True, stdout=None if verbose else subprocess.DEVNULL)
+        with open(result_file, 'r', encoding='utf-8') as f:
+            return json.load(f)
+
+
+def print_table(results: List[Dict[str, Any]]) -> None:
+    """
+    Print benchmark metrics as a table.
+    """
+    print(f"{'scenario':<14}{'clusters':>9}{'seconds':>9}{'clust/s':>9}{'p50 s':>8}{'p95 s':>8}"
+          f"{'p99 s':>8}{'peak MB':>9}{'reqs':>6}{'429s':>6}")
+    for result in results:
+        peak = result['peak_memory_mb']
+        print(f"{result['scenario']:<14}{result['clusters']:>9}{result['seconds']:>9.2f}"
+              f"{result['clusters_per_second']:>9.3f}{result['p50']:>8.2f}{result['p95']:>8.2f}"
+              f"{result['p99']:>8.2f}{(f'{peak:.1f}' if peak is not None else '-'):>9}"
+              f"{result['requests']:>6}{result['throttled']:>6}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='End-to-end throughput benchmark against a local mock completions server')
+    parser.add_argument('--scenarios', default=','.join(SCENARIOS),
+                        help=f"Comma-separated scenarios to run ({', '.join(SCENARIOS)})")
+    parser.add_argument('--ast-dir', default='AST_v2', help='Directory containing AST files')
+    parser.add_argument('--clusters', default=None, help='Comma-separated cluster IDs (default: all clusters)')
+    parser.add_argument('--cluster-data', default='updated_clusters.json',
+                        help='Cluster metadata for the cluster-sink scenario')
+    parser.add_argument('--max-files', type=int, default=None, help='Maximum number of files to analyze per cluster')
+    parser.add_argument('--workers', type=int, default=1, help='Number of processes for the local analysis stages')
+    parser.add_argument('--concurrency', type=int, default=4, help='API requests in flight for v2-async')
+    parser.add_argument('--batch-tokens', type=int, default=8000, help='Prompt token limit per request for v2-batch')
+    parser.add_argument('--latency', default='lognormal:0,0.5', help='Mock response latency distribution')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='Fraction of mock requests answered with 429')
+    parser.add_argument('--retry-after', type=float, default=1.0, help='Retry-After seconds sent with 429s')
+    parser.add_argument('--completion-tokens', type=int, default=200, help='Approximate mock answer size in tokens')
+    parser.add_argument('--output', default=None, help='Write the metrics as JSON to this file')
+    parser.add_argument('--verbose', action='store_true', help='Show the analyzers\' progress output')
+    parser.add_argument('--run-scenario', choices=SCENARIOS, help=argparse.SUPPRESS)
+    parser.add_argument('--result-file', help=argparse.SUPPRESS)
+
+    args = parser.parse_args()
+
+    # Child process: run a single scenario and hand the metrics back
+    if args.run_scenario:
+        result = run_scenario(args.run_scenario, args)
+        with open(args.result_file, 'w', encoding='utf-8') as f:
+            json.dump(result, f)
+        return
+
+    scenarios = args.scenarios.split(',')
+    for scenario in scenarios:
+        if scenario not in SCENARIOS:
+            parser.error(f"Unknown scenario: {scenario}")
+
+    results = []
+    for scenario in scenarios:
+        print(f"Running {scenario}...")
+        results.append(run_scenario_in_subprocess(scenario, args.verbose))
+
+    print_table(results)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2)
+        print(f"Metrics saved to {args.output}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,217 @@
+import io
+import os
+import sys
+import json
+import time
+import platform
+import argparse
+import statistics
+import tempfile
+import contextlib
+from typing import List, Dict, Any, Callable
+
+from v2_analyse_clusters import ASTClusterAnalyzer
+
+# Small (cluster_33, cluster_27), medium (cluster_9) and large clusters
+# (cluster_5 holds workspace.repository.ast.json, cluster_-1 is the biggest)
+DEFAULT_CLUSTERS = '33,27,9,5,-1'
+
+STAGES = ('load_ast_files', 'simplify_ast', 'extract_ast_patterns', 'extract_service_relationships',
+          '_find_method_calls', 'generate_flow_chart', 'compile_report')
+
+
+def time_call(func: Callable[[], Any], repeat: int) -> float:
+    """
+    Median wall time of func over repeat runs.
+
+    Args:
+        func: Function to time
+        repeat: Number of runs
+
+    Returns:
+        Median time in seconds
+    """
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        samples.append(time.perf_counter() - start)
+    return statistics.median(samples)
+
+
+def benchmark_cluster(analyzer: ASTClusterAnalyzer, cluster_id: str, ast_dir: str,
+                      max_files: int, repeat: int) -> Dict[str, float]:
+    """
+    Time each local stage of the analyzer on one cluster.
+
+    Every stage is timed on its own, with its inputs computed beforehand.
+
+    Args:
+        analyzer: Analyzer to benchmark
+        cluster_id: ID of the cluster
+        ast_dir: Base directory containing AST files
+        max_files: Maximum number of files to load
+        repeat: Runs per stage (the median is kept)
+
+    Returns:
+        Dictionary mapping stage names to seconds
+    """
+    cluster_dir = os.path.join(ast_dir, f"cluster_{cluster_id}")
+    timings = {}
+
+    timings['load_ast_files'] = time_call(lambda: analyzer.load_ast_files(cluster_dir, max_files), repeat)
+    ast_files = analyzer.load_ast_files(cluster_dir, max_files)
+
+    def simplify_all():
+        for file_data in ast_files:
+            analyzer.simplify_ast(file_data['ast'])
+    timings['simplify_ast'] = time_call(simplify_all, repeat)
+
+    timings['extract_ast_patterns'] = time_call(lambda: analyzer.extract_ast_patterns(ast_files), repeat)
+    patterns = analyzer.extract_ast_patterns(ast_files)
+
+    timings['extract_service_relationships'] = time_call(
+        lambda: analyzer.extract_service_relationships(ast_files), repeat
+    )
+    relationships = analyzer.extract_service_relationships(ast_files)
+
+    def find_all_method_calls():
+        method_calls = []
+        for file_data in ast_files:
+            service_name = file_data['filename'].replace('.ast.json', '')
+            analyzer._find_method_calls(file_data['ast'], service_name,
+                                        relationships['service_methods'], method_calls)
+    timings['_find_method_calls'] = time_call(find_all_method_calls, repeat)
+
+    timings['generate_flow_chart'] = time_call(lambda: analyzer.generate_flow_chart(relationships), repeat)
+    flow_chart = analyzer.generate_flow_chart(relationships)
+
+    # compile_report over a synthetic result for this cluster
+    analyzer.results = [{
+        "cluster_id": cluster_id,
+        "category": analyzer.categorize_cluster(ast_files, patterns),
+        "analysis": "Benchmark analysis text.\n" * 200,
+        "file_count": len(ast_files),
+        "patterns": patterns,
+        "flow_chart": flow_chart,
+        "relationships": relationships,
+        "file_sample": [file_data['filename'] for file_data in ast_files[:5]]
+    }]
+    with tempfile.TemporaryDirectory() as tmp:
+        report_path = os.path.join(tmp, 'report.md')
+        timings['compile_report'] = time_call(lambda: analyzer.compile_report(report_path), repeat)
+    analyzer.results = []
+    analyzer.close_stores()
+
+    return timings
+
+
+def compare(baseline: Dict[str, Any], current: Dict[str, Any], threshold: float,
+            min_delta: float) -> List[str]:
+    """
+    Find stages that slowed down relative to a baseline.
+
+    A stage regresses when it is more than threshold (a fraction) slower
+    and at least min_delta seconds slower, so timer noise on very fast
+    stages does not fail the comparison.
+
+    Args:
+        baseline: Earlier benchmark output
+        current: New benchmark output
+        threshold: Allowed relative slowdown (0.2 = 20%)
+        min_delta: Smallest absolute slowdown in seconds that counts
+
+    Returns:
+        Descriptions of the regressions
+    """
+    regressions = []
+    for cluster_id, stages in current['results'].items():
+        baseline_stages = baseline['results'].get(cluster_id, {})
+        for stage, seconds in stages.items():
+            before = baseline_stages.get(stage)
+            if before is None:
+                continue
+            if seconds > before * (1 + threshold) and seconds - before >= min_delta:
+                regressions.append(
+                    f"cluster_{cluster_id} {stage}: {before * 1000:.1f} ms -> {seconds * 1000:.1f} ms "
+                    f"(+{(seconds / before - 1) * 100 if before else float('inf'):.0f}%)"
+                )
+    return regressions
+
+
+def print_table(current: Dict[str, Any], baseline: Dict[str, Any] = None) -> None:
+    """
+    Print stage timings in milliseconds, with the change from a baseline if given.
+    """
+    for cluster_id, stages in current['results'].items():
+        print(f"\ncluster_{cluster_id}")
+        for stage in STAGES:
+            seconds = stages.get(stage)
+            if seconds is None:
+                continue
+            line = f"  {stage:<32}{seconds * 1000:>10.2f} ms"
+            if baseline is not None:
+                before = baseline['results'].get(cluster_id, {}).get(stage)
+                if before:
+                    line += f"  ({(seconds / before - 1) * 100:+.0f}%)"
+            print(line)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Time the local stages of ASTClusterAnalyzer on AST_v2 clusters')
+    parser.add_argument('--ast-dir', default='AST_v2', help='Directory containing AST files')
+    parser.add_argument('--clusters', default=DEFAULT_CLUSTERS, help='Comma-separated cluster IDs to benchmark')
+    parser.add_argument('--max-files', type=int, default=None, help='Maximum number of files to load per cluster')
+    parser.add_argument('--repeat', type=int, default=5, help='Runs per stage (the median is kept)')
+    parser.add_argument('--no-store', action='store_true', help='Ignore columnar AST stores and parse the JSON files')
+    parser.add_argument('--output', default=None, help='Write the timings as a JSON baseline to this file')
+    parser.add_argument('--compare', default=None, help='Baseline JSON to compare against')
+    parser.add_argument('--threshold', type=float, default=0.25,
+                        help='Allowed relative slowdown per stage when comparing (0.25 = 25%%)')
+    parser.add_argument('--min-delta', type=float, default=0.002,
+                        help='Ignore slowdowns smaller than this many seconds when comparing')
+
+    args = parser.parse_args()
+
+    analyzer = ASTClusterAnalyzer(api_key='', use_store=not args.no_store)
+    current = {
+        'meta': {
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'repeat': args.repeat,
+            'max_files': args.max_files,
+            'use_store': not args.no_store,
+            'created': time.strftime('%Y-%m-%d %H:%M:%S')
+        },
+        'results': {}
+    }
+
+    for cluster_id in args.clusters.split(','):
+        print(f"Benchmarking cluster {cluster_id}...")
+        # Keep the analyzer's progress output out of the timings and the table
+        with contextlib.redirect_stdout(io.StringIO()):
+            current['results'][cluster_id] = benchmark_cluster(analyzer, cluster_id, args.ast_dir,
+                                                               args.max_files, args.repeat)
+
+    baseline = None
+    if args.compare:
+        with open(args.compare, 'r', encoding='utf-8') as f:
+            baseline = json.load(f)
+    print_table(current, baseline)
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(current, f, indent=2)
+        print(f"\nTimings saved to {args.output}")
+
+    if baseline is not None:
+        regressions = compare(baseline, current, args.threshold, args.min_delta)
+        if regressions:
+            print(f"\n{len(regressions)} stage(s) slower than the baseline by more than {args.threshold:.0%}:")
+            for regression in regressions:
+                print(f"  {regression}")
+            sys.exit(1)
+        print(f"\nNo stage slower than the baseline by more than {args.threshold:.0%}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,455 @@
+import os
+import json
+import time
+import argparse
+from typing import List, Dict, Any, Optional, Tuple
+
+import numpy as np
+from scipy import sparse
+
+from ast_features import (FeatureMatrix, DEFAULT_AST_TEXT_DIR, NOISE_CLUSTER_ID, inverse_document_frequency,
+                          rank_features, transform_sequences, weight_counts)
+
+DEFAULT_CENTROIDS_FILE = 'cluster_centroids.npz'
+DEFAULT_CLUSTERS_FILE = 'updated_clusters.json'
+# Bumped when the saved layout changes; older files are rebuilt
+MODEL_VERSION = 2
+# A file is an outlier when it is less similar to its nearest centroid than
+# this percentile of that cluster's own members were when the model was built.
+# Members already below it stay in their cluster unless they get less similar.
+RADIUS_PERCENTILE = 1
+# Slack for floating-point error when comparing with a member's own similarity
+SIMILARITY_TOLERANCE = 1e-9
+# Files scored against the centroids at a time
+ASSIGN_BATCH = 4096
+
+
+def member_name(path: str) -> str:
+    """
+    Key of a file: its path as recorded in file_paths, with forward slashes.
+
+    Files with the same basename in different directories are different members.
+    """
+    return path.replace('\\', '/')
+
+
+def sequence_path(sequence_file: str, path_prefix: str = '') -> str:
+    """
+    Path to record for a node-type sequence file (prefix/x.ts for x.ts.txt).
+    """
+    name = os.path.basename(sequence_file)
+    if name.endswith('.txt'):
+        name = name[:-len('.txt')]
+    return os.path.join(path_prefix, name)
+
+
+def _normalize_rows(matrix: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    return matrix / np.where(norms > 0, norms, 1.0)
+
+
+class CentroidModel:
+    """
+    Cluster centroids in the n-gram feature space of ast_features.py.
+
+    Files are compared by TF-IDF cosine similarity, with the IDF frozen when
+    the model is built so new files do not move the space. Each cluster keeps
+    the sum of its members' TF-IDF rows (its centroid direction) and of their
+    TF rows (for top_features), and the members' raw counts are kept so a
+    changed file's old contribution can be subtracted. Moving files between
+    clusters therefore only touches the two clusters involved.
+
+    Members are keyed by their recorded path (see member_name), and each
+    keeps its similarity to its own centroid from when it was added.
+    """
+
+    def __init__(self, node_types: List[str], features: np.ndarray, ngram_range: Tuple[int, int],
+                 idf: np.ndarray, cluster_ids: np.ndarray, sums: np.ndarray, tf_sums: np.ndarray,
+                 counts: np.ndarray, radii: np.ndarray, member_names: List[str],
+                 member_clusters: np.ndarray, member_counts: sparse.csr_matrix,
+                 member_similarity: np.ndarray):
+        self.node_types = node_types
+        self.features = features
+        self.ngram_range = tuple(ngram_range)
+        self.idf = idf
+        self.cluster_ids = cluster_ids
+        self.sums = sums
+        self.tf_sums = tf_sums
+        self.counts = counts
+        self.radii = radii
+        self.member_names = member_names
+        self.member_clusters = member_clusters
+        self.member_counts = member_counts
+        self.member_similarity = member_similarity
+        self.positions = {cluster_id: position for position, cluster_id in enumerate(cluster_ids.tolist())}
+        self.members = {name: row for row, name in enumerate(member_names)}
+
+    @classmethod
+    def build(cls, matrix: FeatureMatrix, clusters: List[Dict[str, Any]],
+              radius_percentile: float = RADIUS_PERCENTILE) -> 'CentroidModel':
+        """
+        Build centroids from a clustering snapshot.
+
+        Args:
+            matrix: Feature matrix of the corpus
+            clusters: Cluster dictionaries with cluster_id and file_paths
+            radius_percentile: Percentile of member similarity below which files are outliers
+
+        Returns:
+            CentroidModel
+        """
+        idf = inverse_document_frequency(matrix.counts)
+        tfidf = weight_counts(matrix.counts, 'tfidf', idf)
+        tf = weight_counts(matrix.counts, 'tf')
+
+        cluster_ids = sorted(cluster['cluster_id'] for cluster in clusters if cluster['cluster_id'] != NOISE_CLUSTER_ID)
+        positions = {cluster_id: position for position, cluster_id in enumerate(cluster_ids)}
+
+        rows = []
+        member_names = []
+        member_clusters = []
+        for cluster in clusters:
+            for path in cluster.get('file_paths', []):
+                path_rows = matrix.rows_for_paths([path])
+                if path_rows:
+                    rows.append(path_rows[0])
+                    member_names.append(member_name(path))
+                    member_clusters.append(cluster['cluster_id'])
+        rows = np.array(rows, dtype=np.int64)
+        member_clusters = np.array(member_clusters, dtype=np.int64)
+
+        sums, tf_sums, counts = cls._cluster_sums(tfidf[rows], tf[rows], member_clusters, positions)
+
+        # Outlier radius: low percentile of each cluster's members' similarity to their centroid
+        radii = np.zeros(len(cluster_ids))
+        similarities = np.asarray(tfidf[rows] @ _normalize_rows(sums).T)
+        member_similarity = np.zeros(len(rows))
+        for cluster_id, position in positions.items():
+            is_member = member_clusters == cluster_id
+            own = similarities[is_member, position]
+            member_similarity[is_member] = own
+            if len(own):
+                radii[position] = np.percentile(own, radius_percentile)
+
+        return cls(matrix.node_types, matrix.features, matrix.ngram_range, idf,
+                   np.array(cluster_ids, dtype=np.int64), sums, tf_sums, counts, radii,
+                   member_names, member_clusters, matrix.counts[rows], member_similarity)
+
+    @staticmethod
+    def _cluster_sums(tfidf: sparse.csr_matrix, tf: sparse.csr_matrix, cluster_of: np.ndarray,
+                      positions: Dict[int, int]) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Per-cluster sums of TF-IDF and TF rows and member counts (noise rows are left out).
+        """
+        position_of = np.array([positions.get(cluster_id, -1) for cluster_id in cluster_of.tolist()], dtype=np.int64)
+        keep = np.flatnonzero(position_of >= 0)
+        indicator = sparse.csr_matrix(
+            (np.ones(len(keep)), (position_of[keep], keep)), shape=(len(positions), len(cluster_of))
+        )
+        counts = np.bincount(position_of[keep], minlength=len(positions)).astype(np.int64)
+        return (indicator @ tfidf).toarray(), (indicator @ tf).toarray(), counts
+
+    def save(self, path: str) -> None:
+        # Write to a temporary file first so an interrupted save keeps the old model
+        with open(path + '.tmp', 'wb') as f:
+            np.savez_compressed(
+                f,
+                version=np.array(MODEL_VERSION),
+                node_types=np.array(self.node_types, dtype=str), features=self.features,
+                ngram_range=np.array(self.ngram_range), idf=self.idf, cluster_ids=self.cluster_ids,
+                sums=self.sums, tf_sums=self.tf_sums, counts=self.counts, radii=self.radii,
+                member_names=np.array(self.member_names, dtype=str), member_clusters=self.member_clusters,
+                member_data=self.member_counts.data, member_indices=self.member_counts.indices,
+                member_indptr=self.member_counts.indptr, member_similarity=self.member_similarity
+            )
+        os.replace(path + '.tmp', path)
+
+    @classmethod
+    def load(cls, path: str) -> 'CentroidModel':
+        with np.load(path, allow_pickle=False) as saved:
+            if 'version' not in saved.files or int(saved['version']) != MODEL_VERSION:
+                raise ValueError(f"{path} was saved by an incompatible version")
+            member_counts = sparse.csr_matrix(
+                (saved['member_data'], saved['member_indices'], saved['member_indptr']),
+                shape=(len(saved['member_names']), len(saved['features']))
+            )
+            return cls(saved['node_types'].tolist(), saved['features'], tuple(saved['ngram_range'].tolist()),
+                       saved['idf'], saved['cluster_ids'], saved['sums'], saved['tf_sums'], saved['counts'],
+                       saved['radii'], saved['member_names'].tolist(), saved['member_clusters'], member_counts,
+                       saved['member_similarity'])
+
+    def vectorize(self, sequences: List[List[str]]) -> sparse.csr_matrix:
+        """
+        Count the n-grams of node-type sequences in the model's feature space.
+        """
+        return transform_sequences(sequences, self.node_types, self.features, self.ngram_range)
+
+    def assign(self, counts: sparse.csr_matrix, min_similarity: float = 0.0,
+               names: Optional[List[str]] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Find the nearest centroid of each file.
+
+        An existing member that is outside the radius of its nearest centroid
+        stays in its own cluster as long as it is at least as similar to it
+        as when it was added, even if that was already below the radius.
+
+        Args:
+            counts: Files x features count matrix (see vectorize)
+            min_similarity: Cosine similarity below which a file is an outlier
+                regardless of the cluster's radius
+            names: Member key of each file (see member_name), to recognize
+                existing members (None treats every file as new)
+
+        Returns:
+            Tuple of (cluster ID of each file, NOISE_CLUSTER_ID for outliers;
+            similarity to the assigned, or for outliers the nearest, centroid)
+        """
+        centroids = _normalize_rows(self.sums).T
+        tfidf = weight_counts(counts, 'tfidf', self.idf)
+
+        # Centroid position and own similarity of existing members (-1 for new files and noise)
+        current = np.full(counts.shape[0], -1, dtype=np.int64)
+        own = np.zeros(counts.shape[0])
+        for i, name in enumerate(names or []):
+            row = self.members.get(name)
+            if row is not None:
+                current[i] = self.positions.get(int(self.member_clusters[row]), -1)
+                own[i] = self.member_similarity[row] - SIMILARITY_TOLERANCE
+
+        assigned = np.full(counts.shape[0], NOISE_CLUSTER_ID, dtype=np.int64)
+        best = np.zeros(counts.shape[0])
+        for start in range(0, counts.shape[0], ASSIGN_BATCH):
+            similarities = np.asarray(tfidf[start:start + ASSIGN_BATCH] @ centroids)
+            if not similarities.size:
+                continue
+            batch = slice(start, start + len(similarities))
+            nearest = similarities.argmax(axis=1)
+            best[batch] = similarities[np.arange(len(nearest)), nearest]
+            inside = best[batch] >= np.maximum(self.radii[nearest], min_similarity)
+            assigned[batch][inside] = self.cluster_ids[nearest[inside]]
+
+            # Members that fit no nearer cluster stay in their own
+            outside = np.flatnonzero(~inside & (current[batch] >= 0))
+            positions = current[batch][outside]
+            similarity = similarities[outside, positions]
+            stays = similarity >= np.maximum(np.minimum(self.radii[positions], own[batch][outside]), min_similarity)
+            assigned[batch][outside[stays]] = self.cluster_ids[positions[stays]]
+            best[batch][outside[stays]] = similarity[stays]
+        return assigned, best
+
+    def update(self, names: List[str], counts: sparse.csr_matrix, assigned: np.ndarray,
+               similarity: np.ndarray) -> Dict[str, Tuple[Optional[int], int]]:
+        """
+        Record assignments, moving changed files out of their previous cluster.
+
+        A file is a new version of a member only if its key matches the
+        member's recorded path.
+
+        Args:
+            names: Member key of each file (see member_name)
+            counts: Files x features count matrix
+            assigned: Cluster ID of each file
+            similarity: Similarity of each file to its nearest centroid (see assign)
+
+        Returns:
+            Dictionary mapping each name to (previous cluster ID or None, new cluster ID)
+        """
+        changes = {}
+        previous_rows = []
+        for name, cluster_id in zip(names, assigned.tolist()):
+            row = self.members.get(name)
+            changes[name] = (None if row is None else int(self.member_clusters[row]), cluster_id)
+            if row is not None:
+                previous_rows.append(row)
+
+        # Subtract the previous versions, then add the new ones
+        if previous_rows:
+            previous = self.member_counts[previous_rows]
+            sums, tf_sums, member_counts = self._cluster_sums(
+                weight_counts(previous, 'tfidf', self.idf), weight_counts(previous, 'tf'),
+                self.member_clusters[previous_rows], self.positions
+            )
+            self.sums -= sums
+            self.tf_sums -= tf_sums
+            self.counts -= member_counts
+        sums, tf_sums, member_counts = self._cluster_sums(
+            weight_counts(counts, 'tfidf', self.idf), weight_counts(counts, 'tf'), assigned, self.positions
+        )
+        self.sums += sums
+        self.tf_sums += tf_sums
+        self.counts += member_counts
+
+        keep = np.ones(len(self.member_names), dtype=bool)
+        keep[previous_rows] = False
+        kept = np.flatnonzero(keep)
+        self.member_names = [self.member_names[row] for row in kept] + list(names)
+        self.member_clusters = np.concatenate((self.member_clusters[kept], assigned))
+        self.member_counts = sparse.vstack((self.member_counts[kept], counts.astype(self.member_counts.dtype)),
+                                           format='csr')
+        self.member_similarity = np.concatenate((self.member_similarity[kept], similarity))
+        self.members = {name: row for row, name in enumerate(self.member_names)}
+        return changes
+
+    def top_features(self, cluster_id: int, top: int = 5) -> str:
+        """
+        Highest mean-TF n-grams of a cluster, formatted like top_features in the cluster JSON.
+        """
+        position = self.positions[cluster_id]
+        if not self.counts[position]:
+            return ""
+        return ", ".join(rank_features(self.tf_sums[position], self.features, self.node_types, top))
+
+
+def update_cluster_metadata(clusters: List[Dict[str, Any]], changes: Dict[str, Tuple[Optional[int], int]],
+                            paths: Dict[str, str], model: CentroidModel, top: int = 5) -> List[int]:
+    """
+    Apply assignments to the cluster JSON, touching only affected clusters.
+
+    Moved files keep their recorded path. New files get the path in paths.
+    Outliers go to the noise cluster, whose top_features stay empty.
+    Files are matched to the JSON by their full recorded path, so a new
+    file sharing a basename with a listed one leaves that one in place.
+
+    Args:
+        clusters: Cluster dictionaries, updated in place
+        changes: Output of CentroidModel.update
+        paths: Path to record for each new file, by member key
+        model: Updated centroid model
+        top: Number of top features per cluster
+
+    Returns:
+        Sorted IDs of the clusters whose metadata changed
+    """
+    by_id = {cluster['cluster_id']: cluster for cluster in clusters}
+    affected = set()
+
+    recorded_paths = {}
+    for cluster in clusters:
+        for path in cluster.get('file_paths', []):
+            recorded_paths[member_name(path)] = (cluster['cluster_id'], path)
+
+    for name, (previous, cluster_id) in changes.items():
+        recorded = recorded_paths.get(name)
+        path = recorded[1] if recorded else paths[name]
+        # The JSON is the record of where a file is listed; it can differ from the model's
+        listed_in = recorded[0] if recorded else previous
+        if listed_in == cluster_id and recorded:
+            continue
+        if recorded:
+            by_id[listed_in]['file_paths'].remove(path)
+            affected.add(listed_in)
+        if cluster_id not in by_id:
+            by_id[cluster_id] = {'cluster_id': cluster_id, 'num_files': 0, 'top_features': '',
+                                 'file_paths': [], 'sample_asts': []}
+            clusters.append(by_id[cluster_id])
+        by_id[cluster_id]['file_paths'].append(path)
+        affected.add(cluster_id)
+
+    # Content changes also move the centroid of a cluster a file stayed in
+    affected.update(cluster_id for previous, cluster_id in changes.values() if previous == cluster_id)
+
+    for cluster_id in affected:
+        cluster = by_id[cluster_id]
+        cluster['num_files'] = len(cluster['file_paths'])
+        if cluster_id != NOISE_CLUSTER_ID:
+            cluster['top_features'] = model.top_features(cluster_id, top)
+    return sorted(affected)
+
+
+def read_sequence_files(paths: List[str]) -> Tuple[List[str], List[List[str]]]:
+    """
+    Read node-type sequence files, expanding directories to their *.txt files.
+
+    Returns:
+        Tuple of (file paths, node types of each file)
+    """
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            files.extend(os.path.join(path, name) for name in sorted(os.listdir(path)) if name.endswith('.txt'))
+        else:
+            files.append(path)
+
+    sequences = []
+    for path in files:
+        with open(path, 'r', encoding='utf-8') as f:
+            sequences.append(f.read().split())
+    return files, sequences
+
+
+def load_or_build_model(centroids_file: str, ast_dir: str, clusters: List[Dict[str, Any]],
+                        rebuild: bool = False) -> CentroidModel:
+    """
+    Load the persisted centroids, building them from the snapshot if missing.
+    """
+    if not rebuild and os.path.exists(centroids_file):
+        try:
+            return CentroidModel.load(centroids_file)
+        except (OSError, ValueError, KeyError) as e:
+            print(f"Ignoring unusable centroids {centroids_file}: {str(e)}")
+    print(f"Building centroids from {ast_dir}...")
+    model = CentroidModel.build(FeatureMatrix.build(ast_dir), clusters)
+    model.save(centroids_file)
+    print(f"Centroids for {len(model.cluster_ids)} clusters saved to {centroids_file}")
+    return model
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Assign new or changed files to the nearest existing cluster')
+    parser.add_argument('files', nargs='*', help='Node-type sequence files (*.ts.txt) or directories of them')
+    parser.add_argument('--clusters', default=DEFAULT_CLUSTERS_FILE, help='Cluster JSON to update')
+    parser.add_argument('--output', default=None, help='Write the updated clusters here (default: update --clusters in place)')
+    parser.add_argument('--centroids', default=DEFAULT_CENTROIDS_FILE, help='.npz file persisting the centroid model')
+    parser.add_argument('--ast-dir', default=DEFAULT_AST_TEXT_DIR,
+                        help='Sequence files of the clustered snapshot, for building the centroids')
+    parser.add_argument('--rebuild', action='store_true', help='Rebuild the centroids from --ast-dir and --clusters')
+    parser.add_argument('--min-similarity', type=float, default=0.0,
+                        help='Send files less similar than this to their nearest centroid to cluster -1')
+    parser.add_argument('--path-prefix', default='',
+                        help='Directory recorded in file_paths for the files (e.g. their source directory); '
+                             'a file replaces a listed one only if the recorded paths match')
+    parser.add_argument('--top', type=int, default=5, help='Number of top features per cluster')
+    parser.add_argument('--dry-run', action='store_true', help='Print the assignments without saving anything')
+
+    args = parser.parse_args()
+
+    with open(args.clusters, 'r', encoding='utf-8') as f:
+        clusters = json.load(f)
+    model = load_or_build_model(args.centroids, args.ast_dir, clusters, args.rebuild)
+    if not args.files:
+        return
+
+    files, sequences = read_sequence_files(args.files)
+    start = time.perf_counter()
+    # Each file is recorded (and matched against existing members) as --path-prefix/<name>
+    paths = {}
+    for path in files:
+        recorded = sequence_path(path, args.path_prefix)
+        paths[member_name(recorded)] = recorded
+    if len(paths) < len(files):
+        parser.error('several files would be recorded under the same path; '
+                     'assign them in separate runs with different --path-prefix values')
+    names = list(paths)
+
+    counts = model.vectorize(sequences)
+    assigned, similarity = model.assign(counts, args.min_similarity, names)
+    elapsed = time.perf_counter() - start
+
+    for name, cluster_id, score in zip(names, assigned.tolist(), similarity.tolist()):
+        print(f"{name}: cluster {cluster_id} (similarity {score:.3f})")
+    print(f"Assigned {len(files)} files in {elapsed * 1000:.1f} ms "
+          f"({elapsed * 1000 / max(len(files), 1):.2f} ms per file)")
+    if args.dry_run:
+        return
+
+    changes = model.update(names, counts, assigned, similarity)
+    affected = update_cluster_metadata(clusters, changes, paths, model, args.top)
+
+    output = args.output or args.clusters
+    with open(output, 'w', encoding='utf-8') as f:
+        json.dump(clusters, f, indent=2)
+    model.save(args.centroids)
+    print(f"Updated clusters {', '.join(str(cluster_id) for cluster_id in affected) or 'none'} in {output}")
+
+if __name__ == '__main__':
+    main()
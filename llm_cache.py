@@ -0,0 +1,140 @@
+import json
+import time
+import sqlite3
+import hashlib
+from typing import Dict, Optional
+
+DEFAULT_CACHE_PATH = '.llm_cache.sqlite'
+
+
+class ResponseCache:
+    """
+    Persistent content-addressed cache of completion responses.
+
+    Entries are keyed by a hash of (model, prompt, max_tokens, temperature)
+    and stored in SQLite. Least recently used entries are evicted beyond
+    max_entries or max_bytes, and entries older than ttl seconds expire.
+    """
+
+    def __init__(self, path: str = DEFAULT_CACHE_PATH, max_entries: Optional[int] = None,
+                 max_bytes: Optional[int] = None, ttl: Optional[float] = None):
+        """
+        Open (or create) the cache.
+
+        Args:
+            path: SQLite database file
+            max_entries: Maximum number of cached responses (None for no limit)
+            max_bytes: Maximum total size of cached responses (None for no limit)
+            ttl: Entry lifetime in seconds (None for no expiry)
+        """
+        self.path = path
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS responses ("
+            "key TEXT PRIMARY KEY, response TEXT NOT NULL, size INTEGER NOT NULL, "
+            "created REAL NOT NULL, last_used REAL NOT NULL)"
+        )
+        self.conn.execute("CREATE INDEX IF NOT EXISTS responses_last_used ON responses (last_used)")
+        self.conn.commit()
+
+    @staticmethod
+    def make_key(model: str, prompt: str, max_tokens: int, temperature: float) -> str:
+        """
+        Hash the request parameters that determine a completion.
+
+        Returns:
+            Hex digest used as the cache key
+        """
+        payload = json.dumps([model, prompt, max_tokens, temperature], ensure_ascii=False)
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+    def get(self, model: str, prompt: str, max_tokens: int, temperature: float) -> Optional[str]:
+        """
+        Look up a cached completion.
+
+        Returns:
+            Cached completion text, or None on a miss
+        """
+        key = self.make_key(model, prompt, max_tokens, temperature)
+        row = self.conn.execute("SELECT response, created FROM responses WHERE key = ?", (key,)).fetchone()
+        now = time.time()
+
+        if row is not None and self.ttl is not None and row[1] < now - self.ttl:
+            self.conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+            self.conn.commit()
+            row = None
+
+        if row is None:
+            self.misses += 1
+            return None
+
+        self.conn.execute("UPDATE responses SET last_used = ? WHERE key = ?", (now, key))
+        self.conn.commit()
+        self.hits += 1
+        return row[0]
+
+    def put(self, model: str, prompt: str, max_tokens: int, temperature: float, response: str) -> None:
+        """
+        Store a completion and evict entries over the configured limits.
+        """
+        key = self.make_key(model, prompt, max_tokens, temperature)
+        now = time.time()
+        self.conn.execute(
+            "INSERT OR REPLACE INTO responses (key, response, size, created, last_used) VALUES (?, ?, ?, ?, ?)",
+            (key, response, len(response.encode('utf-8')), now, now)
+        )
+        self._evict(now)
+        self.conn.commit()
+
+    def _evict(self, now: float) -> None:
+        """
+        Drop expired entries, then least recently used ones over the limits.
+        """
+        if self.ttl is not None:
+            cursor = self.conn.execute("DELETE FROM responses WHERE created < ?", (now - self.ttl,))
+            self.evictions += cursor.rowcount
+
+        if self.max_entries is not None:
+            count = self.conn.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+            if count > self.max_entries:
+                cursor = self.conn.execute(
+                    "DELETE FROM responses WHERE key IN "
+                    "(SELECT key FROM responses ORDER BY last_used ASC LIMIT ?)",
+                    (count - self.max_entries,)
+                )
+                self.evictions += cursor.rowcount
+
+        if self.max_bytes is not None:
+            total = self.conn.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+            if total > self.max_bytes:
+                stale_keys = []
+                for key, size in self.conn.execute("SELECT key, size FROM responses ORDER BY last_used ASC"):
+                    if total <= self.max_bytes:
+                        break
+                    stale_keys.append((key,))
+                    total -= size
+                self.conn.executemany("DELETE FROM responses WHERE key = ?", stale_keys)
+                self.evictions += len(stale_keys)
+
+    def stats(self) -> Dict[str, int]:
+        """
+        Return hit/miss/eviction counters for this run and the current size.
+        """
+        entries, size = self.conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM responses").fetchone()
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'entries': entries,
+            'bytes': size
+        }
+
+    def close(self) -> None:
+        self.conn.close()
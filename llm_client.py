@@ -0,0 +1,438 @@
+import json
+import time
+import heapq
+import random
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from email.utils import parsedate_to_datetime
+from typing import Dict, Any, Optional, Iterable, Iterator, Callable, List, Tuple
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from llm_cache import ResponseCache
+
+FIREWORKS_COMPLETIONS_URL = "https://api.fireworks.ai/inference/v1/completions"
+
+# Throttling and transient server errors worth retrying
+RETRYABLE_STATUS_CODES = frozenset({408, 425, 429, 500, 502, 503, 504})
+
+
+class CompletionError(Exception):
+    """
+    A completion request failed. str(error) is the message written to reports.
+    """
+
+
+class RetryableError(CompletionError):
+    """
+    A completion request failed with a throttling or transient error.
+    """
+
+    def __init__(self, message: str, retry_after: Optional[float] = None):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """
+    Parse a Retry-After header given in seconds or as an HTTP date.
+
+    Args:
+        value: Header value
+
+    Returns:
+        Delay in seconds, or None if absent or invalid
+    """
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+def _handle_response(response: requests.Response) -> str:
+    """
+    Extract the completion text or raise the matching CompletionError.
+    """
+    if response.status_code == 200:
+        try:
+            result = response.json()
+            return result['choices'][0]['text']
+        except (ValueError, KeyError, IndexError, TypeError) as e:
+            raise CompletionError(f"Exception during API call: {str(e)}")
+
+    message = f"Error: {response.status_code}\n{response.text}"
+    if response.status_code in RETRYABLE_STATUS_CODES:
+        raise RetryableError(message, parse_retry_after(response.headers.get('Retry-After')))
+    raise CompletionError(message)
+
+
+def post_completion(url: str, headers: Dict[str, str], payload: Dict[str, Any], timeout: float,
+                    session: Optional[requests.Session] = None) -> str:
+    """
+    Send one completion request.
+
+    Args:
+        url: Completions endpoint
+        headers: Request headers
+        payload: JSON request body
+        timeout: Request timeout in seconds
+        session: Session to send the request with (plain requests.post if None)
+
+    Returns:
+        Completion text
+
+    Raises:
+        RetryableError: On throttling, server errors and connection failures
+        CompletionError: On any other failure
+    """
+    try:
+        response = (session or requests).post(url, headers=headers, json=payload, timeout=timeout)
+    except requests.RequestException as e:
+        raise RetryableError(f"Exception during API call: {str(e)}")
+    return _handle_response(response)
+
+
+def stream_completion(url: str, headers: Dict[str, str], payload: Dict[str, Any], timeout: float,
+                      session: Optional[requests.Session] = None) -> Iterator[str]:
+    """
+    Send one completion request with stream=true and yield text chunks.
+
+    The response is read as server-sent events ("data: {...}" lines ending
+    with "data: [DONE]"), so only the current chunk is held in memory.
+
+    Args:
+        url: Completions endpoint
+        headers: Request headers
+        payload: JSON request body (the stream flag is added)
+        timeout: Timeout in seconds for connecting and between chunks
+        session: Session to send the request with (plain requests.post if None)
+
+    Yields:
+        Completion text chunks
+
+    Raises:
+        RetryableError: On throttling, server errors and connection failures
+        CompletionError: On any other failure
+    """
+    try:
+        response = (session or requests).post(url, headers=headers, json=dict(payload, stream=True),
+                                              timeout=timeout, stream=True)
+    except requests.RequestException as e:
+        raise RetryableError(f"Exception during API call: {str(e)}")
+
+    with response:
+        if response.status_code != 200:
+            _handle_response(response)
+
+        try:
+            for line in response.iter_lines():
+                if not line.startswith(b'data:'):
+                    continue
+                data = line[5:].strip().decode('utf-8')
+                if data == '[DONE]':
+                    return
+                try:
+                    choices = json.loads(data).get('choices') or [{}]
+                except ValueError as e:
+                    raise CompletionError(f"Exception during API call: {str(e)}")
+                text = choices[0].get('text')
+                if text:
+                    yield text
+        except requests.RequestException as e:
+            raise RetryableError(f"Exception during API call: {str(e)}")
+
+
+class RetryScheduler:
+    """
+    Retries failed work items without blocking the rest of the queue.
+
+    A throttled item goes back on the queue with a delay taken from
+    Retry-After or from jittered exponential backoff. Other items run in
+    the meantime. Each item gets at most max_attempts tries, and the whole
+    run shares retry_budget retries.
+    """
+
+    def __init__(self, max_attempts: int = 5, base_delay: float = 2.0, max_delay: float = 60.0,
+                 retry_budget: int = 50):
+        """
+        Initialize the scheduler.
+
+        Args:
+            max_attempts: Maximum tries per item
+            base_delay: First backoff step in seconds
+            max_delay: Upper bound for a single backoff delay
+            retry_budget: Total retries allowed in this run
+        """
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.retry_budget = retry_budget
+        self.retries = 0
+
+    def backoff(self, attempt: int, retry_after: Optional[float] = None) -> float:
+        """
+        Delay before the next try of an item.
+
+        Args:
+            attempt: Number of failed tries so far
+            retry_after: Server-requested delay, if any
+
+        Returns:
+            Delay in seconds
+        """
+        if retry_after is not None:
+            return min(retry_after, self.max_delay)
+        # Full jitter keeps throttled clients from retrying in lockstep
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2 ** (attempt - 1)))
+
+    def allow_retry(self, attempt: int) -> bool:
+        """
+        Take one retry from the budget if the item may be tried again.
+
+        Args:
+            attempt: Number of failed tries so far
+        """
+        if attempt >= self.max_attempts or self.retries >= self.retry_budget:
+            return False
+        self.retries += 1
+        return True
+
+    def run(self, items: Iterable[Any], attempt: Callable[[Any], Any],
+            give_up: Callable[[Any, CompletionError], Any]) -> List[Tuple[Any, Any]]:
+        """
+        Process items, requeueing the ones that raise RetryableError.
+
+        Items that raise any other CompletionError are given up on at once.
+
+        Items are pulled from the iterable lazily, so it may be a stream
+        (e.g. futures completing in a process pool).
+
+        Args:
+            items: Work items
+            attempt: Processes one item; raises RetryableError to be retried
+            give_up: Builds the result for an item that failed or ran out of retries
+
+        Returns:
+            List of (item, result) pairs in completion order
+        """
+        pending = iter(items)
+        exhausted = False
+        delayed = []  # (ready time, sequence, item, failed tries)
+        attempts = {}
+        sequence = 0
+        results = []
+
+        while not exhausted or delayed:
+            now = time.monotonic()
+            if delayed and (delayed[0][0] <= now or exhausted):
+                ready_at, _, item, failures = heapq.heappop(delayed)
+                if ready_at > now:
+                    time.sleep(ready_at - now)
+            else:
+                try:
+                    item = next(pending)
+                except StopIteration:
+                    exhausted = True
+                    continue
+                failures = 0
+
+            try:
+                results.append((item, attempt(item)))
+            except RetryableError as e:
+                failures += 1
+                if self.allow_retry(failures):
+                    delay = self.backoff(failures, e.retry_after)
+                    print(f"Retrying in {delay:.1f}s after: {str(e).splitlines()[0]}")
+                    sequence += 1
+                    heapq.heappush(delayed, (time.monotonic() + delay, sequence, item, failures))
+                else:
+                    results.append((item, give_up(item, e)))
+            except CompletionError as e:
+                results.append((item, give_up(item, e)))
+
+        return results
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    Cheap token estimate for rate limiting (about 4 characters per token).
+
+    Args:
+        text: Prompt or completion text
+
+    Returns:
+        Estimated token count
+    """
+    return len(text) // 4 + 1
+
+
+class TokenBucket:
+    """
+    Asyncio token bucket refilled continuously at a per-minute rate.
+    """
+
+    def __init__(self, per_minute: float, capacity: Optional[float] = None):
+        """
+        Initialize the bucket (full).
+
+        Args:
+            per_minute: Refill rate in units per minute
+            capacity: Maximum burst size (defaults to one minute of refill)
+        """
+        self.rate = per_minute / 60.0
+        self.capacity = capacity if capacity is not None else per_minute
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    async def acquire(self, amount: float = 1.0) -> None:
+        """
+        Wait until the bucket holds enough tokens, then take them.
+
+        Requests larger than the capacity are capped to the capacity so they
+        wait for a full bucket instead of blocking forever.
+
+        Args:
+            amount: Number of tokens to take
+        """
+        amount = min(amount, self.capacity)
+        # Waiters are served in arrival order
+        async with self._lock:
+            while True:
+                self._refill()
+                if self.tokens >= amount:
+                    self.tokens -= amount
+                    return
+                await asyncio.sleep((amount - self.tokens) / self.rate)
+
+
+class AsyncCompletionClient:
+    """
+    Asyncio client for the Fireworks completions endpoint.
+
+    Requests share one pooled requests.Session, at most max_concurrency are
+    in flight, and pacing comes from requests-per-minute and
+    tokens-per-minute buckets instead of fixed sleeps.
+    """
+
+    def __init__(self, api_key: str, model: str, base_url: str = FIREWORKS_COMPLETIONS_URL,
+                 max_concurrency: int = 4, requests_per_minute: Optional[float] = 60,
+                 tokens_per_minute: Optional[float] = None, timeout: float = 60,
+                 cache: Optional[ResponseCache] = None, retry: Optional[RetryScheduler] = None):
+        """
+        Initialize the client.
+
+        Args:
+            api_key: Fireworks.ai API key
+            model: Model ID to use for completions
+            base_url: Completions endpoint (point at a local server for testing)
+            max_concurrency: Maximum number of requests in flight
+            requests_per_minute: Request rate limit (None to disable)
+            tokens_per_minute: Prompt + completion token rate limit (None to disable)
+            timeout: Per-request timeout in seconds
+            cache: Response cache consulted before each request
+            retry: Retry policy and budget (None disables retries)
+        """
+        self.model = model
+        self.cache = cache
+        self.retry = retry
+        self.base_url = base_url
+        self.timeout = timeout
+        self.max_concurrency = max_concurrency
+
+        self.session = requests.Session()
+        self.session.headers.update({
+            "Authorization": f"Bearer {api_key}",
+            "Content-Type": "application/json"
+        })
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max_concurrency)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+
+        self._executor = ThreadPoolExecutor(max_workers=max_concurrency)
+        self._semaphore = None
+        self.request_bucket = TokenBucket(requests_per_minute) if requests_per_minute else None
+        self.token_bucket = TokenBucket(tokens_per_minute) if tokens_per_minute else None
+
+    def _post(self, payload: Dict[str, Any]) -> str:
+        return post_completion(self.base_url, {}, payload, self.timeout, session=self.session)
+
+    async def complete(self, prompt: str, max_tokens: int = 2048, temperature: float = 0.2) -> str:
+        """
+        Request a completion, retrying throttled and transient failures.
+
+        Args:
+            prompt: Prompt text
+            max_tokens: Maximum completion tokens
+            temperature: Sampling temperature
+
+        Returns:
+            Completion text, or an error string in the analyzers' report format
+        """
+        try:
+            return await self.request(prompt, max_tokens, temperature)
+        except CompletionError as e:
+            return str(e)
+
+    async def request(self, prompt: str, max_tokens: int = 2048, temperature: float = 0.2) -> str:
+        """
+        Like complete, but raise CompletionError once retries are exhausted.
+
+        Returns:
+            Completion text
+        """
+        # Cache hits skip the rate limiters entirely
+        if self.cache is not None:
+            cached = self.cache.get(self.model, prompt, max_tokens, temperature)
+            if cached is not None:
+                return cached
+
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+
+        payload = {
+            "model": self.model,
+            "prompt": prompt,
+            "max_tokens": max_tokens,
+            "temperature": temperature
+        }
+
+        loop = asyncio.get_running_loop()
+        failures = 0
+        while True:
+            async with self._semaphore:
+                if self.request_bucket is not None:
+                    await self.request_bucket.acquire()
+                if self.token_bucket is not None:
+                    await self.token_bucket.acquire(estimate_tokens(prompt) + max_tokens)
+
+                try:
+                    text = await loop.run_in_executor(self._executor, self._post, payload)
+                except RetryableError as e:
+                    error = e
+                else:
+                    if self.cache is not None:
+                        self.cache.put(self.model, prompt, max_tokens, temperature, text)
+                    return text
+
+            # Back off outside the semaphore so other requests keep flowing
+            failures += 1
+            if self.retry is None or not self.retry.allow_retry(failures):
+                raise error
+            await asyncio.sleep(self.retry.backoff(failures, error.retry_after))
+
+    def close(self) -> None:
+        self._executor.shutdown(wait=False)
+        self.session.close()
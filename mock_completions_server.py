@@ -0,0 +1,213 @@
+import re
+import json
+import time
+import random
+import argparse
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from typing import Callable, Dict, Optional
+
+from prompt_builder import BATCH_ANSWER_MARKER, BATCH_TASK_HEADING
+
+COMPLETIONS_PATH = '/inference/v1/completions'
+
+# Task headings of batched prompts
+BATCH_TASK_PATTERN = re.compile('^' + re.escape(BATCH_TASK_HEADING).replace(r'\{\}', '(.+?)') + '$', re.MULTILINE)
+
+
+def parse_latency(spec: str) -> Callable[[], float]:
+    """
+    Build a latency sampler from a distribution spec.
+
+    Supported specs (seconds):
+        fixed:S            always S
+        uniform:A,B        uniform between A and B
+        normal:MEAN,SD     normal, clipped at 0
+        lognormal:MU,SIGMA log-normal with the given underlying normal
+        exp:MEAN           exponential with the given mean
+
+    Args:
+        spec: Distribution spec, e.g. "lognormal:0,0.5"
+
+    Returns:
+        Function returning one latency sample
+    """
+    name, _, args = spec.partition(':')
+    values = [float(value) for value in args.split(',')] if args else []
+
+    if name == 'fixed' and len(values) == 1:
+        return lambda: values[0]
+    if name == 'uniform' and len(values) == 2:
+        return lambda: random.uniform(values[0], values[1])
+    if name == 'normal' and len(values) == 2:
+        return lambda: max(0.0, random.gauss(values[0], values[1]))
+    if name == 'lognormal' and len(values) == 2:
+        return lambda: random.lognormvariate(values[0], values[1])
+    if name == 'exp' and len(values) == 1:
+        return lambda: random.expovariate(1.0 / values[0]) if values[0] > 0 else 0.0
+    raise ValueError(f"Invalid latency spec: {spec}")
+
+
+class MockCompletionsServer:
+    """
+    Local stand-in for the Fireworks completions endpoint.
+
+    Responses are synthetic text of a fixed size, delayed by a sampled
+    latency. A share of requests can be throttled with 429 and Retry-After,
+    and stream=true requests are answered with server-sent events. Batched
+    prompts get one marked answer per cluster.
+    """
+
+    def __init__(self, host: str = '127.0.0.1', port: int = 0, latency: str = 'fixed:1.0',
+                 error_rate: float = 0.0, retry_after: Optional[float] = 1.0,
+                 completion_tokens: int = 200, stream_chunks: int = 20):
+        """
+        Initialize the server (call start() to serve).
+
+        Args:
+            host: Interface to bind
+            port: Port to bind (0 picks a free port)
+            latency: Latency distribution spec for each response (see parse_latency)
+            error_rate: Fraction of requests answered with 429
+            retry_after: Retry-After seconds sent with 429s (None omits the header)
+            completion_tokens: Approximate size of each answer in tokens
+            stream_chunks: Number of chunks a streamed answer is split into
+        """
+        self.sample_latency = parse_latency(latency)
+        self.error_rate = error_rate
+        self.retry_after = retry_after
+        self.completion_tokens = completion_tokens
+        self.stream_chunks = max(1, stream_chunks)
+        self.stats = {'requests': 0, 'throttled': 0, 'streamed': 0}
+        self._lock = threading.Lock()
+        self._thread = None
+
+        self.httpd = ThreadingHTTPServer((host, port), self._handler_class())
+        self.httpd.daemon_threads = True
+
+    @property
+    def url(self) -> str:
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}{COMPLETIONS_PATH}"
+
+    def _count(self, key: str) -> None:
+        with self._lock:
+            self.stats[key] += 1
+
+    def completion_text(self, prompt: str) -> str:
+        """
+        Synthetic answer for a prompt (one marked answer per task if batched).
+        """
+        answer = " ".join(["token"] * self.completion_tokens)
+        cluster_ids = BATCH_TASK_PATTERN.findall(prompt)
+        if not cluster_ids:
+            return answer
+        return "\n\n".join(f"{BATCH_ANSWER_MARKER.format(cluster_id)}\n{answer}" for cluster_id in cluster_ids)
+
+    def _handler_class(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def do_POST(self):
+                body = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+                if self.path.rstrip('/') != COMPLETIONS_PATH and self.path != '/':
+                    self._send_json(404, {'error': 'not found'})
+                    return
+                try:
+                    payload = json.loads(body)
+                except ValueError:
+                    self._send_json(400, {'error': 'invalid JSON'})
+                    return
+
+                server._count('requests')
+                if server.error_rate and random.random() < server.error_rate:
+                    server._count('throttled')
+                    headers = {}
+                    if server.retry_after is not None:
+                        headers['Retry-After'] = str(server.retry_after)
+                    self._send_json(429, {'error': 'rate limited'}, headers)
+                    return
+
+                latency = server.sample_latency()
+                text = server.completion_text(payload.get('prompt', ''))
+                if payload.get('stream'):
+                    server._count('streamed')
+                    self._send_stream(text, latency)
+                else:
+                    time.sleep(latency)
+                    self._send_json(200, {'choices': [{'text': text, 'index': 0}]})
+
+            def _send_json(self, status: int, payload: Dict, headers: Optional[Dict[str, str]] = None):
+                data = json.dumps(payload).encode('utf-8')
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(data)))
+                for name, value in (headers or {}).items():
+                    self.send_header(name, value)
+                self.end_headers()
+                self.wfile.write(data)
+
+            def _send_stream(self, text: str, latency: float):
+                # Spread the latency over the chunks: first token after one step
+                step = len(text) // server.stream_chunks + 1
+                chunks = [text[i:i + step] for i in range(0, len(text), step)]
+                delay = latency / len(chunks) if chunks else latency
+
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/event-stream')
+                self.send_header('Connection', 'close')
+                self.end_headers()
+                self.close_connection = True
+                for chunk in chunks:
+                    time.sleep(delay)
+                    event = json.dumps({'choices': [{'text': chunk, 'index': 0}]})
+                    self.wfile.write(f"data: {event}\n\n".encode('utf-8'))
+                    self.wfile.flush()
+                self.wfile.write(b"data: [DONE]\n\n")
+                self.wfile.flush()
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+    def start(self) -> 'MockCompletionsServer':
+        """
+        Serve in a background thread.
+        """
+        self._thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Local stand-in for the Fireworks completions API')
+    parser.add_argument('--host', default='127.0.0.1', help='Interface to bind')
+    parser.add_argument('--port', type=int, default=8765, help='Port to bind')
+    parser.add_argument('--latency', default='fixed:1.0',
+                        help='Response latency distribution (fixed:S, uniform:A,B, normal:M,SD, lognormal:MU,SIGMA, exp:M)')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='Fraction of requests answered with 429')
+    parser.add_argument('--retry-after', type=float, default=1.0, help='Retry-After seconds sent with 429s')
+    parser.add_argument('--completion-tokens', type=int, default=200, help='Approximate answer size in tokens')
+
+    args = parser.parse_args()
+
+    server = MockCompletionsServer(args.host, args.port, args.latency, args.error_rate,
+                                   args.retry_after, args.completion_tokens)
+    print(f"Serving mock completions at {server.url}")
+    try:
+        server.httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.httpd.server_close()
+        print(f"Requests: {server.stats['requests']}, throttled: {server.stats['throttled']}")
+
+if __name__ == '__main__':
+    main()
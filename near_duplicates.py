@@ -0,0 +1,492 @@
+import os
+import json
+import zlib
+import argparse
+from collections.abc import Mapping
+from typing import List, Dict, Any, Optional, Iterable, Iterator, Sequence, Tuple
+
+import numpy as np
+
+from ast_loader import list_ast_files, load_ast_json
+from ast_store import ASTStore, StoreNode, StoreArray, KIND_OBJECT, KIND_ARRAY
+
+DUPLICATES_FILENAME = 'near_duplicates.json'
+DEFAULT_THRESHOLD = 0.9
+SHINGLE_SIZE = 4
+NUM_PERM = 128
+BANDS = 16
+SEED = 1
+
+# Distinct odd multipliers combining the token hashes of a shingle
+_SHINGLE_MULTIPLIERS = np.array([0x9E3779B97F4A7C15, 0xC2B2AE3D27D4EB4F, 0x165667B19E3779F9,
+                                 0xD6E8FEB86659FD93, 0xFF51AFD7ED558CCD, 0xC4CEB9FE1A85EC53],
+                                dtype=np.uint64)
+
+# Shingles hashed per block, bounding the (permutations x shingles) temporary
+_HASH_BLOCK = 4096
+
+
+def node_type_sequence(ast: Mapping) -> List[str]:
+    """
+    Node types of an AST in pre-order (the order of the AST/*.ts.txt sequences).
+
+    Args:
+        ast: Root node (dict or store view)
+
+    Returns:
+        List of node types
+    """
+    if isinstance(ast, StoreNode) and ast.store.file_range(ast.index) is not None:
+        return _store_node_types(ast.store, ast.index)
+
+    types = []
+    stack = [ast]
+    while stack:
+        node = stack.pop()
+        node_type = node.get('type')
+        if isinstance(node_type, str):
+            types.append(node_type)
+        children = []
+        for value in node.values():
+            if isinstance(value, Mapping):
+                children.append(value)
+            elif isinstance(value, (list, StoreArray)):
+                children.extend(item for item in value if isinstance(item, Mapping))
+        stack.extend(reversed(children))
+    return types
+
+
+def _store_node_types(store: ASTStore, root: int) -> List[str]:
+    """
+    Pre-order node types of a stored file, read from the store's columns.
+
+    Stores lay nodes out breadth-first, so the walk follows first_child and
+    child_count instead of scanning the file's node range.
+    """
+    kind, type_id = store.kind, store.type_id
+    first_child, child_count = store.first_child, store.child_count
+    names = {}
+
+    types = []
+    stack = [root]
+    while stack:
+        index = stack.pop()
+        node_kind = kind[index]
+        if node_kind == KIND_OBJECT:
+            type_index = type_id[index]
+            if type_index >= 0:
+                name = names.get(type_index)
+                if name is None:
+                    name = names[type_index] = store.string(type_index)
+                types.append(name)
+        if node_kind == KIND_OBJECT or node_kind == KIND_ARRAY:
+            start = first_child[index]
+            stack.extend(range(start + child_count[index] - 1, start - 1, -1))
+    return types
+
+
+class MinHasher:
+    """
+    MinHash signatures of node-type shingles.
+
+    A shingle is a run of SHINGLE_SIZE consecutive node types. Node types are
+    hashed with CRC-32, so signatures do not depend on vocabulary order and
+    can be compared across runs. Each permutation is a multiply-shift hash
+    of the 64-bit shingle hash.
+    """
+
+    def __init__(self, num_perm: int = NUM_PERM, shingle_size: int = SHINGLE_SIZE, seed: int = SEED):
+        """
+        Initialize the hasher.
+
+        Args:
+            num_perm: Number of hash permutations (signature length)
+            shingle_size: Node types per shingle
+            seed: Seed for the permutations
+        """
+        if shingle_size > len(_SHINGLE_MULTIPLIERS):
+            raise ValueError(f"Shingles of more than {len(_SHINGLE_MULTIPLIERS)} node types are not supported")
+        self.num_perm = num_perm
+        self.shingle_size = shingle_size
+        rng = np.random.default_rng(seed)
+        self.a = rng.integers(1, 2 ** 63, size=num_perm, dtype=np.uint64) * np.uint64(2) + np.uint64(1)
+        self.b = rng.integers(0, 2 ** 63, size=num_perm, dtype=np.uint64)
+        self._token_hashes = {}
+
+    def shingles(self, node_types: Sequence[str]) -> np.ndarray:
+        """
+        Distinct 64-bit shingle hashes of a node-type sequence.
+
+        Sequences shorter than a shingle form a single shingle.
+        """
+        token_hashes = self._token_hashes
+        hashes = np.empty(len(node_types), dtype=np.uint64)
+        for i, node_type in enumerate(node_types):
+            value = token_hashes.get(node_type)
+            if value is None:
+                value = token_hashes[node_type] = zlib.crc32(node_type.encode('utf-8'))
+            hashes[i] = value
+
+        size = min(self.shingle_size, len(hashes))
+        if size == 0:
+            return hashes
+        windows = len(hashes) - size + 1
+        shingles = hashes[:windows] * _SHINGLE_MULTIPLIERS[0]
+        for i in range(1, size):
+            shingles += hashes[i:i + windows] * _SHINGLE_MULTIPLIERS[i]
+        return np.unique(shingles)
+
+    def signature(self, node_types: Sequence[str]) -> np.ndarray:
+        """
+        MinHash signature of a node-type sequence.
+
+        Args:
+            node_types: Node types in pre-order
+
+        Returns:
+            uint32 array of length num_perm (all 0xFFFFFFFF for an empty sequence)
+        """
+        shingles = self.shingles(node_types)
+        signature = np.full(self.num_perm, 0xFFFFFFFF, dtype=np.uint64)
+        a = self.a[:, None]
+        b = self.b[:, None]
+        for start in range(0, len(shingles), _HASH_BLOCK):
+            block = shingles[None, start:start + _HASH_BLOCK]
+            np.minimum(signature, ((a * block + b) >> np.uint64(32)).min(axis=1), out=signature)
+        return signature.astype(np.uint32)
+
+
+def similarity(first: np.ndarray, second: np.ndarray) -> float:
+    """
+    Estimated Jaccard similarity of two signatures.
+    """
+    return float(np.count_nonzero(first == second)) / len(first)
+
+
+class NearDuplicateIndex:
+    """
+    LSH index grouping files around representatives.
+
+    Signatures are cut into bands and every band is a bucket key, so two
+    files become candidates when any band matches. A file joins the first
+    candidate representative whose estimated similarity reaches the
+    threshold, otherwise it becomes a representative itself. Only
+    representatives are indexed, so each file is compared with a handful
+    of candidates rather than with every earlier file, and every member
+    of a group is similar to its representative (no chaining).
+    """
+
+    def __init__(self, threshold: float = DEFAULT_THRESHOLD, hasher: Optional[MinHasher] = None,
+                 bands: int = BANDS):
+        """
+        Initialize the index.
+
+        Args:
+            threshold: Minimum estimated Jaccard similarity of duplicates
+            hasher: MinHasher to sign files with (a default one if None)
+            bands: Number of LSH bands (must divide the signature length)
+        """
+        self.hasher = hasher or MinHasher()
+        if self.hasher.num_perm % bands:
+            raise ValueError(f"{bands} bands do not divide {self.hasher.num_perm} permutations")
+        self.threshold = threshold
+        self.bands = bands
+        self.rows = self.hasher.num_perm // bands
+        self.buckets = [{} for _ in range(bands)]
+        self.signatures = {}
+        self.groups = {}
+
+    def add(self, key: str, node_types: Sequence[str]) -> Optional[str]:
+        """
+        Sign a file and add it to the index.
+
+        Args:
+            key: File name
+            node_types: The file's node types in pre-order
+
+        Returns:
+            The representative the file duplicates, or None if it is a new representative
+        """
+        return self.add_signature(key, self.hasher.signature(node_types))
+
+    def add_signature(self, key: str, signature: np.ndarray) -> Optional[str]:
+        """
+        Add a file by its signature (see add).
+        """
+        band_keys = [signature[band * self.rows:(band + 1) * self.rows].tobytes() for band in range(self.bands)]
+
+        checked = set()
+        for buckets, band_key in zip(self.buckets, band_keys):
+            for candidate in buckets.get(band_key, ()):
+                if candidate in checked:
+                    continue
+                checked.add(candidate)
+                if similarity(signature, self.signatures[candidate]) >= self.threshold:
+                    self.groups[candidate].append(key)
+                    return candidate
+
+        self.signatures[key] = signature
+        self.groups[key] = []
+        for buckets, band_key in zip(self.buckets, band_keys):
+            buckets.setdefault(band_key, []).append(key)
+        return None
+
+    def duplicate_groups(self) -> List[List[str]]:
+        """
+        Groups with at least one duplicate, each as [representative, duplicates...].
+        """
+        return [[representative] + duplicates for representative, duplicates in self.groups.items() if duplicates]
+
+
+def representative_order(names: Iterable[str]) -> List[str]:
+    """
+    Order names so the shortest becomes each group's representative
+    (e.g. 'x.ast.json' before 'x copy.ast.json').
+    """
+    return sorted(names, key=lambda name: (len(name), name))
+
+
+def find_duplicate_groups(files: Iterable[Tuple[str, Sequence[str]]],
+                          threshold: float = DEFAULT_THRESHOLD) -> List[List[str]]:
+    """
+    Group near-duplicate files.
+
+    Args:
+        files: (name, node types) pairs, in order of preference for representatives
+        threshold: Minimum estimated Jaccard similarity of duplicates
+
+    Returns:
+        List of [representative, duplicates...] for groups with duplicates
+    """
+    index = NearDuplicateIndex(threshold)
+    for name, node_types in files:
+        index.add(name, node_types)
+    return index.duplicate_groups()
+
+
+def iter_text_sequences(ast_dir: str) -> Iterator[Tuple[str, List[str]]]:
+    """
+    Yield (name, node types) for the AST/*.ts.txt sequence files.
+    """
+    for name in representative_order(name for name in os.listdir(ast_dir) if name.endswith('.txt')):
+        with open(os.path.join(ast_dir, name), 'r', encoding='utf-8') as f:
+            yield name, f.read().split()
+
+
+def iter_cluster_sequences(cluster_dir: str) -> Iterator[Tuple[str, List[str]]]:
+    """
+    Yield (name, node types) for the AST files of a cluster, from its store when up to date.
+    """
+    store = ASTStore.open_for_cluster(cluster_dir)
+    if store is not None:
+        try:
+            roots = {filename: root for filename, root, _, _ in store.iter_files()}
+            for filename in representative_order(roots):
+                yield filename, node_type_sequence(roots[filename])
+        finally:
+            store.close()
+        return
+
+    for filename in representative_order(name for name in os.listdir(cluster_dir) if name.endswith('.ast.json')):
+        try:
+            ast_data = load_ast_json(os.path.join(cluster_dir, filename))
+        except Exception as e:
+            print(f"Error loading {filename}: {str(e)}")
+            continue
+        yield filename, node_type_sequence(ast_data)
+
+
+def write_cluster_duplicates(cluster_dir: str, threshold: float = DEFAULT_THRESHOLD) -> List[List[str]]:
+    """
+    Find a cluster's near-duplicate groups and save them next to its AST files.
+
+    Args:
+        cluster_dir: Path to the cluster directory
+        threshold: Minimum estimated Jaccard similarity of duplicates
+
+    Returns:
+        List of [representative, duplicates...]
+    """
+    files = list_ast_files(cluster_dir)
+    groups = find_duplicate_groups(iter_cluster_sequences(cluster_dir), threshold)
+    path = os.path.join(cluster_dir, DUPLICATES_FILENAME)
+    with open(path + '.tmp', 'w', encoding='utf-8') as f:
+        json.dump({
+            'threshold': threshold,
+            'num_perm': NUM_PERM,
+            'shingle_size': SHINGLE_SIZE,
+            'files': files,
+            'groups': groups
+        }, f, indent=2)
+    os.replace(path + '.tmp', path)
+    return groups
+
+
+def load_cluster_duplicates(cluster_dir: str, threshold: float) -> Optional[List[List[str]]]:
+    """
+    Read a cluster's saved duplicate groups if they were computed with the
+    same settings over exactly the AST files (names, sizes and mtimes) the
+    cluster holds now.
+
+    Returns:
+        List of [representative, duplicates...], or None when missing or stale
+    """
+    path = os.path.join(cluster_dir, DUPLICATES_FILENAME)
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            saved = json.load(f)
+    except (OSError, ValueError):
+        return None
+
+    if (saved.get('threshold'), saved.get('num_perm'), saved.get('shingle_size')) != \
+            (threshold, NUM_PERM, SHINGLE_SIZE):
+        return None
+    if saved.get('files') != [list(entry) for entry in list_ast_files(cluster_dir)]:
+        return None
+    return saved.get('groups', [])
+
+
+class ClusterDeduplicator:
+    """
+    Collapses near-duplicate files while a cluster is loaded.
+
+    When the cluster has up-to-date saved groups (see write_cluster_duplicates),
+    known duplicates are skipped before they are read. If a representative
+    then fails to load, its duplicates are offered again by orphans() and the
+    first of them that loads takes its place. Otherwise each loaded file is
+    signed and checked against the representatives seen so far, so the first
+    file of each group represents it.
+    """
+
+    def __init__(self, cluster_dir: str, threshold: float = DEFAULT_THRESHOLD):
+        """
+        Initialize the deduplicator.
+
+        Args:
+            cluster_dir: Path to the cluster directory
+            threshold: Minimum estimated Jaccard similarity of duplicates
+        """
+        self.duplicates = {}
+        self.known_duplicates = {}
+        self.index = None
+        # Representatives that failed to load, and the duplicates standing in for them
+        self.failed = []
+        self.replacements = {}
+
+        groups = load_cluster_duplicates(cluster_dir, threshold)
+        if groups is None:
+            self.index = NearDuplicateIndex(threshold)
+        else:
+            for group in groups:
+                self.duplicates[group[0]] = list(group[1:])
+                for duplicate in group[1:]:
+                    self.known_duplicates[duplicate] = group[0]
+
+    def skip_before_load(self, filename: str) -> bool:
+        """
+        Whether a file is a known duplicate and need not be read.
+        """
+        representative = self.known_duplicates.get(filename)
+        return representative is not None and representative not in self.failed
+
+    def fail(self, filename: str) -> None:
+        """
+        Record that a file could not be loaded, so its known duplicates are not lost.
+        """
+        if filename in self.duplicates and filename not in self.failed:
+            self.failed.append(filename)
+
+    def orphans(self) -> Iterator[str]:
+        """
+        Known duplicates of representatives that failed to load, to be loaded instead.
+
+        Each group's duplicates are offered in order until one of them loads
+        and replaces the representative (see add).
+        """
+        for representative in self.failed:
+            for duplicate in self.duplicates[representative]:
+                if representative in self.replacements:
+                    break
+                yield duplicate
+
+    def add(self, filename: str, ast: Mapping) -> Optional[str]:
+        """
+        Check a loaded file.
+
+        Args:
+            filename: Name of the AST file
+            ast: Its root node
+
+        Returns:
+            The representative the file duplicates, or None to keep the file
+        """
+        if self.index is None:
+            representative = self.known_duplicates.get(filename)
+            if representative in self.failed:
+                replacement = self.replacements.get(representative)
+                if replacement is not None:
+                    return replacement
+                self.replacements[representative] = filename
+                self.duplicates[filename] = [duplicate for duplicate in self.duplicates[representative]
+                                             if duplicate != filename]
+                return None
+            return representative
+        representative = self.index.add(filename, node_type_sequence(ast))
+        if representative is None:
+            self.duplicates[filename] = self.index.groups[filename]
+        return representative
+
+    def duplicates_of(self, filename: str) -> List[str]:
+        """
+        Duplicates collapsed into a representative (filled in as loading goes on).
+        """
+        return self.duplicates.setdefault(filename, [])
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Find near-duplicate files with MinHash/LSH over AST node-type shingles')
+    parser.add_argument('path', nargs='?', default='AST',
+                        help='Directory of *.ts.txt sequences, a cluster directory, or a directory of cluster_N directories')
+    parser.add_argument('--threshold', type=float, default=DEFAULT_THRESHOLD,
+                        help='Minimum estimated Jaccard similarity of near-duplicates')
+    parser.add_argument('--write', action='store_true',
+                        help=f"Save each cluster's groups to {DUPLICATES_FILENAME} for ASTClusterAnalyzer to skip duplicates")
+    parser.add_argument('--output', default=None, help='Write all duplicate groups as JSON to this file')
+
+    args = parser.parse_args()
+
+    entries = sorted(os.listdir(args.path))
+    cluster_dirs = [os.path.join(args.path, name) for name in entries
+                    if name.startswith('cluster_') and os.path.isdir(os.path.join(args.path, name))]
+    if not cluster_dirs and any(name.endswith('.ast.json') for name in entries):
+        cluster_dirs = [args.path]
+
+    results = {}
+    if cluster_dirs:
+        for cluster_dir in cluster_dirs:
+            if args.write:
+                groups = write_cluster_duplicates(cluster_dir, args.threshold)
+            else:
+                groups = find_duplicate_groups(iter_cluster_sequences(cluster_dir), args.threshold)
+            results[os.path.basename(cluster_dir)] = groups
+    else:
+        results[os.path.basename(os.path.normpath(args.path))] = \
+            find_duplicate_groups(iter_text_sequences(args.path), args.threshold)
+
+    for name, groups in results.items():
+        duplicates = sum(len(group) - 1 for group in groups)
+        if not groups:
+            continue
+        print(f"{name}: {duplicates} near-duplicates in {len(groups)} groups")
+        for group in groups:
+            print(f"  {group[0]} <- {', '.join(group[1:])}")
+    total = sum(len(group) - 1 for groups in results.values() for group in groups)
+    print(f"{total} near-duplicate files in total")
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2)
+        print(f"Groups saved to {args.output}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,118 @@
+import re
+import json
+from typing import Any, Callable, List
+
+from llm_client import estimate_tokens
+
+DEFAULT_PROMPT_TOKEN_BUDGET = 4000
+
+# Delimits per-cluster tasks and answers in batched requests
+BATCH_ANSWER_MARKER = "=== ANSWER FOR CLUSTER {} ==="
+BATCH_TASK_HEADING = "##### Task for cluster {} #####"
+BATCH_ANSWER_PATTERN = re.compile(r"^[ \t]*=== ANSWER FOR CLUSTER (.+?) ===[ \t]*$", re.MULTILINE)
+
+
+def compact_json(value: Any) -> str:
+    """
+    Serialize a value as JSON without indentation or padding.
+    """
+    return json.dumps(value, separators=(',', ':'), ensure_ascii=False)
+
+
+class _Section:
+    def __init__(self, title: str, items: List[str], priority: int, separator: str,
+                 omitted_label: str, all_or_nothing: bool):
+        self.title = title
+        self.items = items
+        self.priority = priority
+        self.separator = separator
+        self.omitted_label = omitted_label
+        self.all_or_nothing = all_or_nothing
+        self.included = []
+
+
+class PromptBuilder:
+    """
+    Assembles a prompt within a token budget.
+
+    Fixed text (instructions, cluster metadata) is always included. Sections
+    are filled in priority order, item by item, until the budget runs out,
+    and a note records how many items of a section were left out. The prompt
+    is rendered with sections in the order they were added.
+    """
+
+    def __init__(self, token_budget: int = DEFAULT_PROMPT_TOKEN_BUDGET,
+                 estimator: Callable[[str], int] = estimate_tokens):
+        """
+        Initialize the builder.
+
+        Args:
+            token_budget: Maximum estimated prompt tokens
+            estimator: Local token estimator for a piece of text
+        """
+        self.token_budget = token_budget
+        self.estimator = estimator
+        self.parts = []
+
+    def add_text(self, text: str) -> None:
+        """
+        Add text that is always included.
+        """
+        self.parts.append(text)
+
+    def add_section(self, title: str, items: List[str], priority: int, separator: str = "\n",
+                    omitted_label: str = "items", all_or_nothing: bool = False) -> None:
+        """
+        Add a section filled from items while the budget allows.
+
+        Args:
+            title: Heading line written before the items
+            items: Pre-serialized items, most important first
+            priority: Lower values are filled first
+            separator: Text between items
+            omitted_label: Noun used in the note for left-out items (e.g. "files")
+            all_or_nothing: Include either every item or none (e.g. a diagram)
+        """
+        self.parts.append(_Section(title, items, priority, separator, omitted_label, all_or_nothing))
+
+    def _render_section(self, section: _Section) -> str:
+        body = section.separator.join(section.included)
+        omitted = len(section.items) - len(section.included)
+        if omitted:
+            count = "" if section.all_or_nothing else f"{omitted} "
+            note = f"({count}{section.omitted_label} omitted)"
+            body = f"{body}{section.separator}{note}" if body else note
+        return f"{section.title}\n{body}"
+
+    def build(self) -> str:
+        """
+        Fill the sections and render the prompt.
+
+        Item costs are estimated one at a time, and each section reserves
+        room for its heading and omission note, so the total never exceeds
+        the budget by more than the estimator's rounding.
+
+        Returns:
+            Prompt text
+        """
+        estimate = self.estimator
+        sections = [part for part in self.parts if isinstance(part, _Section)]
+
+        used = sum(estimate(part) for part in self.parts if isinstance(part, str))
+        for section in sections:
+            section.included = []
+            used += estimate(f"{section.title}\n({len(section.items)} {section.omitted_label} omitted)")
+
+        for section in sorted(sections, key=lambda s: s.priority):
+            groups = [section.items] if section.all_or_nothing else [[item] for item in section.items]
+            for group in groups:
+                cost = sum(estimate(section.separator + item) for item in group)
+                if used + cost > self.token_budget:
+                    break
+                section.included.extend(group)
+                used += cost
+
+        return "".join(
+            self._render_section(part) if isinstance(part, _Section) else part
+            for part in self.parts
+        )
@@ -0,0 +1,561 @@
+import os
+import json
+import time
+import shutil
+import tempfile
+import argparse
+from collections import defaultdict
+from typing import List, Dict, Any, Optional, Iterator, Tuple
+
+import numpy as np
+from scipy import sparse
+
+from ast_features import DEFAULT_AST_TEXT_DIR, NGRAM_RANGE, NOISE_CLUSTER_ID, ngram_codes, rank_features, weight_counts
+from ast_loader import load_ast_json
+from near_duplicates import node_type_sequence
+
+# N-gram codes use a fixed base so codes from different chunks agree while
+# the vocabulary grows; TypeScript and ESTree both have well under 1023 node types
+CODE_BASE = 1024
+CODE_SPACE = CODE_BASE ** NGRAM_RANGE[1]
+
+DEFAULT_OUTPUT = 'updated_clusters.json'
+DEFAULT_CLUSTER_COUNT = 13
+DEFAULT_CHUNK_FILES = 1000
+DEFAULT_MAX_FEATURES = 8192
+DEFAULT_BATCH_SIZE = 1024
+DEFAULT_INIT_SIZE = 3 * DEFAULT_BATCH_SIZE
+DEFAULT_NOISE_FRACTION = 0.01
+DEFAULT_REFINE_PASSES = 2
+SAMPLE_ASTS = 3
+
+
+def detect_input_format(input_dir: str) -> str:
+    """
+    'text' for a directory of *.ts.txt node-type sequences, otherwise 'json' (*.ast.json, searched recursively).
+    """
+    return 'text' if any(name.endswith('.txt') for name in os.listdir(input_dir)) else 'json'
+
+
+def list_input_files(input_dir: str, input_format: str) -> Iterator[str]:
+    """
+    Yield the input files in a stable order.
+    """
+    if input_format == 'text':
+        for name in sorted(os.listdir(input_dir)):
+            if name.endswith('.txt'):
+                yield os.path.join(input_dir, name)
+        return
+
+    for root, dirs, files in os.walk(input_dir):
+        dirs.sort()
+        for name in sorted(files):
+            if name.endswith('.ast.json'):
+                yield os.path.join(root, name)
+
+
+def read_node_types(path: str, input_format: str) -> List[str]:
+    """
+    Node types of one input file in pre-order.
+    """
+    if input_format == 'text':
+        with open(path, 'r', encoding='utf-8') as f:
+            return f.read().split()
+    return node_type_sequence(load_ast_json(path))
+
+
+class NgramCorpus:
+    """
+    N-gram counts of a corpus, kept on disk.
+
+    The corpus is read once, a chunk of files at a time. Each chunk's counts
+    are appended to CSR arrays in work_dir whose column indices are n-gram
+    codes, and document frequencies are merged as it goes. Afterwards the
+    arrays are memory-mapped, so rows are read back on demand and mapped onto
+    the selected features. Memory is bounded by the chunk size and the number
+    of distinct n-grams, not by the corpus.
+    """
+
+    def __init__(self, work_dir: str):
+        self.work_dir = work_dir
+        self.paths = []
+        self.vocabulary = defaultdict()
+        self.vocabulary.default_factory = self.vocabulary.__len__
+        self.indptr = np.zeros(1, dtype=np.int64)
+        self.df_codes = np.zeros(0, dtype=np.int64)
+        self.df_counts = np.zeros(0, dtype=np.int64)
+        self.features = None
+        self.idf = None
+        self.data = None
+        self.indices = None
+
+    @property
+    def node_types(self) -> List[str]:
+        node_types = [None] * len(self.vocabulary)
+        for node_type, node_id in self.vocabulary.items():
+            node_types[node_id] = node_type
+        return node_types
+
+    def build(self, input_dir: str, input_format: str, chunk_files: int = DEFAULT_CHUNK_FILES) -> None:
+        """
+        Read and count every input file.
+
+        Args:
+            input_dir: Directory of input files
+            input_format: 'text' or 'json' (see detect_input_format)
+            chunk_files: Files counted per chunk
+        """
+        data_path = os.path.join(self.work_dir, 'data.bin')
+        indices_path = os.path.join(self.work_dir, 'indices.bin')
+        indptr = [np.zeros(1, dtype=np.int64)]
+        with open(data_path, 'wb') as data_file, open(indices_path, 'wb') as indices_file:
+            chunk_paths = []
+            chunk_sequences = []
+            for path in list_input_files(input_dir, input_format):
+                try:
+                    node_types = read_node_types(path, input_format)
+                except Exception as e:
+                    print(f"Error reading {path}: {str(e)}")
+                    continue
+                chunk_paths.append(path)
+                chunk_sequences.append(node_types)
+                if len(chunk_paths) >= chunk_files:
+                    indptr.append(self._add_chunk(chunk_paths, chunk_sequences, data_file, indices_file, indptr[-1][-1]))
+                    chunk_paths, chunk_sequences = [], []
+            if chunk_paths:
+                indptr.append(self._add_chunk(chunk_paths, chunk_sequences, data_file, indices_file, indptr[-1][-1]))
+
+        self.indptr = np.concatenate(indptr)
+        nnz = int(self.indptr[-1])
+        self.data = np.memmap(data_path, dtype=np.int32, mode='r', shape=(nnz,)) if nnz else np.zeros(0, np.int32)
+        self.indices = np.memmap(indices_path, dtype=np.int64, mode='r', shape=(nnz,)) if nnz else np.zeros(0, np.int64)
+
+    def _add_chunk(self, paths: List[str], sequences: List[List[str]], data_file: Any, indices_file: Any,
+                   nnz: int) -> np.ndarray:
+        lookup = self.vocabulary.__getitem__
+        offsets = np.zeros(len(sequences) + 1, dtype=np.int64)
+        parts = []
+        for i, sequence in enumerate(sequences):
+            parts.append(np.array(list(map(lookup, map(str.lower, sequence))), dtype=np.int32))
+            offsets[i + 1] = offsets[i] + len(sequence)
+        if len(self.vocabulary) >= CODE_BASE:
+            raise ValueError(f"More than {CODE_BASE - 1} node types; raise CODE_BASE")
+
+        token_ids = np.concatenate(parts) if parts else np.zeros(0, dtype=np.int32)
+        codes, rows = ngram_codes(token_ids, offsets, CODE_BASE, NGRAM_RANGE)
+
+        # One entry per (file, n-gram), sorted by file then code
+        keys, counts = np.unique(rows * CODE_SPACE + codes, return_counts=True)
+        rows, codes = np.divmod(keys, CODE_SPACE)
+        data_file.write(counts.astype(np.int32).tobytes())
+        indices_file.write(codes.astype(np.int64).tobytes())
+
+        # Each (file, code) pair is unique, so counting codes gives document frequencies
+        chunk_codes, chunk_df = np.unique(codes, return_counts=True)
+        merged, inverse = np.unique(np.concatenate((self.df_codes, chunk_codes)), return_inverse=True)
+        self.df_counts = np.bincount(inverse.ravel(), weights=np.concatenate((self.df_counts, chunk_df)),
+                                     minlength=len(merged)).astype(np.int64)
+        self.df_codes = merged
+
+        self.paths.extend(paths)
+        return nnz + np.cumsum(np.bincount(rows, minlength=len(paths)))
+
+    def __len__(self) -> int:
+        return len(self.paths)
+
+    def select_features(self, max_features: int = DEFAULT_MAX_FEATURES, min_df: int = 1) -> None:
+        """
+        Keep the n-grams with the highest document frequency and compute their smoothed IDF.
+        """
+        candidates = np.flatnonzero(self.df_counts >= min_df)
+        if len(candidates) > max_features:
+            # Highest document frequency first, ties by code so the choice is stable
+            order = np.lexsort((self.df_codes[candidates], -self.df_counts[candidates]))
+            candidates = np.sort(candidates[order[:max_features]])
+        self.features = self.df_codes[candidates]
+        self.idf = np.log((1 + len(self)) / (1 + self.df_counts[candidates])) + 1
+
+    def rows(self, index: np.ndarray) -> sparse.csr_matrix:
+        """
+        Count matrix of some files over the selected features.
+
+        Args:
+            index: File numbers (any order)
+
+        Returns:
+            len(index) x features count matrix
+        """
+        starts = self.indptr[index]
+        lengths = self.indptr[np.asarray(index) + 1] - starts
+        if len(index) and np.all(np.diff(index) == 1):
+            positions = np.arange(starts[0], starts[0] + lengths.sum())
+        else:
+            positions = np.repeat(starts - np.concatenate(([0], np.cumsum(lengths)[:-1])), lengths) + \
+                np.arange(lengths.sum())
+        codes = np.asarray(self.indices[positions])
+        data = np.asarray(self.data[positions])
+        row_of = np.repeat(np.arange(len(index)), lengths)
+
+        columns = np.searchsorted(self.features, codes)
+        known = columns < len(self.features)
+        known[known] = self.features[columns[known]] == codes[known]
+        return sparse.csr_matrix((data[known], (row_of[known], columns[known])),
+                                 shape=(len(index), len(self.features)))
+
+    def weighted_rows(self, index: np.ndarray) -> sparse.csr_matrix:
+        """
+        L2-normalized TF-IDF rows of some files.
+        """
+        return weight_counts(self.rows(index), 'tfidf', self.idf)
+
+    def iter_chunks(self, chunk_files: int = DEFAULT_CHUNK_FILES) -> Iterator[Tuple[int, sparse.csr_matrix]]:
+        """
+        Yield (first file number, count matrix) over consecutive chunks of files.
+        """
+        for start in range(0, len(self), chunk_files):
+            yield start, self.rows(np.arange(start, min(start + chunk_files, len(self))))
+
+
+def _nonempty(rows: sparse.csr_matrix) -> np.ndarray:
+    """
+    Row numbers of the files with at least one selected n-gram.
+
+    Empty rows (e.g. empty files) have no direction, so they never seed or
+    move a center and are labeled as noise.
+    """
+    return np.flatnonzero(np.diff(rows.indptr))
+
+
+def _kmeans_plus_plus(sample: sparse.csr_matrix, cluster_count: int, rng: np.random.Generator) -> np.ndarray:
+    """
+    Pick initial centers from normalized sample rows by k-means++ seeding.
+    """
+    centers = np.zeros((cluster_count, sample.shape[1]))
+    first = rng.integers(sample.shape[0])
+    centers[0] = sample[first].toarray()
+    # Squared distance between unit vectors is 2 - 2 cos
+    distances = np.maximum(2 - 2 * np.asarray(sample @ centers[0]).ravel(), 0)
+    for i in range(1, cluster_count):
+        total = distances.sum()
+        choice = rng.choice(sample.shape[0], p=distances / total) if total > 0 else rng.integers(sample.shape[0])
+        centers[i] = sample[choice].toarray()
+        distances = np.minimum(distances, np.maximum(2 - 2 * np.asarray(sample @ centers[i]).ravel(), 0))
+    return centers
+
+
+def _nearest(rows: sparse.csr_matrix, centers: np.ndarray, center_norms: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Nearest center of each unit-length row and the squared distance to it.
+    """
+    # |x - c|^2 = 1 - 2 x.c + |c|^2
+    distances = 1 + center_norms[None, :] - 2 * np.asarray(rows @ centers.T)
+    nearest = distances.argmin(axis=1)
+    return nearest, np.maximum(distances[np.arange(len(nearest)), nearest], 0)
+
+
+def minibatch_kmeans(corpus: NgramCorpus, cluster_count: int, batch_size: int = DEFAULT_BATCH_SIZE,
+                     iterations: int = 100, init_size: int = DEFAULT_INIT_SIZE, seed: int = 0) -> np.ndarray:
+    """
+    Mini-batch k-means over the corpus' TF-IDF rows.
+
+    Centers are seeded by k-means++ on a sample, then each iteration reads a
+    random batch of rows from disk and moves every center towards the mean
+    of its batch members with a learning rate of 1 / (rows it has absorbed)
+    (Sculley, "Web-scale k-means clustering").
+
+    Args:
+        corpus: Corpus with selected features
+        cluster_count: Number of clusters (k)
+        batch_size: Rows per iteration
+        iterations: Maximum number of iterations
+        init_size: Rows sampled for seeding
+        seed: Random seed
+
+    Returns:
+        k x features array of centers
+    """
+    rng = np.random.default_rng(seed)
+    cluster_count = min(cluster_count, len(corpus))
+    sample = np.sort(rng.choice(len(corpus), min(init_size, len(corpus)), replace=False))
+    sample_rows = sparse.vstack([corpus.weighted_rows(sample[start:start + batch_size])
+                                 for start in range(0, len(sample), batch_size)], format='csr')
+    sample_rows = sample_rows[_nonempty(sample_rows)]
+    if not sample_rows.shape[0]:
+        raise ValueError("No sampled file contains any of the selected n-grams")
+    cluster_count = min(cluster_count, sample_rows.shape[0])
+    centers = _kmeans_plus_plus(sample_rows, cluster_count, rng)
+    absorbed = np.zeros(cluster_count)
+
+    for _ in range(iterations):
+        batch = np.sort(rng.choice(len(corpus), min(batch_size, len(corpus)), replace=False))
+        rows = corpus.weighted_rows(batch)
+        rows = rows[_nonempty(rows)]
+        if not rows.shape[0]:
+            continue
+        nearest, _ = _nearest(rows, centers, np.einsum('ij,ij->i', centers, centers))
+
+        members = np.bincount(nearest, minlength=cluster_count)
+        indicator = sparse.csr_matrix((np.ones(len(nearest)), (nearest, np.arange(len(nearest)))),
+                                      shape=(cluster_count, len(nearest)))
+        member_sums = (indicator @ rows).toarray()
+
+        absorbed += members
+        moved = members > 0
+        centers[moved] += (member_sums[moved] - members[moved, None] * centers[moved]) / absorbed[moved, None]
+    return centers
+
+
+def refine_centers(corpus: NgramCorpus, centers: np.ndarray, passes: int = DEFAULT_REFINE_PASSES,
+                   chunk_files: int = DEFAULT_CHUNK_FILES) -> np.ndarray:
+    """
+    Full k-means (Lloyd) passes over the corpus, read in chunks.
+
+    Each pass moves every center to the mean of the rows nearest to it; a
+    center no row is nearest to stays where it is. A couple of passes after
+    the mini-batch phase bring the inertia close to full-batch k-means.
+
+    Returns:
+        Refined centers
+    """
+    for _ in range(passes):
+        center_norms = np.einsum('ij,ij->i', centers, centers)
+        sums = np.zeros_like(centers)
+        members = np.zeros(len(centers))
+        for _, counts in corpus.iter_chunks(chunk_files):
+            rows = weight_counts(counts, 'tfidf', corpus.idf)
+            rows = rows[_nonempty(rows)]
+            nearest, _ = _nearest(rows, centers, center_norms)
+            indicator = sparse.csr_matrix((np.ones(len(nearest)), (nearest, np.arange(len(nearest)))),
+                                          shape=(len(centers), len(nearest)))
+            sums += (indicator @ rows).toarray()
+            members += np.bincount(nearest, minlength=len(centers))
+        centers = np.where(members[:, None] > 0, sums / np.maximum(members, 1)[:, None], centers)
+    return centers
+
+
+def assign_clusters(corpus: NgramCorpus, centers: np.ndarray, noise_fraction: float = DEFAULT_NOISE_FRACTION,
+                    min_cluster_size: int = 2, chunk_files: int = DEFAULT_CHUNK_FILES) -> np.ndarray:
+    """
+    Label every file with its nearest center, in chunks.
+
+    Files without any selected n-gram, the noise_fraction of the other files
+    farthest from their center, and the members of clusters smaller than
+    min_cluster_size are labeled NOISE_CLUSTER_ID.
+    The remaining clusters are numbered from 0 by decreasing size.
+
+    Returns:
+        Cluster ID of each file
+    """
+    center_norms = np.einsum('ij,ij->i', centers, centers)
+    labels = np.zeros(len(corpus), dtype=np.int64)
+    distances = np.zeros(len(corpus), dtype=np.float32)
+    empty = np.zeros(len(corpus), dtype=bool)
+    for start, counts in corpus.iter_chunks(chunk_files):
+        rows = weight_counts(counts, 'tfidf', corpus.idf)
+        nearest, distance = _nearest(rows, centers, center_norms)
+        labels[start:start + len(nearest)] = nearest
+        distances[start:start + len(nearest)] = distance
+        empty[start:start + len(nearest)] = np.diff(rows.indptr) == 0
+    labels[empty] = NOISE_CLUSTER_ID
+
+    if noise_fraction > 0 and not empty.all():
+        cutoff = np.quantile(distances[~empty], 1 - noise_fraction)
+        labels[~empty & (distances > cutoff)] = NOISE_CLUSTER_ID
+    sizes = np.bincount(labels[labels >= 0], minlength=len(centers))
+    labels[(labels >= 0) & (sizes[np.maximum(labels, 0)] < min_cluster_size)] = NOISE_CLUSTER_ID
+
+    # Renumber by decreasing size, ties by center order
+    sizes = np.bincount(labels[labels >= 0], minlength=len(centers))
+    order = [center for center in np.argsort(-sizes, kind='stable').tolist() if sizes[center] >= min_cluster_size]
+    renumber = np.full(len(centers), NOISE_CLUSTER_ID, dtype=np.int64)
+    renumber[order] = np.arange(len(order))
+    return np.where(labels >= 0, renumber[np.maximum(labels, 0)], NOISE_CLUSTER_ID)
+
+
+def cluster_top_features(corpus: NgramCorpus, labels: np.ndarray, top: int = 5,
+                         chunk_files: int = DEFAULT_CHUNK_FILES) -> Dict[int, str]:
+    """
+    Highest mean-TF n-grams of each cluster, formatted like top_features (see ast_features.py).
+    """
+    cluster_ids = np.unique(labels[labels >= 0])
+    tf_sums = np.zeros((len(cluster_ids), len(corpus.features)))
+    for start, counts in corpus.iter_chunks(chunk_files):
+        chunk_labels = labels[start:start + counts.shape[0]]
+        keep = np.flatnonzero(chunk_labels >= 0)
+        indicator = sparse.csr_matrix(
+            (np.ones(len(keep)), (np.searchsorted(cluster_ids, chunk_labels[keep]), keep)),
+            shape=(len(cluster_ids), counts.shape[0])
+        )
+        tf_sums += (indicator @ weight_counts(counts, 'tf')).toarray()
+
+    node_types = corpus.node_types
+    return {int(cluster_id): ", ".join(rank_features(tf_sums[position], corpus.features, node_types, top, CODE_BASE))
+            for position, cluster_id in enumerate(cluster_ids.tolist())}
+
+
+def _find_source(index: Any, path: str) -> Optional[str]:
+    """
+    Source file of an input file in a FileIndex (x.ts.txt -> x.ts, x.ast.json -> x.ts or x.tsx).
+    """
+    name = os.path.basename(path)
+    if not name.endswith('.ast.json'):
+        return index.find(name)
+    stem = name[:-len('.ast.json')]
+    return index.find(f"{stem}.ts") or index.find(f"{stem}.tsx")
+
+
+def build_cluster_records(corpus: NgramCorpus, labels: np.ndarray, input_format: str, top: int = 5,
+                          source_dir: Optional[str] = None) -> List[Dict[str, Any]]:
+    """
+    Cluster dictionaries in the updated_clusters.json format.
+
+    file_paths are the input paths, or the matching files under source_dir
+    when given (see utils/map_file_paths.py). sample_asts hold the node-type
+    sequences of the first SAMPLE_ASTS members.
+    """
+    index = None
+    if source_dir:
+        # Imported here so tqdm is only needed with --source-dir
+        from utils.map_file_paths import FileIndex
+        index = FileIndex(source_dir)
+
+    top_features = cluster_top_features(corpus, labels, top)
+    members = defaultdict(list)
+    for path, label in zip(corpus.paths, labels.tolist()):
+        members[label].append(path)
+
+    clusters = []
+    for cluster_id in sorted(members):
+        paths = members[cluster_id]
+        file_paths = paths
+        if index is not None:
+            file_paths = [_find_source(index, path) or path for path in paths]
+        clusters.append({
+            'cluster_id': cluster_id,
+            'num_files': len(paths),
+            'top_features': top_features.get(cluster_id, ''),
+            'file_paths': file_paths,
+            'sample_asts': [" ".join(read_node_types(path, input_format)) for path in paths[:SAMPLE_ASTS]]
+        })
+    return clusters
+
+
+def ast_json_name(path: str) -> str:
+    """
+    Name of the AST JSON file of an input file (x.ts.txt -> x.ast.json).
+    """
+    name = os.path.basename(path)
+    if name.endswith('.ast.json'):
+        return name
+    if name.endswith('.txt'):
+        name = name[:-len('.txt')]
+    stem, extension = os.path.splitext(name)
+    return f"{stem if extension in ('.ts', '.tsx', '.js', '.jsx') else name}.ast.json"
+
+
+def write_cluster_dirs(corpus: NgramCorpus, labels: np.ndarray, output_dir: str, ast_json_dir: str,
+                       link: bool = False) -> int:
+    """
+    Lay AST JSON files out as output_dir/cluster_N/*.ast.json (the AST_v2 layout).
+
+    Args:
+        corpus: Clustered corpus
+        labels: Cluster ID of each file
+        output_dir: New directory to create the cluster directories in
+        ast_json_dir: Directory searched (recursively) for each file's *.ast.json
+        link: Hard-link the files instead of copying them
+
+    Returns:
+        Number of files without an AST JSON file
+    """
+    if os.path.isdir(output_dir) and any(name.startswith('cluster_') for name in os.listdir(output_dir)):
+        raise ValueError(f"{output_dir} already contains cluster directories")
+
+    sources = {}
+    for root, dirs, files in os.walk(ast_json_dir):
+        dirs.sort()
+        for name in sorted(files):
+            if name.endswith('.ast.json'):
+                sources.setdefault(name, os.path.join(root, name))
+
+    missing = 0
+    for path, label in zip(corpus.paths, labels.tolist()):
+        name = ast_json_name(path)
+        source = path if path.endswith('.ast.json') else sources.get(name)
+        if source is None:
+            missing += 1
+            continue
+        cluster_dir = os.path.join(output_dir, f"cluster_{label}")
+        os.makedirs(cluster_dir, exist_ok=True)
+        target = os.path.join(cluster_dir, name)
+        if link:
+            os.link(source, target)
+        else:
+            shutil.copy2(source, target)
+    return missing
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Cluster AST node-type sequences with out-of-core mini-batch k-means')
+    parser.add_argument('input', nargs='?', default=DEFAULT_AST_TEXT_DIR,
+                        help='Directory of *.ts.txt sequences or (recursively) *.ast.json files')
+    parser.add_argument('--output', default=DEFAULT_OUTPUT, help='Cluster JSON to write')
+    parser.add_argument('-k', '--num-clusters', type=int, default=DEFAULT_CLUSTER_COUNT, help='Number of clusters')
+    parser.add_argument('--max-features', type=int, default=DEFAULT_MAX_FEATURES,
+                        help='N-grams kept, by document frequency')
+    parser.add_argument('--min-df', type=int, default=1, help='Minimum number of files an n-gram must occur in')
+    parser.add_argument('--batch-size', type=int, default=DEFAULT_BATCH_SIZE, help='Rows per k-means iteration')
+    parser.add_argument('--iterations', type=int, default=100, help='Maximum k-means iterations')
+    parser.add_argument('--refine-passes', type=int, default=DEFAULT_REFINE_PASSES,
+                        help='Full k-means passes over the corpus after the mini-batch phase')
+    parser.add_argument('--chunk-files', type=int, default=DEFAULT_CHUNK_FILES, help='Files held in memory at a time')
+    parser.add_argument('--noise-fraction', type=float, default=DEFAULT_NOISE_FRACTION,
+                        help='Fraction of files farthest from their center labeled -1')
+    parser.add_argument('--min-cluster-size', type=int, default=2, help='Smaller clusters are labeled -1')
+    parser.add_argument('--seed', type=int, default=0, help='Random seed')
+    parser.add_argument('--top', type=int, default=5, help='Number of top features per cluster')
+    parser.add_argument('--source-dir', default=None,
+                        help='Record the matching file under this repository directory in file_paths')
+    parser.add_argument('--cluster-dir', default=None,
+                        help='Also lay out AST JSON files as cluster_N directories in this new directory')
+    parser.add_argument('--ast-json-dir', default='AST_v2', help='Where to find *.ast.json files for --cluster-dir')
+    parser.add_argument('--link', action='store_true', help='Hard-link files into --cluster-dir instead of copying')
+    parser.add_argument('--work-dir', default=None, help='Directory for the on-disk n-gram counts (default: a temporary one)')
+
+    args = parser.parse_args()
+
+    input_format = detect_input_format(args.input)
+    work_dir = args.work_dir or tempfile.mkdtemp(prefix='recluster-')
+    os.makedirs(work_dir, exist_ok=True)
+    try:
+        start = time.perf_counter()
+        corpus = NgramCorpus(work_dir)
+        corpus.build(args.input, input_format, args.chunk_files)
+        corpus.select_features(args.max_features, args.min_df)
+        if not len(corpus):
+            parser.error(f"No input files found in {args.input}")
+        print(f"Counted {len(corpus)} files ({len(corpus.df_codes)} n-grams, {len(corpus.features)} kept) "
+              f"in {time.perf_counter() - start:.2f}s")
+
+        start = time.perf_counter()
+        centers = minibatch_kmeans(corpus, args.num_clusters, args.batch_size, args.iterations, seed=args.seed)
+        centers = refine_centers(corpus, centers, args.refine_passes, args.chunk_files)
+        labels = assign_clusters(corpus, centers, args.noise_fraction, args.min_cluster_size, args.chunk_files)
+        print(f"Clustered into {len(np.unique(labels[labels >= 0]))} clusters "
+              f"({np.count_nonzero(labels == NOISE_CLUSTER_ID)} noise files) in {time.perf_counter() - start:.2f}s")
+
+        clusters = build_cluster_records(corpus, labels, input_format, args.top, args.source_dir)
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(clusters, f, indent=2)
+        print(f"Clusters saved to {args.output}")
+
+        if args.cluster_dir:
+            missing = write_cluster_dirs(corpus, labels, args.cluster_dir, args.ast_json_dir, args.link)
+            print(f"Cluster directories written to {args.cluster_dir}"
+                  f"{f' ({missing} files had no AST JSON)' if missing else ''}")
+    finally:
+        if not args.work_dir:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,162 @@
+import json
+import time
+from typing import Dict, Any, List, Optional
+
+# Result fields the report is built from (patterns and relationships are
+# bulky and only used to build the prompt)
+REPORT_FIELDS = ('cluster_id', 'category', 'file_count', 'prompt_tokens', 'peak_memory_mb', 'file_sample',
+                 'flow_chart', 'analysis', 'error')
+
+
+def sidecar_path_for(report_path: str) -> str:
+    """
+    Default JSONL sidecar path next to a markdown report.
+
+    Args:
+        report_path: Markdown report path
+
+    Returns:
+        Sidecar path (report.md -> report.jsonl)
+    """
+    base = report_path[:-3] if report_path.endswith('.md') else report_path
+    return base + '.jsonl'
+
+
+class StreamingReportWriter:
+    """
+    Appends cluster sections to the markdown report as analyses arrive.
+
+    Each finished cluster is also written as one line of a JSONL sidecar.
+    Everything is flushed as it is written, so a partial report can be read
+    while the run is still going. The summary is written last, after the
+    detailed sections, since it depends on every cluster.
+    """
+
+    def __init__(self, report_path: str, sidecar_path: Optional[str] = None):
+        """
+        Create the report and sidecar files and write the report header.
+
+        Args:
+            report_path: Markdown report path
+            sidecar_path: JSONL sidecar path (defaults to sidecar_path_for(report_path))
+        """
+        self.report_path = report_path
+        self.sidecar_path = sidecar_path or sidecar_path_for(report_path)
+        self.report = open(report_path, 'w', encoding='utf-8')
+        self.sidecar = open(self.sidecar_path, 'w', encoding='utf-8')
+        self.in_section = False
+
+        self.report.write("# AST Cluster Analysis Report\n\n")
+        self.report.write(f"Analysis Date: {time.strftime('%Y-%m-%d %H:%M:%S')}\n\n")
+        self.report.write("## Detailed Analysis\n\n")
+        self.report.flush()
+
+    def begin_cluster(self, result: Dict[str, Any]) -> None:
+        """
+        Write a cluster's heading, sample files and flow chart.
+
+        Args:
+            result: Prepared cluster or analysis result
+        """
+        f = self.report
+        f.write(f"### Cluster {result.get('cluster_id', 'Unknown')} ({result.get('category', 'Unknown')})\n\n")
+        f.write(f"Files: {result.get('file_count', 0)}\n\n")
+        if result.get('prompt_tokens'):
+            f.write(f"Prompt Tokens (estimated): {result['prompt_tokens']}\n\n")
+        if result.get('peak_memory_mb') is not None:
+            f.write(f"Peak Memory (traced): {result['peak_memory_mb']} MB\n\n")
+
+        file_sample = result.get('file_sample', [])
+        if file_sample:
+            f.write("Sample Files:\n")
+            for file in file_sample:
+                f.write(f"- {file}\n")
+            f.write("\n")
+
+        # Include the flow chart
+        if result.get('flow_chart'):
+            f.write("#### Service Relationship Diagram\n\n")
+            f.write(f"{result['flow_chart']}\n")
+
+        f.write("#### Analysis\n\n")
+        f.flush()
+        self.in_section = True
+
+    def write_analysis(self, text: str) -> None:
+        """
+        Append a chunk of the current cluster's analysis.
+        """
+        self.report.write(text)
+        self.report.flush()
+
+    def end_cluster(self, result: Dict[str, Any]) -> None:
+        """
+        Close the current section and record the cluster in the sidecar.
+
+        Args:
+            result: Analysis result (its analysis text was already written)
+        """
+        self.report.write("\n\n---\n\n")
+        self.report.flush()
+        self.in_section = False
+
+        record = {field: result[field] for field in REPORT_FIELDS if field in result}
+        self.sidecar.write(json.dumps(record, ensure_ascii=False) + "\n")
+        self.sidecar.flush()
+
+    def write_cluster(self, result: Dict[str, Any]) -> None:
+        """
+        Write a complete cluster section at once (cache hits, errors).
+        """
+        self.begin_cluster(result)
+        self.write_analysis(result.get('analysis') or result.get('error', ''))
+        self.end_cluster(result)
+
+    def finish(self, results: List[Dict[str, Any]], cache_stats: Optional[Dict[str, int]] = None,
+               timing_table: str = "") -> str:
+        """
+        Write the summary and conclusion and close both files.
+
+        Args:
+            results: Per-cluster results (only cluster_id and category are read)
+            cache_stats: ResponseCache.stats() output, if a cache was used
+            timing_table: Tracer.timing_table() output, if the run was traced
+
+        Returns:
+            Path to the report file
+        """
+        f = self.report
+        f.write("## Summary\n\n")
+        f.write(f"Total Clusters Analyzed: {len(results)}\n\n")
+
+        if cache_stats:
+            f.write(f"Response Cache: {cache_stats['hits']} hits, {cache_stats['misses']} misses, "
+                    f"{cache_stats['evictions']} evictions ({cache_stats['entries']} entries)\n\n")
+
+        # Write category distribution
+        categories = {}
+        for result in results:
+            category = result.get('category', 'Unknown')
+            if category in categories:
+                categories[category] += 1
+            else:
+                categories[category] = 1
+
+        f.write("### Category Distribution\n\n")
+        for category, count in sorted(categories.items(), key=lambda x: x[1], reverse=True):
+            f.write(f"- {category}: {count}\n")
+
+        if timing_table:
+            f.write("\n## Stage Timing\n\n")
+            f.write(timing_table)
+
+        f.write("\n## Conclusion\n\n")
+        f.write("This report provides an analysis of AST clusters, identifying common patterns, data sinks, and data flow within each cluster.\n")
+        self.close()
+
+        print(f"Report saved to {self.report_path}")
+        return self.report_path
+
+    def close(self) -> None:
+        self.report.close()
+        self.sidecar.close()
@@ -0,0 +1,148 @@
+import os
+import json
+import hashlib
+from typing import Dict, Any, List, Optional
+
+from ast_loader import list_ast_files
+from report_writer import REPORT_FIELDS
+
+DEFAULT_CHECKPOINT_PATH = 'analysis_checkpoint.jsonl'
+
+
+def cluster_key(model: str, cluster_id: str, cluster_dir: str, max_files: Optional[int],
+                settings: Optional[Dict[str, Any]] = None) -> str:
+    """
+    Identify one cluster analysis by its inputs and model.
+
+    The key covers the model, the cluster ID, max_files, the analysis
+    settings and the name, size and modification time of every AST file in
+    the cluster, so a cluster is analyzed again whenever its files or the
+    way they are analyzed change.
+
+    Args:
+        model: Model ID used for analysis
+        cluster_id: ID of the cluster
+        cluster_dir: Directory containing the cluster's AST files
+        max_files: Maximum number of files analyzed per cluster
+        settings: Other options that change which files are analyzed or
+            what is sent to the model (JSON-serializable)
+
+    Returns:
+        Hex digest identifying the analysis
+    """
+    files = list_ast_files(cluster_dir)
+    payload = json.dumps([model, str(cluster_id), max_files, sorted((settings or {}).items()), files])
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+class RunCheckpoint:
+    """
+    Append-only JSONL record of finished cluster analyses.
+
+    Each line holds a cluster key and the result fields the report needs.
+    Lines are flushed and synced as they are written, so an interrupted run
+    loses at most the cluster in flight. A truncated last line is ignored
+    when the checkpoint is read back.
+    """
+
+    def __init__(self, path: str = DEFAULT_CHECKPOINT_PATH, resume: bool = False, fresh: bool = False):
+        """
+        Open the checkpoint.
+
+        Args:
+            path: JSONL checkpoint file
+            resume: Keep and load existing records
+            fresh: Truncate an existing checkpoint when not resuming
+
+        Raises:
+            FileExistsError: If the checkpoint holds records and neither
+                resume nor fresh was given
+        """
+        self.path = path
+        self.completed = {}
+        if not resume and not fresh and os.path.exists(path) and os.path.getsize(path) > 0:
+            raise FileExistsError(f"Checkpoint {path} already holds results")
+        if resume:
+            for record in self.read_records(path):
+                self.completed[record['key']] = record['result']
+        self.file = open(path, 'a' if resume else 'w', encoding='utf-8')
+        if resume and self._ends_mid_line(path):
+            # Terminate a partial line so the next record starts cleanly
+            self.file.write("\n")
+
+    @staticmethod
+    def _ends_mid_line(path: str) -> bool:
+        with open(path, 'rb') as f:
+            f.seek(0, os.SEEK_END)
+            if f.tell() == 0:
+                return False
+            f.seek(-1, os.SEEK_END)
+            return f.read(1) != b"\n"
+
+    @staticmethod
+    def read_records(path: str) -> List[Dict[str, Any]]:
+        """
+        Read the valid records of a checkpoint file.
+
+        Args:
+            path: JSONL checkpoint file
+
+        Returns:
+            Records in the order they were written (empty if the file is missing)
+        """
+        records = []
+        if not os.path.exists(path):
+            return records
+
+        with open(path, 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    # Partial line from an interrupted write
+                    continue
+                if isinstance(record, dict) and 'key' in record and 'result' in record:
+                    records.append(record)
+        return records
+
+    @classmethod
+    def load_results(cls, path: str) -> List[Dict[str, Any]]:
+        """
+        Read the latest result per cluster from a checkpoint file.
+
+        Args:
+            path: JSONL checkpoint file
+
+        Returns:
+            Results in the order clusters were first completed
+        """
+        results = {}
+        for record in cls.read_records(path):
+            results[str(record['result'].get('cluster_id'))] = record['result']
+        return list(results.values())
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        """
+        Look up a finished analysis from an earlier run.
+
+        Returns:
+            Stored result, or None if the cluster still needs analysis
+        """
+        return self.completed.get(key)
+
+    def record(self, key: str, result: Dict[str, Any]) -> None:
+        """
+        Durably append a finished analysis.
+
+        Args:
+            key: Output of cluster_key
+            result: Analysis result (only the report fields are stored)
+        """
+        stored = {field: result[field] for field in REPORT_FIELDS if field in result}
+        self.file.write(json.dumps({'key': key, 'result': stored}, ensure_ascii=False) + "\n")
+        self.file.flush()
+        os.fsync(self.file.fileno())
+        self.completed[key] = stored
+
+    def close(self) -> None:
+        self.file.close()
@@ -0,0 +1,43 @@
+import numpy as np
+import pytest
+
+from ast_features import encode_sequences, ngram_counts, rank_features, weight_counts
+
+
+def _counts(sequences):
+    token_ids, offsets, node_types = encode_sequences(sequences)
+    counts, features = ngram_counts(token_ids, offsets, len(node_types))
+    return counts, features, node_types
+
+
+@pytest.mark.parametrize('sequences', [
+    [['A', 'B', 'C'], ['a', 'b'], []],
+    [[], ['A', 'B'], [], ['C']],
+    [['A'], [], [], []],
+])
+@pytest.mark.parametrize('weighting', ['tf', 'tfidf'])
+def test_weight_counts_handles_empty_rows(sequences, weighting):
+    counts, _, _ = _counts(sequences)
+    weighted = weight_counts(counts, weighting)
+
+    norms = np.sqrt(np.asarray(weighted.multiply(weighted).sum(axis=1)).ravel())
+    lengths = np.array([len(sequence) for sequence in sequences])
+    np.testing.assert_allclose(norms[lengths > 0], 1.0)
+    np.testing.assert_array_equal(norms[lengths == 0], 0.0)
+
+
+def test_weight_counts_without_any_ngrams():
+    counts, _, _ = _counts([[], []])
+    assert weight_counts(counts, 'tfidf').shape == (2, 0)
+
+
+def test_rank_features_breaks_ties_at_cutoff_by_name():
+    # 'a' beats everything; the remaining twelve unigrams tie
+    sequences = [['a'] * 3 + [chr(ord('b') + i) for i in range(12)]]
+    token_ids, offsets, node_types = encode_sequences(sequences)
+    counts, features = ngram_counts(token_ids, offsets, len(node_types), (1, 1))
+    scores = np.asarray(counts.toarray(), dtype=np.float64).ravel()
+
+    # Reversing the columns must not change which tied names are kept
+    for order in (np.arange(len(scores)), np.arange(len(scores))[::-1]):
+        assert rank_features(scores[order], features[order], node_types, top=3) == ['a', 'b', 'c']
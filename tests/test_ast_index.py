@@ -0,0 +1,38 @@
+import json
+
+from ast_index import ASTIndex, load_ast_statements, scan_statement_offsets
+
+
+def test_statements_are_parsed_only_when_asked_for(tmp_path):
+    path = tmp_path / 'a.ast.json'
+    path.write_text(json.dumps({'type': 'Program', 'body': [
+        {'type': 'ImportDeclaration', 'source': {'type': 'Literal', 'value': 'x'}, 'specifiers': []},
+        {'type': 'FunctionDeclaration', 'id': {'type': 'Identifier', 'name': 'f'},
+         'params': [{'type': 'Identifier', 'name': 'a'}]}
+    ]}))
+
+    program = load_ast_statements(str(path), ['FunctionDeclaration'])
+    assert program['body'][0] == {'type': 'ImportDeclaration', 'source': {'type': 'Literal', 'value': 'x'}}
+    assert program['body'][1]['params'] == [{'type': 'Identifier', 'name': 'a'}]
+
+
+def test_file_without_root_body_is_loaded_whole(tmp_path):
+    path = tmp_path / 'a.ast.json'
+    ast = {'type': 'Module', 'items': [{'type': 'ImportDeclaration', 'body': []}]}
+    path.write_text(json.dumps(ast))
+
+    assert scan_statement_offsets(path.read_bytes()) is None
+    assert load_ast_statements(str(path), ['ImportDeclaration']) == ast
+    # Again through the saved sidecar
+    index = ASTIndex.load_sidecar(str(path))
+    assert index is not None and index.statements is None
+    assert index.load([]) == ast
+    assert index.bytes_needed([]) == path.stat().st_size
+
+
+def test_empty_body_is_still_indexed(tmp_path):
+    path = tmp_path / 'a.ast.json'
+    path.write_text(json.dumps({'type': 'Program', 'body': [], 'sourceType': 'module'}))
+
+    assert scan_statement_offsets(path.read_bytes()) == []
+    assert load_ast_statements(str(path)) == {'type': 'Program', 'body': []}
@@ -0,0 +1,54 @@
+import json
+
+import pytest
+
+import ast_loader
+from ast_loader import load_ast_json
+
+SOURCE = {
+    'type': 'Program',
+    'range': [0, 30],
+    'loc': {'start': {'line': 1, 'column': 0}, 'end': {'line': 2, 'column': 0}},
+    'sourceType': 'module',
+    'body': [
+        {
+            'type': 'ImportDeclaration',
+            'range': [0, 20],
+            'source': {'type': 'Literal', 'value': './x', 'raw': "'./x'", 'range': [5, 10]},
+            'specifiers': []
+        },
+        {'type': 'ExpressionStatement', 'expression': {'type': 'Literal', 'value': 1.5, 'raw': '1.5'}}
+    ],
+    'tokens': [{'type': 'Keyword', 'value': 'import'}],
+    'comments': [{'type': 'Line', 'value': ' note'}]
+}
+
+PROJECTED = {
+    'type': 'Program',
+    'sourceType': 'module',
+    'body': [
+        {'type': 'ImportDeclaration', 'source': {'type': 'Literal', 'value': './x'}, 'specifiers': []},
+        {'type': 'ExpressionStatement', 'expression': {'type': 'Literal', 'value': 1.5}}
+    ]
+}
+
+
+@pytest.mark.parametrize('streaming', [True, False])
+def test_load_ast_json_drops_positions_tokens_and_comments(tmp_path, monkeypatch, streaming):
+    if not streaming:
+        monkeypatch.setattr(ast_loader, 'ijson', None)
+    elif ast_loader.ijson is None:
+        pytest.skip('ijson is not installed')
+    path = tmp_path / 'a.ast.json'
+    path.write_text(json.dumps(SOURCE))
+
+    assert load_ast_json(str(path)) == PROJECTED
+
+
+def test_load_ast_json_keeps_keys_named_like_dropped_values(tmp_path):
+    # Only object keys are dropped, not string values that happen to match
+    ast = {'type': 'Program', 'body': [{'type': 'Identifier', 'name': 'tokens'}]}
+    path = tmp_path / 'a.ast.json'
+    path.write_text(json.dumps(ast))
+
+    assert load_ast_json(str(path)) == ast
@@ -0,0 +1,71 @@
+import json
+import os
+from collections.abc import Mapping, Sequence
+
+from ast_store import ASTStore, build_cluster_store
+from v2_analyse_clusters import ASTClusterAnalyzer
+
+
+def _write_cluster(cluster_dir):
+    # Created out of name order, so listdir order differs from sorted order
+    for name in ('m', 'b', 'z', 'a'):
+        ast = {'type': 'Program', 'body': [{'type': 'ExpressionStatement', 'value': name, 'n': 1.5}]}
+        with open(os.path.join(cluster_dir, f'{name}.ast.json'), 'w', encoding='utf-8') as f:
+            json.dump(ast, f)
+
+
+def _plain(value):
+    # Copy store views into plain objects, which outlive the store
+    if isinstance(value, Mapping):
+        return {key: _plain(child) for key, child in value.items()}
+    if isinstance(value, Sequence) and not isinstance(value, str):
+        return [_plain(child) for child in value]
+    return value
+
+
+def test_store_round_trips_and_goes_stale(tmp_path):
+    _write_cluster(tmp_path)
+    build_cluster_store(str(tmp_path))
+
+    store = ASTStore.open_for_cluster(str(tmp_path))
+    try:
+        roots = {filename: _plain(root) for filename, root, _, _ in store.iter_files()}
+    finally:
+        store.close()
+    assert roots['m.ast.json']['body'] == [{'type': 'ExpressionStatement', 'value': 'm', 'n': 1.5}]
+
+    path = tmp_path / 'a.ast.json'
+    stat = path.stat()
+    path.write_text(path.read_text() + ' ')
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+    assert ASTStore.open_for_cluster(str(tmp_path)) is None
+
+
+def test_store_and_json_paths_load_the_same_files(tmp_path):
+    cluster_dir = tmp_path / 'cluster_1'
+    cluster_dir.mkdir()
+    _write_cluster(cluster_dir)
+    build_cluster_store(str(cluster_dir))
+
+    loaded = {}
+    for use_store in (True, False):
+        analyzer = ASTClusterAnalyzer(api_key='', use_store=use_store)
+        files = analyzer.load_ast_files(str(cluster_dir), max_files=2)
+        loaded[use_store] = [(file_data['filename'], _plain(file_data['ast'])) for file_data in files]
+        analyzer.close_stores()
+        assert analyzer.open_stores == []
+
+    assert [filename for filename, _ in loaded[True]] == ['a.ast.json', 'b.ast.json']
+    assert loaded[True] == loaded[False]
+
+
+def test_prepare_cluster_closes_its_store(tmp_path):
+    cluster_dir = tmp_path / 'cluster_1'
+    cluster_dir.mkdir()
+    _write_cluster(cluster_dir)
+    build_cluster_store(str(cluster_dir))
+
+    analyzer = ASTClusterAnalyzer(api_key='')
+    prepared = analyzer.prepare_cluster('1', str(tmp_path))
+    assert 'error' not in prepared
+    assert analyzer.open_stores == []
@@ -0,0 +1,110 @@
+import json
+
+from ast_store import ASTStore, build_cluster_store
+from ast_visitor import ASTCollector, ASTVisitor, default_collectors
+from v2_analyse_clusters import ASTClusterAnalyzer
+
+
+def _identifier(name):
+    return {'type': 'Identifier', 'name': name}
+
+
+def _member_call(obj, method):
+    return {'type': 'CallExpression', 'arguments': [],
+            'callee': {'type': 'MemberExpression', 'object': _identifier(obj), 'property': _identifier(method)}}
+
+
+BILLING = {'type': 'Program', 'body': [
+    {'type': 'ImportDeclaration', 'source': {'type': 'Literal', 'value': '@nestjs/common'}, 'specifiers': []},
+    {'type': 'ExportNamedDeclaration', 'declaration': {
+        'type': 'ClassDeclaration', 'id': _identifier('BillingService'),
+        'body': {'type': 'ClassBody', 'body': [
+            {'type': 'MethodDefinition', 'key': _identifier('charge'), 'value': {'type': 'FunctionExpression'}}
+        ]}
+    }}
+]}
+
+ORDERS = {'type': 'Program', 'body': [
+    {'type': 'ImportDeclaration', 'source': {'type': 'Literal', 'value': '@nestjs/common'}, 'specifiers': []},
+    {'type': 'ImportDeclaration', 'source': {'type': 'Literal', 'value': './billing.service'}, 'specifiers': []},
+    {'type': 'ClassDeclaration', 'id': _identifier('OrdersService'), 'body': {'type': 'ClassBody', 'body': [
+        {'type': 'MethodDefinition', 'key': _identifier('place'), 'value': {
+            'type': 'FunctionExpression', 'body': {'type': 'BlockStatement', 'body': [
+                {'type': 'ExpressionStatement', 'expression': _member_call('billing', 'BillingService')}
+            ]}
+        }}
+    ]}}
+]}
+
+AST_FILES = [
+    {'filename': 'billing.service.ast.json', 'ast': BILLING},
+    {'filename': 'orders.service.ast.json', 'ast': ORDERS}
+]
+
+
+def test_one_pass_fills_every_default_collector():
+    features = ASTClusterAnalyzer(api_key='').extract_ast_features(AST_FILES)
+
+    assert features['declarations'].counts == {'ImportDeclaration': 3, 'ExportNamedDeclaration': 1,
+                                               'ClassDeclaration': 1}
+    assert features['imports'].module_counts == {'@nestjs/common': 2, './billing.service': 1}
+    assert features['exports'].file_exports['billing.service.ast.json'] == {'BillingService'}
+    assert features['class_methods'].counts == {'place': 1}
+    assert features['calls'].file_calls['orders.service.ast.json'] == {('billing', 'BillingService')}
+
+
+def test_patterns_and_relationships_come_from_the_shared_features():
+    analyzer = ASTClusterAnalyzer(api_key='')
+    features = analyzer.extract_ast_features(AST_FILES)
+
+    patterns = {pattern['pattern_type']: pattern['data']
+                for pattern in analyzer.extract_ast_patterns(AST_FILES, features)}
+    assert patterns['import_modules'][0] == ('@nestjs/common', 2)
+    assert patterns['export_types'] == [('ClassDeclaration', 1)]
+
+    relationships = analyzer.extract_service_relationships(AST_FILES, features)
+    assert relationships['relationships'] == [('orders.service', 'billing.service')]
+    assert relationships['service_imports'] == {'billing.service': [], 'orders.service': ['billing.service']}
+
+
+def test_registered_collector_sees_typed_nodes_in_the_same_walk():
+    class IdentifierCollector(ASTCollector):
+        node_types = ('Identifier',)
+
+        def __init__(self):
+            self.names = []
+
+        def visit_node(self, node):
+            self.names.append(node['name'])
+
+    analyzer = ASTClusterAnalyzer(api_key='')
+    analyzer.register_collector('identifiers', IdentifierCollector)
+    features = analyzer.extract_ast_features(AST_FILES)
+
+    assert sorted(features['identifiers'].names) == ['BillingService', 'BillingService', 'OrdersService',
+                                                     'billing', 'charge', 'place']
+
+
+def test_store_views_are_visited_like_json_trees(tmp_path):
+    for file_data in AST_FILES:
+        (tmp_path / file_data['filename']).write_text(json.dumps(file_data['ast']))
+    build_cluster_store(str(tmp_path))
+
+    store = ASTStore.open_for_cluster(str(tmp_path))
+    try:
+        from_store = default_collectors()
+        visitor = ASTVisitor(list(from_store.values()))
+        for filename, root, _, _ in store.iter_files():
+            visitor.visit_file(filename, root)
+    finally:
+        store.close()
+
+    from_json = default_collectors()
+    visitor = ASTVisitor(list(from_json.values()))
+    for file_data in AST_FILES:
+        visitor.visit_file(file_data['filename'], file_data['ast'])
+
+    assert from_store['declarations'].counts == from_json['declarations'].counts
+    assert from_store['imports'].file_imports == from_json['imports'].file_imports
+    assert from_store['class_methods'].counts == from_json['class_methods'].counts
+    assert from_store['calls'].file_calls == from_json['calls'].file_calls
@@ -0,0 +1,88 @@
+import json
+
+import v2_analyse_clusters
+from prompt_builder import BATCH_ANSWER_MARKER, BATCH_TASK_HEADING
+from v2_analyse_clusters import ANSWER_MAX_TOKENS, ASTClusterAnalyzer
+
+
+def _prepared(cluster_id, prompt_tokens, **extra):
+    return dict({'cluster_id': cluster_id, 'prompt_tokens': prompt_tokens}, **extra)
+
+
+def _pack(analyzer, token_counts, batch_tokens):
+    items = [(position, _prepared(str(position), tokens)) for position, tokens in enumerate(token_counts)]
+    return [[position for position, _ in batch] for batch in analyzer._pack_batches(items, batch_tokens)]
+
+
+def test_batches_are_packed_greedily_up_to_the_token_limit():
+    analyzer = ASTClusterAnalyzer(api_key='', max_output_tokens=100 * ANSWER_MAX_TOKENS)
+
+    assert _pack(analyzer, [300, 300, 300, 200, 500], 1000) == [[0, 1, 2], [3, 4]]
+
+
+def test_batches_hold_no_more_answers_than_the_output_limit():
+    analyzer = ASTClusterAnalyzer(api_key='', max_output_tokens=2 * ANSWER_MAX_TOKENS)
+
+    assert _pack(analyzer, [10] * 5, 1000) == [[0, 1], [2, 3], [4]]
+
+
+def test_large_and_failed_clusters_are_sent_alone():
+    analyzer = ASTClusterAnalyzer(api_key='', max_output_tokens=100 * ANSWER_MAX_TOKENS)
+    items = [(0, _prepared('0', 100)), (1, _prepared('1', 600)), (2, _prepared('2', None, error='No AST files')),
+             (3, _prepared('3', 100))]
+
+    batches = [[position for position, _ in batch] for batch in analyzer._pack_batches(items, 1000)]
+
+    assert batches == [[1], [2], [0, 3]]
+
+
+def test_split_response_at_the_answer_markers():
+    response = (f"{BATCH_ANSWER_MARKER.format('1')}\nfirst answer\n"
+                f"  {BATCH_ANSWER_MARKER.format('2')}  \nsecond answer\n")
+
+    assert ASTClusterAnalyzer(api_key='')._split_batch_response(response, ['1', '2']) == {
+        '1': 'first answer', '2': 'second answer'}
+
+
+def test_split_response_leaves_out_missing_and_empty_answers():
+    response = (f"preamble\n{BATCH_ANSWER_MARKER.format('1')}\n\n{BATCH_ANSWER_MARKER.format('9')}\nunknown\n"
+                f"{BATCH_ANSWER_MARKER.format('3')}\nthird answer")
+
+    assert ASTClusterAnalyzer(api_key='')._split_batch_response(response, ['1', '2', '3']) == {'3': 'third answer'}
+
+
+def test_split_response_uses_the_last_of_duplicated_markers():
+    response = (f"I will answer under {BATCH_ANSWER_MARKER.format('1')} and the next marker:\n"
+                f"{BATCH_ANSWER_MARKER.format('1')}\ndraft\n"
+                f"{BATCH_ANSWER_MARKER.format('2')}\nsecond answer\n"
+                f"{BATCH_ANSWER_MARKER.format('1')}\nfinal answer")
+
+    assert ASTClusterAnalyzer(api_key='')._split_batch_response(response, ['1', '2']) == {
+        '1': 'final answer', '2': 'second answer'}
+
+
+def test_clusters_missing_from_a_batch_response_are_sent_alone(tmp_path, monkeypatch):
+    for cluster_id in ('1', '2', '3'):
+        cluster_dir = tmp_path / f'cluster_{cluster_id}'
+        cluster_dir.mkdir()
+        (cluster_dir / f'service{cluster_id}.ast.json').write_text(json.dumps({'type': 'Program', 'body': []}))
+
+    prompts = []
+
+    def post_completion(url, headers, payload, timeout, session=None):
+        prompts.append(payload['prompt'])
+        if BATCH_TASK_HEADING.format('1') in payload['prompt']:
+            # Batched request: cluster 2's answer is missing
+            return (f"{BATCH_ANSWER_MARKER.format('1')}\nbatched 1\n"
+                    f"{BATCH_ANSWER_MARKER.format('3')}\nbatched 3")
+        return 'single answer'
+
+    monkeypatch.setattr(v2_analyse_clusters, 'post_completion', post_completion)
+    monkeypatch.setattr(v2_analyse_clusters.time, 'sleep', lambda seconds: None)
+
+    analyzer = ASTClusterAnalyzer(api_key='', prompt_token_budget=1000)
+    results = analyzer.analyze_multiple_clusters(['1', '2', '3'], str(tmp_path), batch_tokens=100000)
+
+    assert [(result['cluster_id'], result['analysis']) for result in results] == [
+        ('1', 'batched 1'), ('2', 'single answer'), ('3', 'batched 3')]
+    assert len(prompts) == 2
@@ -0,0 +1,83 @@
+import argparse
+import json
+
+import pytest
+import requests
+
+import benchmark_pipeline
+from benchmark_pipeline import SCENARIOS, percentile, run_scenario
+from llm_client import RetryableError, post_completion, stream_completion
+from mock_completions_server import MockCompletionsServer, parse_latency
+from prompt_builder import BATCH_ANSWER_MARKER, BATCH_TASK_HEADING
+
+
+@pytest.fixture
+def no_pauses(monkeypatch):
+    # The analyzers pause between requests to stay under real rate limits
+    monkeypatch.setattr(benchmark_pipeline.time, 'sleep', lambda seconds: None)
+
+
+def test_percentile_uses_nearest_rank():
+    assert percentile([], 50) == 0.0
+    assert percentile([4.0, 1.0, 3.0, 2.0], 50) == 2.0
+    assert percentile([4.0, 1.0, 3.0, 2.0], 99) == 4.0
+
+
+def test_latency_specs():
+    assert parse_latency('fixed:0.5')() == 0.5
+    assert 1.0 <= parse_latency('uniform:1,2')() <= 2.0
+    with pytest.raises(ValueError):
+        parse_latency('gamma:1')
+
+
+def test_mock_server_answers_each_batched_task():
+    server = MockCompletionsServer(latency='fixed:0', completion_tokens=3).start()
+    try:
+        single = post_completion(server.url, {}, {'prompt': 'one task'}, timeout=5)
+        batched = post_completion(server.url, {}, {'prompt': f"{BATCH_TASK_HEADING.format('7')}\nx\n"
+                                                             f"{BATCH_TASK_HEADING.format('8')}\ny"}, timeout=5)
+        streamed = ''.join(stream_completion(server.url, {}, {'prompt': 'one task'}, timeout=5))
+    finally:
+        server.stop()
+
+    assert single == streamed == 'token token token'
+    assert batched == (f"{BATCH_ANSWER_MARKER.format('7')}\ntoken token token\n\n"
+                       f"{BATCH_ANSWER_MARKER.format('8')}\ntoken token token")
+    assert server.stats == {'requests': 3, 'throttled': 0, 'streamed': 1}
+
+
+def test_mock_server_throttles_with_retry_after():
+    server = MockCompletionsServer(latency='fixed:0', error_rate=1.0, retry_after=2.5).start()
+    try:
+        with pytest.raises(RetryableError) as raised:
+            post_completion(server.url, {}, {'prompt': 'p'}, timeout=5)
+        assert requests.post(server.url.replace('/inference/v1/completions', '/other'), json={},
+                             timeout=5).status_code == 404
+    finally:
+        server.stop()
+
+    assert raised.value.retry_after == 2.5
+    assert server.stats['throttled'] == 1
+
+
+@pytest.mark.parametrize('scenario', SCENARIOS)
+def test_every_scenario_runs_against_the_mock_server(tmp_path, no_pauses, scenario):
+    ast_dir = tmp_path / 'ast'
+    for cluster_id in ('1', '2'):
+        cluster_dir = ast_dir / f'cluster_{cluster_id}'
+        cluster_dir.mkdir(parents=True)
+        (cluster_dir / 'service.ast.json').write_text(json.dumps({'type': 'Program', 'body': []}))
+    cluster_data = tmp_path / 'clusters.json'
+    cluster_data.write_text(json.dumps([
+        {'cluster_id': cluster_id, 'num_files': 1, 'top_features': '', 'file_paths': ['service.ts'],
+         'sample_asts': ['SourceFile']} for cluster_id in (1, 2)
+    ]))
+    args = argparse.Namespace(latency='fixed:0', error_rate=0.0, retry_after=0, completion_tokens=5,
+                              clusters=None, ast_dir=str(ast_dir), cluster_data=str(cluster_data), max_files=None,
+                              workers=1, concurrency=2, batch_tokens=100000)
+
+    metrics = run_scenario(scenario, args)
+
+    assert metrics['scenario'] == scenario
+    assert metrics['clusters'] == 2
+    assert metrics['requests'] == (1 if scenario == 'v2-batch' else 2)
@@ -0,0 +1,47 @@
+import json
+
+from benchmark_stages import STAGES, benchmark_cluster, compare, time_call
+from v2_analyse_clusters import ASTClusterAnalyzer
+
+
+def _timings(**stages):
+    return {'results': {'1': stages}}
+
+
+def test_compare_flags_only_slowdowns_above_both_limits():
+    baseline = _timings(load_ast_files=0.100, simplify_ast=0.001, generate_flow_chart=0.050)
+    current = _timings(load_ast_files=0.130, simplify_ast=0.002, generate_flow_chart=0.055)
+
+    # simplify_ast doubled but by less than min_delta; the flow chart is within the threshold
+    assert compare(baseline, current, threshold=0.25, min_delta=0.002) == [
+        'cluster_1 load_ast_files: 100.0 ms -> 130.0 ms (+30%)']
+    assert compare(baseline, current, threshold=0.5, min_delta=0.002) == []
+    assert len(compare(baseline, current, threshold=0.05, min_delta=0.0)) == 3
+
+
+def test_compare_skips_stages_and_clusters_missing_from_the_baseline():
+    baseline = {'results': {'1': {'load_ast_files': 0.1}}}
+    current = {'results': {'1': {'load_ast_files': 0.1, 'compile_report': 9.0}, '2': {'load_ast_files': 9.0}}}
+
+    assert compare(baseline, current, threshold=0.25, min_delta=0.002) == []
+
+
+def test_time_call_runs_once_per_repeat():
+    calls = []
+    assert time_call(lambda: calls.append(1), repeat=3) >= 0.0
+    assert len(calls) == 3
+
+
+def test_benchmark_cluster_times_every_stage(tmp_path):
+    cluster_dir = tmp_path / 'cluster_1'
+    cluster_dir.mkdir()
+    ast = {'type': 'Program', 'body': [
+        {'type': 'ImportDeclaration', 'source': {'type': 'Literal', 'value': './orders.service'}, 'specifiers': []}
+    ]}
+    (cluster_dir / 'billing.service.ast.json').write_text(json.dumps(ast))
+
+    analyzer = ASTClusterAnalyzer(api_key='')
+    timings = benchmark_cluster(analyzer, '1', str(tmp_path), None, repeat=1)
+
+    assert tuple(timings) == STAGES
+    assert analyzer.results == [] and analyzer.open_stores == []
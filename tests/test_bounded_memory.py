@@ -0,0 +1,46 @@
+import json
+import tracemalloc
+
+from v2_analyse_clusters import ASTClusterAnalyzer
+
+
+def _write_cluster(ast_dir, files):
+    cluster_dir = ast_dir / 'cluster_1'
+    cluster_dir.mkdir()
+    for i in range(files):
+        ast = {'type': 'Program', 'body': [
+            {'type': 'ImportDeclaration', 'source': {'type': 'Literal', 'value': f'./dep{i}'}, 'specifiers': []}
+        ] * 50}
+        (cluster_dir / f'service{i}.ast.json').write_text(json.dumps(ast))
+
+
+def test_bounded_mode_keeps_every_file_and_warns_over_the_limit(tmp_path, capsys):
+    _write_cluster(tmp_path, 6)
+
+    prepared = ASTClusterAnalyzer(api_key='', max_memory_mb=0.0001).prepare_cluster('1', str(tmp_path))
+
+    assert prepared['file_count'] == 6
+    assert prepared['peak_memory_mb'] >= 0
+    assert 'above the 0.0001 MB limit' in capsys.readouterr().out
+    assert not tracemalloc.is_tracing()
+
+
+def test_bounded_mode_builds_the_same_prompt(tmp_path, capsys):
+    _write_cluster(tmp_path, 6)
+
+    bounded = ASTClusterAnalyzer(api_key='', max_memory_mb=1024).prepare_cluster('1', str(tmp_path))
+    unbounded = ASTClusterAnalyzer(api_key='').prepare_cluster('1', str(tmp_path))
+
+    assert bounded['prompt'] == unbounded['prompt']
+    assert 'Warning' not in capsys.readouterr().out
+
+
+def test_bounded_mode_leaves_callers_tracing_on(tmp_path):
+    _write_cluster(tmp_path, 2)
+
+    tracemalloc.start()
+    try:
+        ASTClusterAnalyzer(api_key='', max_memory_mb=1024).prepare_cluster('1', str(tmp_path))
+        assert tracemalloc.is_tracing()
+    finally:
+        tracemalloc.stop()
@@ -0,0 +1,77 @@
+import numpy as np
+
+from ast_features import NOISE_CLUSTER_ID, FeatureMatrix
+from cluster_assignment import CentroidModel, member_name, update_cluster_metadata
+
+SERVICE = 'ClassDeclaration MethodDefinition CallExpression MemberExpression Identifier'
+MODULE = 'ImportDeclaration ImportSpecifier Literal ExportNamedDeclaration ObjectExpression Property'
+
+
+def _sequence(base, variant):
+    return f'{base} {base.split()[variant % 5]} {base}'
+
+
+def _build(tmp_path):
+    ast_dir = tmp_path / 'AST'
+    ast_dir.mkdir()
+    clusters = []
+    for cluster_id, base in ((0, SERVICE), (1, MODULE)):
+        paths = []
+        for i in range(4):
+            name = f'c{cluster_id}_{i}.ts'
+            (ast_dir / f'{name}.txt').write_text(_sequence(base, i))
+            paths.append(f'src/{name}')
+        clusters.append({'cluster_id': cluster_id, 'num_files': 4, 'top_features': '', 'file_paths': paths,
+                         'sample_asts': []})
+    return CentroidModel.build(FeatureMatrix.build(str(ast_dir)), clusters), clusters
+
+
+def test_new_files_go_to_the_nearest_centroid_or_to_noise(tmp_path):
+    model, _ = _build(tmp_path)
+    counts = model.vectorize([_sequence(SERVICE, 1).split(), _sequence(MODULE, 2).split(),
+                              ['TemplateLiteral', 'TaggedTemplateExpression']])
+
+    assigned, similarity = model.assign(counts)
+
+    assert assigned.tolist() == [0, 1, NOISE_CLUSTER_ID]
+    assert similarity[0] > 0.9 and similarity[2] == 0.0
+
+
+def test_members_keep_their_cluster_when_no_less_similar(tmp_path):
+    model, _ = _build(tmp_path)
+    name = member_name('src/c0_3.ts')
+    counts = model.vectorize([_sequence(SERVICE, 3).split()])
+
+    # Even with a radius above every similarity, an unchanged member stays
+    model.radii[:] = 2.0
+    assert model.assign(counts, names=[name])[0].tolist() == [0]
+    assert model.assign(counts)[0].tolist() == [NOISE_CLUSTER_ID]
+
+
+def test_update_moves_changed_members_and_the_json_follows(tmp_path):
+    model, clusters = _build(tmp_path)
+    names = [member_name('src/c0_0.ts'), member_name('lib/c0_0.ts')]
+    counts = model.vectorize([_sequence(MODULE, 0).split(), _sequence(SERVICE, 0).split()])
+    assigned, similarity = model.assign(counts, names=names)
+
+    changes = model.update(names, counts, assigned, similarity)
+    affected = update_cluster_metadata(clusters, changes, {names[1]: 'lib/c0_0.ts'}, model)
+
+    # The changed file moves; the new file with the same basename is a different member
+    assert changes == {'src/c0_0.ts': (0, 1), 'lib/c0_0.ts': (None, 0)}
+    assert affected == [0, 1]
+    assert model.counts.tolist() == [4, 5]
+    assert clusters[0]['file_paths'] == ['src/c0_1.ts', 'src/c0_2.ts', 'src/c0_3.ts', 'lib/c0_0.ts']
+    assert clusters[1]['file_paths'][-1] == 'src/c0_0.ts' and clusters[1]['num_files'] == 5
+    assert clusters[1]['top_features'].startswith('importdeclaration')
+
+
+def test_saved_model_assigns_like_the_original(tmp_path):
+    model, _ = _build(tmp_path)
+    path = str(tmp_path / 'centroids.npz')
+    model.save(path)
+    loaded = CentroidModel.load(path)
+
+    counts = model.vectorize([_sequence(SERVICE, 2).split(), _sequence(MODULE, 4).split()])
+    np.testing.assert_array_equal(loaded.assign(counts)[0], model.assign(counts)[0])
+    assert loaded.member_names == model.member_names
@@ -0,0 +1,28 @@
+import os
+import subprocess
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+@pytest.mark.parametrize('command', [
+    ['-m', 'Cluster.analyze_clusters'],
+    [os.path.join('Cluster', 'analyze_clusters.py')]
+])
+def test_analyze_clusters_starts_as_module_and_as_script(command):
+    completed = subprocess.run([sys.executable] + command, cwd=ROOT, capture_output=True, text=True, timeout=60)
+
+    assert completed.returncode == 0, completed.stderr
+    # Stops at the API key check, after imports and argument parsing
+    assert 'Please set your Fireworks API key' in completed.stdout
+
+
+def test_analyze_clusters_script_runs_from_another_directory(tmp_path):
+    script = os.path.join(ROOT, 'Cluster', 'analyze_clusters.py')
+    completed = subprocess.run([sys.executable, script, '--help'], cwd=tmp_path, capture_output=True, text=True,
+                               timeout=60)
+
+    assert completed.returncode == 0, completed.stderr
+    assert '--cache-max-entries' in completed.stdout
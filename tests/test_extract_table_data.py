@@ -0,0 +1,72 @@
+import json
+
+import pytest
+
+from utils import extract_table_data
+from utils.extract_table_data import TARGET_FIELDS, iter_table_rows, stream_many, stream_table_data
+
+HEADERS = ['#'] + TARGET_FIELDS
+
+
+def _row(i, extra=''):
+    text = f'<b>text</b> {i} &amp; more{extra}'
+    cells = [str(i), f'src/file{i}.ts', str(i * 10)] + [text] * (len(TARGET_FIELDS) - 2)
+    return '<tr>' + ''.join(f'<td>\n  {cell}\n</td>' for cell in cells) + '</tr>'
+
+
+def _write_html(path, rows):
+    header = '<tr>' + ''.join(f'<th>{name}</th>' for name in HEADERS) + '</tr>'
+    path.write_text(
+        '<html><body><table class="summary"><tr><td>not this one</td></tr></table>'
+        f'<table class="wide-table"><thead>{header}</thead><tbody>{"".join(rows)}</tbody></table>'
+        '<table><tr><td>after</td></tr></table></body></html>',
+        encoding='utf-8'
+    )
+
+
+def test_rows_are_parsed_across_chunk_boundaries(tmp_path, monkeypatch):
+    monkeypatch.setattr(extract_table_data, 'CHUNK_SIZE', 7)
+    html_file = tmp_path / 'results.html'
+    _write_html(html_file, [_row(1), '<tr><td>short</td></tr>', _row(2, ' <table><tr><td>x</td></tr></table>')])
+
+    rows = list(iter_table_rows(str(html_file)))
+
+    assert len(rows) == 3
+    assert rows[0][:3] == ['1', 'src/file1.ts', '10']
+    assert rows[0][3] == 'text 1 & more'
+    assert rows[1] == ['short']
+    assert rows[2][3] == 'text 2 & more x'
+
+
+def test_streamed_output_matches_the_in_memory_path(tmp_path):
+    pytest.importorskip('bs4')
+    html_file = tmp_path / 'results.html'
+    _write_html(html_file, [_row(i) for i in range(1, 6)] + ['<tr><td>short</td></tr>'])
+
+    count = stream_table_data(str(html_file), str(tmp_path / 'out.csv'), str(tmp_path / 'out.json'))
+    data = extract_table_data.extract_table_data(str(html_file))
+    extract_table_data.save_as_csv(data, str(tmp_path / 'expected.csv'))
+    extract_table_data.save_as_json(data, str(tmp_path / 'expected.json'))
+
+    assert count == 5
+    assert (tmp_path / 'out.csv').read_bytes() == (tmp_path / 'expected.csv').read_bytes()
+    assert (tmp_path / 'out.json').read_text() == (tmp_path / 'expected.json').read_text()
+
+
+def test_nothing_is_kept_without_rows(tmp_path):
+    html_file = tmp_path / 'results.html'
+    _write_html(html_file, [])
+
+    assert stream_table_data(str(html_file), str(tmp_path / 'out.csv'), str(tmp_path / 'out.json')) == 0
+    assert not (tmp_path / 'out.csv').exists() and not (tmp_path / 'out.json').exists()
+
+
+def test_several_files_get_their_own_outputs(tmp_path):
+    for name, rows in (('a', 2), ('b', 3)):
+        _write_html(tmp_path / f'{name}.html', [_row(i) for i in range(rows)])
+
+    total = stream_many([str(tmp_path / 'a.html'), str(tmp_path / 'b.html')], str(tmp_path / 'out'), workers=2)
+
+    assert total == 5
+    assert len(json.loads((tmp_path / 'out' / 'b.json').read_text())) == 3
+    assert (tmp_path / 'out' / 'a.csv').read_text().splitlines()[0] == ','.join(TARGET_FIELDS)
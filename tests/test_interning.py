@@ -0,0 +1,112 @@
+import json
+
+import pytest
+
+import ast_loader
+from ast_loader import SubtreeInterner, load_ast_json
+from v2_analyse_clusters import ASTClusterAnalyzer
+
+IMPORT = {'type': 'ImportDeclaration', 'source': {'type': 'Literal', 'value': '@nestjs/common'},
+          'specifiers': [{'type': 'ImportSpecifier', 'local': {'type': 'Identifier', 'name': 'Injectable'}}]}
+
+
+def _service(name, method):
+    return {'type': 'Program', 'body': [
+        IMPORT,
+        {'type': 'ClassDeclaration', 'id': {'type': 'Identifier', 'name': name}, 'body': {
+            'type': 'ClassBody', 'body': [
+                {'type': 'MethodDefinition', 'key': {'type': 'Identifier', 'name': method},
+                 'value': {'type': 'FunctionExpression', 'params': [], 'range': [0, 9]}}
+            ]
+        }}
+    ]}
+
+
+def _write_cluster(base, cluster_id, services):
+    cluster_dir = base / f'cluster_{cluster_id}'
+    cluster_dir.mkdir(parents=True)
+    for name, method in services:
+        (cluster_dir / f'{name.lower()}.ast.json').write_text(json.dumps(_service(name, method)))
+    return str(cluster_dir)
+
+
+@pytest.fixture(params=[True, False], ids=['ijson', 'json'])
+def loader(request, monkeypatch):
+    if not request.param:
+        monkeypatch.setattr(ast_loader, 'ijson', None)
+    elif ast_loader.ijson is None:
+        pytest.skip('ijson is not installed')
+
+
+def test_identical_subtrees_are_shared_across_loads(tmp_path, loader):
+    (tmp_path / 'a.ast.json').write_text(json.dumps(_service('A', 'run')))
+    (tmp_path / 'b.ast.json').write_text(json.dumps(_service('B', 'run')))
+    interner = SubtreeInterner()
+
+    a = load_ast_json(str(tmp_path / 'a.ast.json'), interner)
+    b = load_ast_json(str(tmp_path / 'b.ast.json'), interner)
+
+    assert a['body'][0] is b['body'][0]
+    method = a['body'][1]['body']['body'][0]
+    assert method is b['body'][1]['body']['body'][0] and 'range' not in method['value']
+    assert interner.is_shared(a['body'][0]) and not interner.is_shared(a)
+    assert a == load_ast_json(str(tmp_path / 'a.ast.json'))
+
+
+def test_trim_forgets_least_recently_used_subtrees(tmp_path, loader):
+    (tmp_path / 'a.ast.json').write_text(json.dumps(_service('A', 'run')))
+    (tmp_path / 'b.ast.json').write_text(json.dumps(_service('B', 'stop')))
+    interner = SubtreeInterner()
+    a = load_ast_json(str(tmp_path / 'a.ast.json'), interner)
+    load_ast_json(str(tmp_path / 'b.ast.json'), interner)
+    # Reusing a tree makes its subtrees the most recently used, root last
+    assert load_ast_json(str(tmp_path / 'a.ast.json'), interner) is a
+    order = list(interner.canonical)
+
+    evicted = interner.trim(4)
+
+    assert evicted == order[:-4] and list(interner.canonical) == order[-4:]
+    assert len(interner.digests) == len(interner.uses) == 4
+    assert interner.digest(a) == order[-1] and interner.digest(a['body'][0]) is None
+    # Trees loaded before the trim are untouched, and later loads still parse the same
+    assert a == load_ast_json(str(tmp_path / 'a.ast.json'))
+    b = load_ast_json(str(tmp_path / 'b.ast.json'), interner)
+    assert b['body'][0] == a['body'][0] and b['body'][0] is not a['body'][0]
+    # a's root was kept, so reloading a still returns the whole earlier tree
+    assert load_ast_json(str(tmp_path / 'a.ast.json'), interner) is a
+    interner.trim(0)
+    assert not interner.canonical and not interner.digests and not interner.uses
+
+
+def test_analyzer_keeps_one_bounded_interner_for_the_run(tmp_path):
+    ast_dir = tmp_path / 'AST'
+    _write_cluster(ast_dir, 1, [('Billing', 'charge'), ('Orders', 'place')])
+    _write_cluster(ast_dir, 2, [('Users', 'charge'), ('Teams', 'place')])
+    analyzer = ASTClusterAnalyzer(api_key='', intern_subtrees=True, intern_max_entries=12)
+    interner = analyzer.interner
+
+    first = analyzer.prepare_cluster('1', str(ast_dir))
+    retained = set(interner.canonical)
+    assert analyzer.subtree_memo and set(analyzer.subtree_memo) <= retained
+    second = analyzer.prepare_cluster('2', str(ast_dir))
+
+    # The same interner served both clusters, trimmed to the bound, with the memo following it
+    assert analyzer.interner is interner
+    assert interner.stats()['nodes'] > 2 * len(retained) and len(interner.canonical) <= 12
+    assert set(analyzer.subtree_memo) <= set(interner.canonical)
+    assert first['patterns'] and second['patterns']
+
+
+def test_features_are_the_same_with_and_without_interning(tmp_path):
+    ast_dir = tmp_path / 'AST'
+    _write_cluster(ast_dir, 1, [('Billing', 'charge'), ('Orders', 'place')])
+    _write_cluster(ast_dir, 2, [('Users', 'charge'), ('Teams', 'place'), ('Audit', 'log')])
+
+    plain = ASTClusterAnalyzer(api_key='')
+    interned = ASTClusterAnalyzer(api_key='', intern_subtrees=True, intern_max_entries=5)
+    for cluster_id in ('1', '2', '1'):
+        expected = plain.prepare_cluster(cluster_id, str(ast_dir))
+        actual = interned.prepare_cluster(cluster_id, str(ast_dir))
+        assert actual['patterns'] == expected['patterns']
+        assert actual['relationships'] == expected['relationships']
+        assert actual['prompt'] == expected['prompt']
@@ -0,0 +1,148 @@
+import asyncio
+import time
+
+import pytest
+
+from llm_client import (AsyncCompletionClient, CompletionError, RetryableError, RetryScheduler, TokenBucket,
+                        stream_completion)
+
+
+def _run(scheduler, items, failures):
+    calls = []
+
+    def attempt(item):
+        calls.append(item)
+        if failures.get(item):
+            raise failures[item].pop(0)
+        return f'ok {item}'
+
+    def give_up(item, error):
+        return f'gave up {item}: {error}'
+
+    return dict(scheduler.run(items, attempt, give_up)), calls
+
+
+def test_non_retryable_error_gives_up_without_aborting_the_run():
+    results, calls = _run(RetryScheduler(), ['a', 'b', 'c'], {'b': [CompletionError('bad request')]})
+
+    assert results == {'a': 'ok a', 'b': 'gave up b: bad request', 'c': 'ok c'}
+    assert calls == ['a', 'b', 'c']
+
+
+def test_retryable_error_is_retried_until_attempts_run_out():
+    failures = {
+        'a': [RetryableError('throttled', retry_after=0)],
+        'b': [RetryableError('throttled', retry_after=0) for _ in range(3)]
+    }
+    results, calls = _run(RetryScheduler(max_attempts=3), ['a', 'b'], failures)
+
+    assert results == {'a': 'ok a', 'b': 'gave up b: throttled'}
+    assert calls.count('a') == 2
+    assert calls.count('b') == 3
+
+
+def test_token_bucket_paces_requests_beyond_its_burst():
+    async def take(bucket, count):
+        start = time.monotonic()
+        for _ in range(count):
+            await bucket.acquire()
+        return time.monotonic() - start
+
+    # Two requests of burst, then one every 0.25 s
+    assert asyncio.run(take(TokenBucket(240, capacity=2), 2)) < 0.1
+    assert 0.4 < asyncio.run(take(TokenBucket(240, capacity=2), 4)) < 1.0
+
+
+def test_async_client_bounds_concurrency_and_retries_throttling():
+    client = AsyncCompletionClient('key', 'model', max_concurrency=2, requests_per_minute=None,
+                                   retry=RetryScheduler(max_attempts=3, base_delay=0.01))
+    in_flight = []
+    peak = []
+    throttled = {'p1'}
+
+    def post(payload):
+        in_flight.append(payload['prompt'])
+        peak.append(len(in_flight))
+        time.sleep(0.05)
+        in_flight.remove(payload['prompt'])
+        if payload['prompt'] in throttled:
+            throttled.discard(payload['prompt'])
+            raise RetryableError('429', retry_after=0)
+        return f"answer to {payload['prompt']}"
+
+    client._post = post
+
+    async def run():
+        return await asyncio.gather(*(client.complete(f'p{i}') for i in range(6)))
+
+    try:
+        answers = asyncio.run(run())
+    finally:
+        client.close()
+    assert answers == [f'answer to p{i}' for i in range(6)]
+    assert max(peak) == 2
+
+
+def test_async_client_returns_error_text_for_non_retryable_failures():
+    client = AsyncCompletionClient('key', 'model', requests_per_minute=None, retry=RetryScheduler())
+
+    def post(payload):
+        raise CompletionError('Error: 400 - bad request')
+
+    client._post = post
+    try:
+        assert asyncio.run(client.complete('p')) == 'Error: 400 - bad request'
+    finally:
+        client.close()
+
+
+class _StreamResponse:
+    def __init__(self, status_code, lines, headers=None):
+        self.status_code = status_code
+        self.lines = lines
+        self.headers = headers or {}
+        self.text = 'slow down'
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def iter_lines(self):
+        return iter(self.lines)
+
+
+class _StreamSession:
+    def __init__(self, response):
+        self.response = response
+        self.kwargs = None
+
+    def post(self, url, **kwargs):
+        self.kwargs = kwargs
+        return self.response
+
+
+def test_stream_completion_yields_text_until_done():
+    session = _StreamSession(_StreamResponse(200, [
+        b'data: {"choices": [{"text": "Data "}]}',
+        b'',
+        b': keep-alive',
+        b'data: {"choices": [{"text": ""}]}',
+        b'data: {"choices": [{"text": "sinks"}]}',
+        b'data: [DONE]',
+        b'data: {"choices": [{"text": "ignored"}]}'
+    ]))
+
+    chunks = list(stream_completion('url', {}, {'prompt': 'p'}, timeout=5, session=session))
+
+    assert chunks == ['Data ', 'sinks']
+    assert session.kwargs['json'] == {'prompt': 'p', 'stream': True} and session.kwargs['stream']
+
+
+def test_stream_completion_raises_before_output_on_throttling():
+    session = _StreamSession(_StreamResponse(429, [], {'Retry-After': '3'}))
+
+    with pytest.raises(RetryableError) as raised:
+        list(stream_completion('url', {}, {'prompt': 'p'}, timeout=5, session=session))
+    assert raised.value.retry_after == 3.0
@@ -0,0 +1,48 @@
+from v2_analyse_clusters import ASTClusterAnalyzer
+
+SERVICE_METHODS = {
+    'billing.service': {'BillingService', 'charge'},
+    'orders.service': {'OrdersService'},
+    'audit.service': {'charge'}
+}
+
+
+def _call(obj, method):
+    return {'type': 'CallExpression', 'arguments': [], 'callee': {
+        'type': 'MemberExpression',
+        'object': {'type': 'Identifier', 'name': obj},
+        'property': {'type': 'Identifier', 'name': method}
+    }}
+
+
+def _find(node, service_name='orders.service'):
+    method_calls = []
+    ASTClusterAnalyzer(api_key='')._find_method_calls(node, service_name, SERVICE_METHODS, method_calls)
+    return sorted(method_calls)
+
+
+def test_calls_resolve_by_object_name_and_by_exported_method():
+    program = {'type': 'Program', 'body': [
+        {'type': 'ExpressionStatement', 'expression': _call('billing.service', 'refund')},
+        {'type': 'ExpressionStatement', 'expression': _call('client', 'charge')}
+    ]}
+
+    assert _find(program) == [('orders.service', 'audit.service'), ('orders.service', 'billing.service'),
+                              ('orders.service', 'billing.service')]
+
+
+def test_calls_into_the_same_service_are_ignored():
+    program = {'type': 'Program', 'body': [
+        {'type': 'ExpressionStatement', 'expression': _call('orders.service', 'OrdersService')}
+    ]}
+
+    assert _find(program) == []
+
+
+def test_deeply_nested_calls_do_not_recurse():
+    node = _call('client', 'charge')
+    for _ in range(5000):
+        node = {'type': 'ExpressionStatement', 'expression': {'type': 'AwaitExpression', 'argument': node}}
+
+    assert _find({'type': 'Program', 'body': [node]}) == [('orders.service', 'audit.service'),
+                                                          ('orders.service', 'billing.service')]
@@ -0,0 +1,52 @@
+import json
+import os
+
+from near_duplicates import ClusterDeduplicator, load_cluster_duplicates, write_cluster_duplicates
+
+PROGRAM = {
+    'type': 'Program',
+    'body': [
+        {'type': 'ImportDeclaration', 'source': {'type': 'Literal', 'value': 'x'}},
+        {'type': 'ExpressionStatement', 'expression': {'type': 'Identifier', 'name': 'y'}}
+    ]
+}
+OTHER = {'type': 'Program', 'body': [{'type': 'ClassDeclaration', 'body': {'type': 'ClassBody', 'body': []}}]}
+
+
+def _write_cluster(cluster_dir):
+    for name, ast in (('a', PROGRAM), ('b', PROGRAM), ('c', PROGRAM), ('z', OTHER)):
+        with open(os.path.join(cluster_dir, f'{name}.ast.json'), 'w', encoding='utf-8') as f:
+            json.dump(ast, f)
+
+
+def test_saved_groups_go_stale_when_any_file_changes(tmp_path):
+    _write_cluster(tmp_path)
+    write_cluster_duplicates(str(tmp_path), 0.9)
+    assert load_cluster_duplicates(str(tmp_path), 0.9) == [['a.ast.json', 'b.ast.json', 'c.ast.json']]
+
+    # Same mtime, different size
+    path = tmp_path / 'b.ast.json'
+    stat = path.stat()
+    path.write_text(json.dumps(PROGRAM) + '\n')
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+    assert load_cluster_duplicates(str(tmp_path), 0.9) is None
+
+    write_cluster_duplicates(str(tmp_path), 0.9)
+    (tmp_path / 'a.ast.json').unlink()
+    assert load_cluster_duplicates(str(tmp_path), 0.9) is None
+
+
+def test_duplicates_replace_a_representative_that_fails_to_load(tmp_path):
+    _write_cluster(tmp_path)
+    write_cluster_duplicates(str(tmp_path), 0.9)
+    dedup = ClusterDeduplicator(str(tmp_path), 0.9)
+
+    assert dedup.skip_before_load('b.ast.json')
+    dedup.fail('a.ast.json')
+    assert list(dedup.orphans())[:1] == ['b.ast.json']
+    assert not dedup.skip_before_load('b.ast.json')
+
+    assert dedup.add('b.ast.json', PROGRAM) is None
+    assert dedup.duplicates_of('b.ast.json') == ['c.ast.json']
+    assert dedup.add('c.ast.json', PROGRAM) == 'b.ast.json'
+    assert list(dedup.orphans()) == []
@@ -0,0 +1,55 @@
+from llm_client import estimate_tokens
+from prompt_builder import PromptBuilder
+from v2_analyse_clusters import ASTClusterAnalyzer
+
+
+def test_everything_fits_within_a_large_budget():
+    builder = PromptBuilder(1000, estimator=len)
+    builder.add_text('Header\n')
+    builder.add_section('Files:', ['a.ts', 'b.ts'], priority=0, omitted_label='files')
+
+    assert builder.build() == 'Header\nFiles:\na.ts\nb.ts'
+
+
+def test_sections_fill_in_priority_order_and_note_omissions():
+    builder = PromptBuilder(80, estimator=len)
+    builder.add_section('Samples:', ['s' * 30], priority=1, omitted_label='samples')
+    builder.add_section('Files:', ['a.ts', 'b.ts', 'c.ts', 'd.ts'], priority=0, omitted_label='files')
+
+    prompt = builder.build()
+
+    # Files come first by priority, so the later-added section keeps its place but loses its sample
+    assert prompt == 'Samples:\n(1 samples omitted)Files:\na.ts\nb.ts\nc.ts\nd.ts'
+    assert len(prompt) <= 80
+
+
+def test_items_are_dropped_from_the_end_with_a_count():
+    builder = PromptBuilder(45, estimator=len)
+    builder.add_section('Files:', [f'file{i}.ts' for i in range(10)], priority=0, omitted_label='files')
+
+    prompt = builder.build()
+
+    assert prompt.startswith('Files:\nfile0.ts\nfile1.ts')
+    assert prompt.endswith('(8 files omitted)')
+    assert len(prompt) <= 45
+
+
+def test_all_or_nothing_section_is_left_out_whole():
+    builder = PromptBuilder(40, estimator=len)
+    builder.add_section('Chart:', ['graph TD', 'A --> B' * 10], priority=0, omitted_label='flow chart',
+                        all_or_nothing=True)
+
+    assert builder.build() == 'Chart:\n(flow chart omitted)'
+
+
+def test_cluster_prompt_stays_within_the_budget():
+    ast_files = [{'filename': f'service{i}.ast.json', 'ast': {'type': 'Program', 'body': []}} for i in range(2000)]
+    patterns = [{'pattern_type': 'import_modules', 'data': [('@nestjs/common', 2000)]}]
+
+    # The instructions alone take about 350 tokens and are always included
+    for budget in (1000, 4000):
+        analyzer = ASTClusterAnalyzer(api_key='', prompt_token_budget=budget)
+        prompt = analyzer.generate_analysis_prompt(ast_files, patterns, 'Services', '1', 'graph TD')
+
+        assert estimate_tokens(prompt) <= budget + 10
+        assert 'files omitted)' in prompt
@@ -0,0 +1,83 @@
+import json
+
+import numpy as np
+
+from ast_features import NOISE_CLUSTER_ID
+from recluster import (NgramCorpus, assign_clusters, ast_json_name, build_cluster_records, minibatch_kmeans,
+                       refine_centers, write_cluster_dirs)
+
+SERVICE = 'ClassDeclaration MethodDefinition CallExpression MemberExpression Identifier'
+MODULE = 'ImportDeclaration ImportSpecifier Literal ExportNamedDeclaration ObjectExpression Property'
+
+
+def _write_corpus(input_dir):
+    input_dir.mkdir()
+    for i in range(6):
+        (input_dir / f'service{i}.ts.txt').write_text(f'{SERVICE} {SERVICE.split()[i % 5]}')
+        (input_dir / f'module{i}.ts.txt').write_text(f'{MODULE} {MODULE.split()[i % 6]}')
+    (input_dir / 'empty.ts.txt').write_text('')
+
+
+def _corpus(tmp_path, chunk_files):
+    work_dir = tmp_path / f'work{chunk_files}'
+    work_dir.mkdir()
+    corpus = NgramCorpus(str(work_dir))
+    corpus.build(str(tmp_path / 'input'), 'text', chunk_files)
+    corpus.select_features()
+    return corpus
+
+
+def test_counts_do_not_depend_on_the_chunk_size(tmp_path):
+    _write_corpus(tmp_path / 'input')
+    small = _corpus(tmp_path, 2)
+    large = _corpus(tmp_path, 1000)
+
+    index = np.arange(len(small))
+    assert small.paths == large.paths
+    np.testing.assert_array_equal(small.features, large.features)
+    assert (small.rows(index) != large.rows(index)).nnz == 0
+    # Rows read back in any order match the consecutive read
+    assert (small.rows(index[::-1]) != large.rows(index)[::-1]).nnz == 0
+
+
+def test_minibatch_kmeans_separates_groups_and_labels_empty_files_noise(tmp_path):
+    _write_corpus(tmp_path / 'input')
+    corpus = _corpus(tmp_path, 4)
+
+    centers = minibatch_kmeans(corpus, 2, batch_size=4, iterations=20, seed=1)
+    centers = refine_centers(corpus, centers, chunk_files=4)
+    labels = assign_clusters(corpus, centers, noise_fraction=0, chunk_files=4)
+
+    by_name = dict(zip((path.rsplit('/', 1)[-1] for path in corpus.paths), labels.tolist()))
+    assert by_name.pop('empty.ts.txt') == NOISE_CLUSTER_ID
+    services = {label for name, label in by_name.items() if name.startswith('service')}
+    modules = {label for name, label in by_name.items() if name.startswith('module')}
+    assert len(services) == 1 and len(modules) == 1 and services != modules
+    assert services | modules == {0, 1}
+
+
+def test_cluster_records_and_directories(tmp_path):
+    _write_corpus(tmp_path / 'input')
+    corpus = _corpus(tmp_path, 1000)
+    labels = np.array([0 if '/module' in path else 1 if '/service' in path else NOISE_CLUSTER_ID
+                       for path in corpus.paths])
+
+    clusters = build_cluster_records(corpus, labels, 'text')
+    assert [cluster['cluster_id'] for cluster in clusters] == [NOISE_CLUSTER_ID, 0, 1]
+    assert clusters[0]['top_features'] == '' and clusters[0]['sample_asts'] == ['']
+    assert clusters[1]['num_files'] == 6 and len(clusters[1]['sample_asts']) == 3
+    assert 'importdeclaration' in clusters[1]['top_features'].split(', ')
+    json.dumps(clusters)
+
+    ast_json_dir = tmp_path / 'json'
+    ast_json_dir.mkdir()
+    (ast_json_dir / 'module0.ast.json').write_text('{}')
+    missing = write_cluster_dirs(corpus, labels, str(tmp_path / 'clusters'), str(ast_json_dir))
+    assert missing == len(corpus) - 1
+    assert (tmp_path / 'clusters' / 'cluster_0' / 'module0.ast.json').exists()
+
+
+def test_ast_json_names():
+    assert ast_json_name('AST/foo.service.ts.txt') == 'foo.service.ast.json'
+    assert ast_json_name('x/bar.tsx.txt') == 'bar.ast.json'
+    assert ast_json_name('x/baz.ast.json') == 'baz.ast.json'
@@ -0,0 +1,85 @@
+import json
+
+import pytest
+
+import v2_analyse_clusters
+from llm_client import CompletionError, RetryableError
+from report_writer import StreamingReportWriter, sidecar_path_for
+from v2_analyse_clusters import ASTClusterAnalyzer
+
+
+def _prepared(cluster_id):
+    return {'cluster_id': cluster_id, 'category': 'Services', 'file_count': 2, 'patterns': [], 'flow_chart': '',
+            'relationships': {}, 'file_sample': ['a.ts'], 'prompt': f'prompt {cluster_id}', 'prompt_tokens': 10}
+
+
+def _stream(chunks, error=None):
+    def stream_completion(url, headers, payload, timeout, session=None):
+        yield from chunks
+        if error:
+            raise error
+    return stream_completion
+
+
+def test_sidecar_path_sits_next_to_the_report():
+    assert sidecar_path_for('out/report.md') == 'out/report.jsonl'
+    assert sidecar_path_for('out/report') == 'out/report.jsonl'
+
+
+def test_sections_are_readable_before_the_run_finishes(tmp_path):
+    report_path = str(tmp_path / 'report.md')
+    writer = StreamingReportWriter(report_path)
+
+    writer.begin_cluster(_prepared('1'))
+    writer.write_analysis('first ')
+    assert open(report_path).read().endswith('#### Analysis\n\nfirst ')
+
+    result = dict(_prepared('1'), analysis='first chunk')
+    writer.end_cluster(result)
+    writer.write_cluster(dict(_prepared('2'), error='Error: 400'))
+
+    with open(writer.sidecar_path) as f:
+        records = [json.loads(line) for line in f]
+    assert [record['cluster_id'] for record in records] == ['1', '2']
+    assert 'prompt' not in records[0] and records[1]['error'] == 'Error: 400'
+
+    writer.finish(records)
+    report = open(report_path).read()
+    assert report.index('### Cluster 2') < report.index('## Summary')
+    assert 'Total Clusters Analyzed: 2' in report
+
+
+def test_streamed_chunks_are_written_as_they_arrive(tmp_path, monkeypatch):
+    monkeypatch.setattr(v2_analyse_clusters, 'stream_completion', _stream(['Data ', 'sinks']))
+    writer = StreamingReportWriter(str(tmp_path / 'report.md'))
+
+    result = ASTClusterAnalyzer(api_key='')._stream_cluster_once(_prepared('1'), writer)
+    writer.close()
+
+    assert result['analysis'] == 'Data sinks' and 'error' not in result
+    assert '#### Analysis\n\nData sinks\n\n---' in open(writer.report_path).read()
+
+
+def test_broken_stream_keeps_partial_text(tmp_path, monkeypatch):
+    monkeypatch.setattr(v2_analyse_clusters, 'stream_completion',
+                        _stream(['partial'], RetryableError('connection reset')))
+    writer = StreamingReportWriter(str(tmp_path / 'report.md'))
+
+    result = ASTClusterAnalyzer(api_key='')._stream_cluster_once(_prepared('1'), writer)
+    writer.close()
+
+    assert result['analysis'] == 'partial'
+    assert result['error'] == 'Stream interrupted: connection reset'
+    assert 'partial\n\n[Stream interrupted: connection reset]' in open(writer.report_path).read()
+
+
+def test_failure_before_output_leaves_no_section(tmp_path, monkeypatch):
+    monkeypatch.setattr(v2_analyse_clusters, 'stream_completion', _stream([], CompletionError('Error: 400')))
+    writer = StreamingReportWriter(str(tmp_path / 'report.md'))
+
+    with pytest.raises(CompletionError):
+        ASTClusterAnalyzer(api_key='')._stream_cluster_once(_prepared('1'), writer)
+    writer.close()
+
+    # Nothing was written, so a retry can open the section cleanly
+    assert '### Cluster' not in open(writer.report_path).read()
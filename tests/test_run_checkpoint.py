@@ -0,0 +1,73 @@
+import os
+import subprocess
+import sys
+
+import pytest
+
+from run_checkpoint import RunCheckpoint, cluster_key
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def _result(cluster_id, analysis):
+    return {'cluster_id': cluster_id, 'category': 'Services', 'analysis': analysis, 'patterns': [{'big': True}]}
+
+
+def test_write_resume_and_refuse_cycle(tmp_path):
+    path = str(tmp_path / 'checkpoint.jsonl')
+
+    checkpoint = RunCheckpoint(path)
+    checkpoint.record('k1', _result('1', 'first'))
+    checkpoint.close()
+
+    # A plain run must not truncate recorded results
+    with pytest.raises(FileExistsError):
+        RunCheckpoint(path)
+
+    checkpoint = RunCheckpoint(path, resume=True)
+    assert checkpoint.get('k1') == {'cluster_id': '1', 'category': 'Services', 'analysis': 'first'}
+    assert checkpoint.get('k2') is None
+    checkpoint.record('k2', _result('2', 'second'))
+    checkpoint.close()
+    assert [result['cluster_id'] for result in RunCheckpoint.load_results(path)] == ['1', '2']
+
+    checkpoint = RunCheckpoint(path, fresh=True)
+    assert checkpoint.get('k1') is None
+    checkpoint.close()
+    assert RunCheckpoint.load_results(path) == []
+
+
+def test_resume_skips_a_truncated_last_line(tmp_path):
+    path = str(tmp_path / 'checkpoint.jsonl')
+    checkpoint = RunCheckpoint(path)
+    checkpoint.record('k1', _result('1', 'first'))
+    checkpoint.close()
+    with open(path, 'a', encoding='utf-8') as f:
+        f.write('{"key": "k2", "resu')
+
+    checkpoint = RunCheckpoint(path, resume=True)
+    checkpoint.record('k3', _result('3', 'third'))
+    checkpoint.close()
+
+    assert [record['key'] for record in RunCheckpoint.read_records(path)] == ['k1', 'k3']
+
+
+def test_cluster_key_changes_with_files_and_settings(tmp_path):
+    (tmp_path / 'a.ast.json').write_text('{}')
+    key = cluster_key('model', '1', str(tmp_path), 5, {'collectors': ['calls']})
+
+    assert key == cluster_key('model', '1', str(tmp_path), 5, {'collectors': ['calls']})
+    assert key != cluster_key('model', '1', str(tmp_path), 5, {'collectors': []})
+    assert key != cluster_key('model', '1', str(tmp_path), None, {'collectors': ['calls']})
+
+    (tmp_path / 'b.ast.json').write_text('{}')
+    assert key != cluster_key('model', '1', str(tmp_path), 5, {'collectors': ['calls']})
+
+
+@pytest.mark.parametrize('flag', ['--resume', '--fresh', '--report-only'])
+def test_checkpoint_flags_need_a_checkpoint(flag):
+    completed = subprocess.run([sys.executable, 'v2_analyse_clusters.py', flag], cwd=ROOT, capture_output=True,
+                               text=True, timeout=60)
+
+    assert completed.returncode == 2
+    assert 'need --checkpoint' in completed.stderr
@@ -0,0 +1,70 @@
+import json
+
+import pytest
+
+from tracing import NULL_SPAN, Tracer
+from v2_analyse_clusters import ASTClusterAnalyzer
+
+
+def test_spans_are_written_as_jsonl_with_inherited_cluster_ids(tmp_path):
+    path = tmp_path / 'trace.jsonl'
+    tracer = Tracer(str(path))
+
+    with tracer.span('prepare_cluster', cluster_id='7') as outer:
+        with tracer.span('load_ast_files') as inner:
+            inner.set(files=3)
+        outer.set(prompt_tokens=100)
+    with pytest.raises(KeyError):
+        with tracer.span('completion'):
+            raise KeyError('missing')
+    tracer.close()
+
+    records = [json.loads(line) for line in path.read_text().splitlines()]
+    assert [record['span'] for record in records] == ['load_ast_files', 'prepare_cluster', 'completion']
+    assert records[0]['cluster_id'] == '7' and records[0]['files'] == 3
+    assert records[1]['prompt_tokens'] == 100
+    assert records[2]['error'] == 'KeyError' and 'cluster_id' not in records[2]
+    assert all(record['wall'] >= 0 and record['cpu'] >= 0 for record in records)
+
+
+def test_disabled_tracer_hands_out_the_null_span(tmp_path):
+    tracer = Tracer(str(tmp_path / 'trace.jsonl'), enabled=False)
+
+    with tracer.span('stage', cluster_id='1') as span:
+        span.set(files=1)
+    tracer.add_records([{'span': 'stage', 'wall': 1.0, 'cpu': 1.0}])
+
+    assert span is NULL_SPAN
+    assert tracer.records == [] and tracer.timing_table() == ""
+    assert not (tmp_path / 'trace.jsonl').exists()
+
+
+def test_summary_and_timing_table_aggregate_by_span_name():
+    tracer = Tracer()
+    tracer.add_records([
+        {'span': 'load', 'wall': 1.0, 'cpu': 0.5},
+        {'span': 'completion', 'wall': 4.0, 'cpu': 0.1},
+        {'span': 'load', 'wall': 3.0, 'cpu': 1.5}
+    ])
+
+    assert tracer.summary() == [
+        {'span': 'load', 'calls': 2, 'wall_total': 4.0, 'wall_max': 3.0, 'cpu_total': 2.0},
+        {'span': 'completion', 'calls': 1, 'wall_total': 4.0, 'wall_max': 4.0, 'cpu_total': 0.1}
+    ]
+    assert '| load | 2 | 4.000 | 2000.0 | 3000.0 | 2.000 |' in tracer.timing_table()
+
+    drained = tracer.drain()
+    assert len(drained) == 3 and tracer.records == []
+
+
+def test_prepare_cluster_records_its_stages(tmp_path):
+    cluster_dir = tmp_path / 'cluster_1'
+    cluster_dir.mkdir()
+    (cluster_dir / 'service.ast.json').write_text(json.dumps({'type': 'Program', 'body': []}))
+
+    tracer = Tracer()
+    ASTClusterAnalyzer(api_key='', tracer=tracer).prepare_cluster('1', str(tmp_path))
+
+    spans = {record['span']: record for record in tracer.records}
+    assert 'prepare_cluster' in spans and 'load_ast_files' in spans
+    assert all(record['cluster_id'] == '1' for record in tracer.records)
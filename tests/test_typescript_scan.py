@@ -0,0 +1,87 @@
+import json
+import random
+import re
+
+from Cluster.analyze_ast_with_llm import find_typescript_files, parse_typescript_files, parse_typescript_to_ast
+
+SOURCE = """import { Injectable } from '@nestjs/common';
+import * as fs from "fs";
+
+@Injectable()
+export class Ignored {}
+class BillingService {
+  constructor(private readonly repo: Repo) {}
+    @Get(':id')
+  async charge(amount: number) {
+    save(record)
+  }
+}
+"""
+
+
+def _line_by_line(content):
+    # The per-line parser the single-pass scan replaced
+    ast = {"type": "Program", "body": []}
+    current_node = None
+    for line in content.split('\n'):
+        line = line.strip()
+        if not line:
+            continue
+        if line.startswith('import'):
+            ast["body"].append({"type": "ImportDeclaration", "text": line,
+                                "source": re.findall(r'from\s+[\'"](.+?)[\'"]', line)})
+        elif line.startswith('class'):
+            class_name = re.findall(r'class\s+(\w+)', line)
+            current_node = {"type": "ClassDeclaration", "name": class_name[0] if class_name else "Unknown",
+                            "text": line, "methods": [], "properties": []}
+            ast["body"].append(current_node)
+        elif re.match(r'\s*\w+\([^)]*\)', line) and current_node:
+            method_name = re.findall(r'(\w+)\s*\(', line)
+            current_node["methods"].append({"type": "MethodDeclaration",
+                                            "name": method_name[0] if method_name else "Unknown",
+                                            "text": line, "isAsync": "async" in line})
+        elif line.startswith('@'):
+            ast["body"].append({"type": "Decorator", "text": line})
+    return ast
+
+
+def test_scan_classifies_imports_classes_methods_and_decorators():
+    ast = parse_typescript_to_ast(SOURCE)
+
+    assert [node['type'] for node in ast['body']] == ['ImportDeclaration', 'ImportDeclaration', 'Decorator',
+                                                      'ClassDeclaration', 'Decorator']
+    assert ast['body'][1]['source'] == ['fs']
+    assert ast['body'][3]['name'] == 'BillingService'
+    assert [method['name'] for method in ast['body'][3]['methods']] == ['constructor', 'save']
+    assert ast == _line_by_line(SOURCE)
+
+
+def test_scan_matches_the_line_by_line_parser_on_fuzzed_input():
+    pieces = ['import', 'class', '@', 'async', 'save', '(', ')', 'x', ' ', '  ', '\t', '\n', '\n', "'a'",
+              'from ', '"b"', ';', '{', '}', 'class A', 'run(x)', ' from']
+    rng = random.Random(7)
+    for _ in range(3000):
+        content = ''.join(rng.choice(pieces) for _ in range(rng.randint(0, 30)))
+        assert parse_typescript_to_ast(content) == _line_by_line(content), repr(content)
+
+
+def test_batch_mode_writes_one_line_per_file_in_path_order(tmp_path):
+    (tmp_path / 'src').mkdir()
+    (tmp_path / 'src' / 'b.ts').write_text(SOURCE)
+    (tmp_path / 'src' / 'a.tsx').write_text('class A {}\n')
+    (tmp_path / 'src' / 'bad.ts').write_bytes(b'\xff\xfe class')
+    (tmp_path / 'src' / 'notes.md').write_text('class Ignored')
+
+    paths = find_typescript_files(str(tmp_path))
+    assert [path[len(str(tmp_path)) + 1:] for path in paths] == ['src/a.tsx', 'src/b.ts', 'src/bad.ts']
+    assert find_typescript_files(str(tmp_path / 'src' / '*.tsx')) == paths[:1]
+
+    output = tmp_path / 'asts.jsonl'
+    counts = parse_typescript_files(paths, str(output), workers=2, chunksize=1)
+
+    records = [json.loads(line) for line in output.read_text().splitlines()]
+    assert counts == {'parsed': 2, 'failed': 1}
+    assert [record['file'] for record in records] == paths
+    assert records[0]['ast']['body'][0]['name'] == 'A'
+    assert records[1]['ast'] == parse_typescript_to_ast(SOURCE)
+    assert 'error' in records[2]
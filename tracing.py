@@ -0,0 +1,188 @@
+import json
+import time
+import threading
+from typing import Dict, Any, List, Optional
+
+
+class _NullSpan:
+    """
+    Span returned by a disabled tracer; every operation is a no-op.
+    """
+
+    def set(self, **attrs) -> None:
+        pass
+
+    def __enter__(self) -> '_NullSpan':
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> bool:
+        return False
+
+
+NULL_SPAN = _NullSpan()
+
+
+class Span:
+    """
+    One timed operation. Attributes can be added while it is open with set().
+    """
+
+    __slots__ = ('tracer', 'name', 'attrs', 'start', '_wall', '_cpu')
+
+    def __init__(self, tracer: 'Tracer', name: str, attrs: Dict[str, Any]):
+        self.tracer = tracer
+        self.name = name
+        self.attrs = attrs
+
+    def set(self, **attrs) -> None:
+        self.attrs.update(attrs)
+
+    def __enter__(self) -> 'Span':
+        self.tracer._push(self)
+        self.start = time.time()
+        self._cpu = time.thread_time()
+        self._wall = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> bool:
+        wall = time.perf_counter() - self._wall
+        cpu = time.thread_time() - self._cpu
+        if exc_type is not None:
+            self.attrs['error'] = exc_type.__name__
+        self.tracer._finish(self, wall, cpu)
+        return False
+
+
+class Tracer:
+    """
+    Records spans as JSONL lines and keeps them for a summary table.
+
+    Nested spans on the same thread inherit the cluster_id of the span
+    enclosing them. CPU time is the thread CPU time spent inside the span;
+    for spans that await, it includes other tasks run on the event loop.
+    A disabled tracer hands out a shared no-op span, so instrumented code
+    costs one method call per span when tracing is off.
+    """
+
+    def __init__(self, path: Optional[str] = None, enabled: bool = True):
+        """
+        Initialize the tracer.
+
+        Args:
+            path: JSONL file to write finished spans to (None keeps them in memory only)
+            enabled: Record spans at all
+        """
+        self.enabled = enabled
+        self.path = path
+        self.records = []
+        self.file = open(path, 'w', encoding='utf-8') if enabled and path else None
+        self._local = threading.local()
+        self._lock = threading.Lock()
+
+    def span(self, name: str, **attrs) -> Any:
+        """
+        Open a span (use as a context manager).
+
+        Args:
+            name: Stage name
+            attrs: Initial attributes, e.g. cluster_id
+
+        Returns:
+            Span, or a no-op span when disabled
+        """
+        if not self.enabled:
+            return NULL_SPAN
+        return Span(self, name, attrs)
+
+    def _stack(self) -> List[Span]:
+        stack = getattr(self._local, 'stack', None)
+        if stack is None:
+            stack = self._local.stack = []
+        return stack
+
+    def _push(self, span: Span) -> None:
+        stack = self._stack()
+        if 'cluster_id' not in span.attrs:
+            for parent in reversed(stack):
+                if 'cluster_id' in parent.attrs:
+                    span.attrs['cluster_id'] = parent.attrs['cluster_id']
+                    break
+        stack.append(span)
+
+    def _finish(self, span: Span, wall: float, cpu: float) -> None:
+        stack = self._stack()
+        if span in stack:
+            stack.remove(span)
+
+        record = {'span': span.name, 'start': span.start, 'wall': wall, 'cpu': cpu}
+        record.update(span.attrs)
+        self.add_records([record])
+
+    def add_records(self, records: List[Dict[str, Any]]) -> None:
+        """
+        Add finished span records (e.g. ones collected in a worker process).
+        """
+        if not self.enabled or not records:
+            return
+        with self._lock:
+            self.records.extend(records)
+            if self.file is not None:
+                for record in records:
+                    self.file.write(json.dumps(record, default=str) + "\n")
+                self.file.flush()
+
+    def drain(self) -> List[Dict[str, Any]]:
+        """
+        Return and forget the records collected so far.
+        """
+        with self._lock:
+            records, self.records = self.records, []
+        return records
+
+    def summary(self) -> List[Dict[str, Any]]:
+        """
+        Aggregate wall and CPU time per span name, in order of first appearance.
+
+        Returns:
+            List of dictionaries with span, calls, wall_total, wall_max and cpu_total
+        """
+        totals = {}
+        for record in self.records:
+            entry = totals.get(record['span'])
+            if entry is None:
+                entry = totals[record['span']] = {
+                    'span': record['span'], 'calls': 0, 'wall_total': 0.0, 'wall_max': 0.0, 'cpu_total': 0.0
+                }
+            entry['calls'] += 1
+            entry['wall_total'] += record['wall']
+            entry['wall_max'] = max(entry['wall_max'], record['wall'])
+            entry['cpu_total'] += record['cpu']
+        return list(totals.values())
+
+    def timing_table(self) -> str:
+        """
+        Markdown table of the span summary (empty if nothing was recorded).
+        """
+        summary = self.summary()
+        if not summary:
+            return ""
+
+        lines = [
+            "| Stage | Calls | Wall Total (s) | Wall Mean (ms) | Wall Max (ms) | CPU Total (s) |",
+            "|---|---:|---:|---:|---:|---:|"
+        ]
+        for entry in summary:
+            lines.append(
+                f"| {entry['span']} | {entry['calls']} | {entry['wall_total']:.3f} | "
+                f"{entry['wall_total'] / entry['calls'] * 1000:.1f} | {entry['wall_max'] * 1000:.1f} | "
+                f"{entry['cpu_total']:.3f} |"
+            )
+        return "\n".join(lines) + "\n"
+
+    def close(self) -> None:
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+
+
+NULL_TRACER = Tracer(enabled=False)
@@ -1,13 +1,25 @@
 import os
 import csv
 import json
-from bs4 import BeautifulSoup
+import argparse
+import textwrap
+from collections import deque
+from html.parser import HTMLParser
+from concurrent.futures import ProcessPoolExecutor
+
+try:
+    from bs4 import BeautifulSoup
+except ImportError:  # Only needed for the in-memory path
+    BeautifulSoup = None
 
 # Configuration
 HTML_FILE = 'code_reasoning_results.html'
 OUTPUT_CSV = 'extracted_results.csv'
 OUTPUT_JSON = 'extracted_results.json'
 
+# Characters read from the HTML file per parser feed
+CHUNK_SIZE = 1 << 16
+
 # Fields to extract
 TARGET_FIELDS = [
     'filepath',
@@ -24,16 +36,16 @@ TARGET_FIELDS = [
     'sensitive_data_reasoning'
 ]
 
-def extract_table_data():
-    print(f"Processing {HTML_FILE}...")
+def extract_table_data(html_file=HTML_FILE):
+    print(f"Processing {html_file}...")
     
     # Check if file exists
-    if not os.path.exists(HTML_FILE):
-        print(f"Error: {HTML_FILE} not found.")
+    if not os.path.exists(html_file):
+        print(f"Error: {html_file} not found.")
         return None
     
     # Parse HTML
-    with open(HTML_FILE, 'r', encoding='utf-8') as file:
+    with open(html_file, 'r', encoding='utf-8') as file:
         soup = BeautifulSoup(file, 'html.parser')
     
     # Find the table - assuming it's the main table in the document
@@ -51,13 +63,8 @@ def extract_table_data():
         print("Error: Could not find table headers.")
         return None
     
-    # Verify that all target fields are in the headers
-    missing_fields = [field for field in TARGET_FIELDS if field not in headers]
-    if missing_fields:
-        print(f"Warning: The following fields were not found in the table: {', '.join(missing_fields)}")
-    
     # Create field indices mapping
-    field_indices = {field: headers.index(field) for field in TARGET_FIELDS if field in headers}
+    field_indices = get_field_indices(headers)
     
     # Extract data from each row
     results = []
@@ -91,6 +98,225 @@ def extract_table_data():
     print(f"Successfully extracted data from {len(results)} rows.")
     return results
 
+def get_field_indices(headers):
+    """Map each target field found in the headers to its column index"""
+    # Verify that all target fields are in the headers
+    missing_fields = [field for field in TARGET_FIELDS if field not in headers]
+    if missing_fields:
+        print(f"Warning: The following fields were not found in the table: {', '.join(missing_fields)}")
+    
+    return {field: headers.index(field) for field in TARGET_FIELDS if field in headers}
+
+class TableRowParser(HTMLParser):
+    """
+    Incremental parser for the first <table class="wide-table"> of a document.
+    
+    Feed it the HTML in chunks. The header cells of the first <thead> row
+    are stored in headers, and the cell texts of each completed <tbody> row
+    are queued in rows. Cell text is the stripped concatenation of all text
+    inside the cell, like BeautifulSoup's get_text().strip(). A nested table
+    only adds to the text of its cell (extract_table_data would also count
+    its cells and rows), and parsing stops at the end of the wide table.
+    """
+    
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.headers = None
+        self.rows = deque()
+        self.table_depth = 0
+        self.target_depth = None
+        self.done = False
+        self.section = None
+        self.cells = None
+        self.cell_tag = None
+        self.cell_text = None
+    
+    def _in_target(self):
+        return self.target_depth is not None and self.table_depth == self.target_depth and not self.done
+    
+    def _close_cell(self):
+        if self.cell_text is not None:
+            if self.section == 'tbody' or self.cell_tag == 'th':
+                self.cells.append("".join(self.cell_text).strip())
+            self.cell_text = None
+    
+    def _close_row(self):
+        self._close_cell()
+        if self.cells is None:
+            return
+        if self.section == 'thead':
+            if self.headers is None:
+                self.headers = self.cells
+        elif self.section == 'tbody':
+            self.rows.append(self.cells)
+        self.cells = None
+    
+    def handle_starttag(self, tag, attrs):
+        if self.done:
+            return
+        if tag == 'table':
+            self.table_depth += 1
+            if self.target_depth is None:
+                classes = (dict(attrs).get('class') or '').split()
+                if 'wide-table' in classes:
+                    self.target_depth = self.table_depth
+            return
+        if not self._in_target():
+            return
+        
+        if tag in ('thead', 'tbody'):
+            self._close_row()
+            self.section = tag
+        elif tag == 'tr':
+            self._close_row()
+            self.cells = []
+        elif tag in ('td', 'th') and self.cells is not None:
+            self._close_cell()
+            self.cell_tag = tag
+            self.cell_text = []
+    
+    def handle_endtag(self, tag):
+        if self.done:
+            return
+        if tag == 'table':
+            if self._in_target():
+                self._close_row()
+                self.done = True
+            self.table_depth = max(0, self.table_depth - 1)
+            return
+        if not self._in_target():
+            return
+        
+        if tag in ('td', 'th'):
+            self._close_cell()
+        elif tag == 'tr':
+            self._close_row()
+        elif tag in ('thead', 'tbody'):
+            self._close_row()
+            self.section = None
+    
+    def handle_data(self, data):
+        if self.cell_text is not None and not self.done:
+            self.cell_text.append(data)
+
+def iter_table_rows(html_file, parser=None):
+    """
+    Yield the cell texts of each body row of the wide table as the file is read.
+    
+    Args:
+        html_file: HTML file to read
+        parser: TableRowParser to use (its headers are set before the first row)
+    """
+    parser = TableRowParser() if parser is None else parser
+    with open(html_file, 'r', encoding='utf-8') as file:
+        while not parser.done:
+            chunk = file.read(CHUNK_SIZE)
+            if not chunk:
+                break
+            parser.feed(chunk)
+            while parser.rows:
+                yield parser.rows.popleft()
+    parser.close()
+    parser._close_row()
+    while parser.rows:
+        yield parser.rows.popleft()
+
+def stream_table_data(html_file=HTML_FILE, csv_file=OUTPUT_CSV, json_file=OUTPUT_JSON):
+    """
+    Extract the table rows of one HTML file straight to CSV and JSON.
+    
+    Rows are written as they are parsed, so memory use does not grow with
+    the file. The outputs match save_as_csv and save_as_json on the result
+    of extract_table_data. Nothing is kept if no rows are extracted.
+    
+    Args:
+        html_file: HTML file to read
+        csv_file: CSV file to write
+        json_file: JSON file to write
+        
+    Returns:
+        Number of rows written
+    """
+    print(f"Processing {html_file}...")
+    
+    # Check if file exists
+    if not os.path.exists(html_file):
+        print(f"Error: {html_file} not found.")
+        return 0
+    
+    parser = TableRowParser()
+    field_indices = None
+    rows_seen = 0
+    count = 0
+    
+    with open(csv_file, 'w', newline='', encoding='utf-8') as csvfile, \
+            open(json_file, 'w', encoding='utf-8') as jsonfile:
+        for cells in iter_table_rows(html_file, parser):
+            if field_indices is None:
+                if parser.headers is None:
+                    print(f"Error: Could not find table headers in {html_file}.")
+                    break
+                field_indices = get_field_indices(parser.headers)
+                writer = csv.DictWriter(csvfile, fieldnames=list(field_indices))
+                writer.writeheader()
+                jsonfile.write("[")
+            
+            rows_seen += 1
+            if len(cells) < len(parser.headers):
+                print(f"Warning: Row {rows_seen} has fewer cells than headers. Skipping.")
+                continue
+            
+            # Extract data for each target field
+            row_data = {field: cells[index] if index < len(cells) else "" for field, index in field_indices.items()}
+            writer.writerow(row_data)
+            
+            # Same layout as json.dump(rows, indent=2)
+            jsonfile.write(("," if count else "") + "\n" + textwrap.indent(json.dumps(row_data, indent=2), "  "))
+            count += 1
+            
+            # Progress indicator
+            if count % 100 == 0:
+                print(f"Processed {count} rows from {html_file}...")
+        
+        if field_indices is not None:
+            jsonfile.write("\n]" if count else "]")
+    
+    if parser.target_depth is None:
+        print(f"Error: Could not find the main table in {html_file}.")
+    
+    if not count:
+        print(f"No data extracted from {html_file}.")
+        os.remove(csv_file)
+        os.remove(json_file)
+        return 0
+    
+    print(f"Extracted {count} rows from {html_file} to {csv_file} and {json_file}")
+    return count
+
+def stream_many(html_files, output_dir, workers=None):
+    """
+    Extract several HTML files in parallel, one process per file at a time.
+    
+    Each input gets its own <name>.csv and <name>.json in output_dir.
+    
+    Args:
+        html_files: HTML files to read
+        output_dir: Directory for the outputs
+        workers: Number of processes (None for one per CPU)
+        
+    Returns:
+        Total number of rows written
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    jobs = []
+    for html_file in html_files:
+        stem = os.path.splitext(os.path.basename(html_file))[0]
+        jobs.append((html_file, os.path.join(output_dir, f"{stem}.csv"), os.path.join(output_dir, f"{stem}.json")))
+    
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        counts = list(executor.map(stream_table_data, *zip(*jobs)))
+    return sum(counts)
+
 def save_as_csv(data, filename=OUTPUT_CSV):
     """Save the extracted data as CSV"""
     if not data:
@@ -120,16 +346,37 @@ def save_as_json(data, filename=OUTPUT_JSON):
     print(f"Data saved to {filename}")
 
 if __name__ == "__main__":
-    # Extract data
-    extracted_data = extract_table_data()
+    parser = argparse.ArgumentParser(description="Extract reasoning results from HTML tables to CSV and JSON")
+    parser.add_argument("html_files", nargs="*", default=[HTML_FILE], help=f"HTML files to read (default: {HTML_FILE})")
+    parser.add_argument("--csv", default=OUTPUT_CSV, help=f"CSV output for a single input (default: {OUTPUT_CSV})")
+    parser.add_argument("--json", default=OUTPUT_JSON, help=f"JSON output for a single input (default: {OUTPUT_JSON})")
+    parser.add_argument("--output-dir", default=".", help="Directory for per-file outputs when several inputs are given")
+    parser.add_argument("--workers", type=int, default=None, help="Processes for several inputs (default: one per CPU)")
+    parser.add_argument("--in-memory", action="store_true",
+                        help="Parse the whole document with BeautifulSoup before writing (single input only)")
+    args = parser.parse_args()
     
-    if extracted_data:
-        # Save as CSV
-        save_as_csv(extracted_data)
-        
-        # Save as JSON
-        save_as_json(extracted_data)
-        
-        print("Extraction completed successfully!")
+    if len(args.html_files) > 1:
+        if args.in_memory:
+            parser.error("--in-memory handles a single input file")
+        total = stream_many(args.html_files, args.output_dir, args.workers)
+        print(f"Extraction completed: {total} rows from {len(args.html_files)} files")
+    elif not args.in_memory:
+        if stream_table_data(args.html_files[0], args.csv, args.json):
+            print("Extraction completed successfully!")
+        else:
+            print("Extraction failed.")
     else:
-        print("Extraction failed.") 
\ No newline at end of file
+        # Extract data
+        extracted_data = extract_table_data(args.html_files[0])
+        
+        if extracted_data:
+            # Save as CSV
+            save_as_csv(extracted_data, args.csv)
+            
+            # Save as JSON
+            save_as_json(extracted_data, args.json)
+            
+            print("Extraction completed successfully!")
+        else:
+            print("Extraction failed.")
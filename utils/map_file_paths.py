@@ -6,28 +6,176 @@ import logging
 import sys
 from tqdm import tqdm  # For progress bars
 
-# Configure logging
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.StreamHandler(sys.stdout),
-        logging.FileHandler('file_mapping.log')
-    ]
-)
 logger = logging.getLogger(__name__)
 
-def find_matching_file(base_dir, filename):
+# Persisted directory listings of the repository (see FileIndex)
+DEFAULT_INDEX_FILE = 'file_index.json'
+INDEX_VERSION = 1
+
+def _scan_directory(path):
+    """
+    List a directory the way glob's ** search sees it.
+    
+    Args:
+        path: Directory to list
+        
+    Returns:
+        List of [name, is_dir] pairs in listing order, without hidden entries
+    """
+    entries = []
+    with os.scandir(path) as it:
+        for entry in it:
+            if entry.name.startswith('.'):
+                continue
+            try:
+                is_dir = entry.is_dir(follow_symlinks=False)
+            except OSError:
+                is_dir = False
+            entries.append([entry.name, is_dir])
+    return entries
+
+class FileIndex:
+    """
+    Basename -> path index of a repository, built in one directory walk.
+    
+    Directories are visited in the same order as the recursive glob used by
+    find_matching_file, and the first path under a /src/ directory (or else
+    the first path) is chosen for each basename when the index is built, so
+    lookups are dictionary reads. Directory listings are saved to index_file
+    and reused on the next run for every directory whose mtime is unchanged,
+    so a refresh only re-lists directories where files were added, removed
+    or renamed. Symlinked directories are not followed.
+    """
+    
+    def __init__(self, base_dir, index_file=DEFAULT_INDEX_FILE):
+        """
+        Load the saved listings (if any) and bring the index up to date.
+        
+        Args:
+            base_dir: Root directory of the repository
+            index_file: JSON file to persist directory listings in (None to keep them in memory)
+        """
+        self.base_dir = os.path.abspath(base_dir)
+        self.index_file = index_file
+        self.directories = {}
+        self.paths = {}
+        self._load()
+        self.refresh()
+    
+    def _load(self):
+        if not self.index_file or not os.path.exists(self.index_file):
+            return
+        try:
+            with open(self.index_file, 'r', encoding='utf-8') as f:
+                saved = json.load(f)
+        except (OSError, ValueError) as e:
+            logger.warning(f"Ignoring unreadable file index {self.index_file}: {str(e)}")
+            return
+        if saved.get('version') == INDEX_VERSION and saved.get('root') == self.base_dir:
+            self.directories = saved.get('directories', {})
+            logger.info(f"Loaded file index with {len(self.directories)} directories from {self.index_file}")
+    
+    def _save(self):
+        temp_file = f"{self.index_file}.tmp"
+        with open(temp_file, 'w', encoding='utf-8') as f:
+            json.dump({'version': INDEX_VERSION, 'root': self.base_dir, 'directories': self.directories},
+                      f, separators=(',', ':'))
+        os.replace(temp_file, self.index_file)
+    
+    def refresh(self):
+        """
+        Walk the repository, re-listing only directories whose mtime changed.
+        """
+        saved = self.directories
+        directories = {}
+        scanned = 0
+        
+        stack = ['']
+        while stack:
+            rel_dir = stack.pop()
+            path = os.path.join(self.base_dir, rel_dir) if rel_dir else self.base_dir
+            try:
+                mtime_ns = os.stat(path).st_mtime_ns
+                record = saved.get(rel_dir)
+                if record is None or record['mtime_ns'] != mtime_ns:
+                    record = {'mtime_ns': mtime_ns, 'entries': _scan_directory(path)}
+                    scanned += 1
+            except OSError as e:
+                logger.debug(f"Skipping unreadable directory {path}: {str(e)}")
+                continue
+            
+            directories[rel_dir] = record
+            stack.extend(f"{rel_dir}/{name}" if rel_dir else name
+                         for name, is_dir in reversed(record['entries']) if is_dir)
+        
+        changed = scanned > 0 or len(directories) != len(saved)
+        self.directories = directories
+        self._build_lookup()
+        logger.info(f"File index: {len(directories)} directories ({scanned} re-listed), "
+                    f"{len(self.paths)} distinct filenames")
+        
+        if changed and self.index_file:
+            self._save()
+    
+    def _build_lookup(self):
+        """
+        Choose the path reported for each basename, preferring src/ directories.
+        """
+        # Paths are reported relative to the working directory, like the glob search
+        prefix = os.path.relpath(self.base_dir, os.getcwd()).replace('\\', '/')
+        paths = {}
+        
+        # Directories in pre-order (listing order), each directory's files before its subdirectories
+        stack = ['']
+        while stack:
+            rel_dir = stack.pop()
+            record = self.directories.get(rel_dir)
+            if record is None:
+                continue
+            
+            subdirs = []
+            for name, is_dir in record['entries']:
+                rel_path = f"{rel_dir}/{name}" if rel_dir else name
+                if is_dir:
+                    subdirs.append(rel_path)
+                    continue
+                path = rel_path if prefix == '.' else f"{prefix}/{rel_path}"
+                current = paths.get(name)
+                if current is None or ('/src/' in path and '/src/' not in current):
+                    paths[name] = path
+            stack.extend(reversed(subdirs))
+        
+        self.paths = paths
+    
+    def find(self, filename):
+        """
+        Look up a file by name (a .txt suffix and any directory part are ignored).
+        
+        Args:
+            filename: Filename to search for
+            
+        Returns:
+            Relative path if found, otherwise None
+        """
+        if filename.endswith('.txt'):
+            filename = filename[:-4]
+        return self.paths.get(os.path.basename(filename))
+
+def find_matching_file(base_dir, filename, index=None):
     """
     Find a matching file in the Twenty repository by searching recursively.
     
     Args:
         base_dir: Base directory to start the search
         filename: Filename to search for (without .txt extension)
+        index: FileIndex of base_dir to look the file up in instead of walking the repository
         
     Returns:
         Relative path if found, otherwise None
     """
+    if index is not None:
+        return index.find(filename)
+    
     # Remove .txt extension if present
     if filename.endswith('.txt'):
         filename = filename[:-4]
@@ -57,7 +205,7 @@ def find_matching_file(base_dir, filename):
     logger.debug(f"File not found: {base_filename}")
     return None
 
-def map_file_paths_in_clusters(input_json_file, output_json_file, twenty_dir):
+def map_file_paths_in_clusters(input_json_file, output_json_file, twenty_dir, index_file=DEFAULT_INDEX_FILE):
     """
     Update file paths in a cluster JSON file.
     
@@ -65,6 +213,7 @@ def map_file_paths_in_clusters(input_json_file, output_json_file, twenty_dir):
         input_json_file: Input JSON file with old paths
         output_json_file: Output JSON file with updated paths
         twenty_dir: Root directory of Twenty repository
+        index_file: File to persist the repository's file index in (None to rebuild it every run)
     """
     logger.info(f"Starting file path mapping process")
     logger.info(f"Input file: {input_json_file}")
@@ -95,6 +244,9 @@ def map_file_paths_in_clusters(input_json_file, output_json_file, twenty_dir):
         clusters = create_sample_clusters()
         logger.info(f"Created {len(clusters)} sample clusters")
     
+    # One walk of the repository serves every lookup
+    index = FileIndex(twenty_dir, index_file)
+    
     # Update file paths in each cluster
     logger.info(f"Processing {len(clusters)} clusters")
     for cluster_idx, cluster in enumerate(tqdm(clusters, desc="Processing clusters")):
@@ -114,7 +266,7 @@ def map_file_paths_in_clusters(input_json_file, output_json_file, twenty_dir):
                 logger.debug(f"Using cached mapping for {filename}: {new_path}")
             else:
                 # Find the matching file in Twenty repository
-                new_path = find_matching_file(twenty_dir, filename)
+                new_path = find_matching_file(twenty_dir, filename, index)
                 if new_path:
                     file_mapping[old_path] = new_path
                     found_count += 1
@@ -218,10 +370,23 @@ def print_file_mapping_report(file_mapping):
 if __name__ == "__main__":
     import argparse
     
+    # Configure logging (only when run as a script, so importing FileIndex has no side effects)
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s - %(levelname)s - %(message)s',
+        handlers=[
+            logging.StreamHandler(sys.stdout),
+            logging.FileHandler('file_mapping.log')
+        ]
+    )
+    
     parser = argparse.ArgumentParser(description="Map file paths from Colab to Twenty repository")
     parser.add_argument("--input", default="cluster_details.json", help="Input JSON file (default: cluster_details.json)")
     parser.add_argument("--output", default="updated_clusters.json", help="Output JSON file (default: updated_clusters.json)")
     parser.add_argument("--repo", default="./twenty", help="Path to Twenty repository (default: ./twenty)")
+    parser.add_argument("--index-file", default=DEFAULT_INDEX_FILE,
+                        help=f"File caching the repository's directory listings (default: {DEFAULT_INDEX_FILE})")
+    parser.add_argument("--no-index-file", action="store_true", help="Rebuild the file index without saving it")
     parser.add_argument("--verbose", "-v", action="store_true", help="Enable verbose logging")
     
     args = parser.parse_args()
@@ -238,7 +403,8 @@ if __name__ == "__main__":
     
     try:
         # Map file paths
-        file_mapping = map_file_paths_in_clusters(args.input, args.output, args.repo)
+        file_mapping = map_file_paths_in_clusters(args.input, args.output, args.repo,
+                                                  None if args.no_index_file else args.index_file)
         
         # Print report
         print_file_mapping_report(file_mapping)
@@ -1,21 +1,27 @@
 import os
 import json
-import requests
 import time
 from typing import List, Dict, Any, Optional
 import argparse
 
+from llm_client import CompletionError, RetryScheduler, post_completion
+
 class ASTClusterAnalyzer:
-    def __init__(self, api_key: str, model: str = "accounts/fireworks/models/deepseek-r1"):
+    def __init__(self, api_key: str, model: str = "accounts/fireworks/models/deepseek-r1",
+                 max_attempts: int = 5, retry_budget: int = 50):
         """
         Initialize the analyzer with Fireworks API credentials.
         
         Args:
             api_key: Fireworks.ai API key
             model: Model ID to use for analysis
+            max_attempts: Maximum API attempts per cluster
+            retry_budget: Total API retries allowed per run
         """
         self.api_key = api_key
         self.model = model
+        self.max_attempts = max_attempts
+        self.retry_budget = retry_budget
         self.headers = {
             "Authorization": f"Bearer {self.api_key}",
             "Content-Type": "application/json"
@@ -322,9 +328,9 @@ Provide specific technical details where possible, focusing on identifying the m
 """
         return prompt
     
-    def analyze_cluster(self, cluster_id: str, ast_dir: str, max_files: Optional[int] = None) -> Dict[str, Any]:
+    def prepare_cluster(self, cluster_id: str, ast_dir: str, max_files: Optional[int] = None) -> Dict[str, Any]:
         """
-        Analyze a single cluster using the Fireworks.ai API.
+        Run the local stages for a cluster and build its prompt.
         
         Args:
             cluster_id: ID of the cluster to analyze
@@ -332,7 +338,7 @@ Provide specific technical details where possible, focusing on identifying the m
             max_files: Maximum number of files to analyze
             
         Returns:
-            Dictionary with analysis results
+            Dictionary with the local results and the prompt, or an error
         """
         cluster_dir = os.path.join(ast_dir, f"cluster_{cluster_id}")
         
@@ -360,43 +366,85 @@ Provide specific technical details where possible, focusing on identifying the m
         # Generate prompt
         prompt = self.generate_analysis_prompt(ast_files, patterns, category, cluster_id)
         
-        # Call the API
-        try:
-            response = requests.post(
-                self.base_url,
-                headers=self.headers,
-                json={
-                    "model": self.model,
-                    "prompt": prompt,
-                    "max_tokens": 2048,
-                    "temperature": 0.2
-                },
-                timeout=60
-            )
-            
-            if response.status_code == 200:
-                result = response.json()
-                analysis = result['choices'][0]['text']
-            else:
-                analysis = f"Error: {response.status_code}\n{response.text}"
-        except Exception as e:
-            analysis = f"Exception during API call: {str(e)}"
-        
-        # Return the results
         return {
             "cluster_id": cluster_id,
             "category": category,
-            "analysis": analysis,
             "file_count": len(ast_files),
             "patterns": patterns,
-            "file_sample": [file_data['filename'] for file_data in ast_files[:5]]  # First 5 files as sample
+            "file_sample": [file_data['filename'] for file_data in ast_files[:5]],  # First 5 files as sample
+            "prompt": prompt
         }
     
+    def _complete_cluster_once(self, prepared: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Make a single completion attempt for a prepared cluster.
+        
+        Args:
+            prepared: Output of prepare_cluster
+            
+        Returns:
+            Dictionary with analysis results
+            
+        Raises:
+            RetryableError: If the request was throttled or hit a transient error
+            CompletionError: If the request failed otherwise
+        """
+        if 'error' in prepared:
+            return prepared
+        
+        # Call the API
+        analysis = post_completion(
+            self.base_url,
+            self.headers,
+            {
+                "model": self.model,
+                "prompt": prepared['prompt'],
+                "max_tokens": 2048,
+                "temperature": 0.2
+            },
+            timeout=60
+        )
+        return self._build_result(prepared, analysis)
+    
+    def _build_result(self, prepared: Dict[str, Any], analysis: str) -> Dict[str, Any]:
+        """
+        Combine a prepared cluster with its API analysis.
+        """
+        return {
+            "cluster_id": prepared['cluster_id'],
+            "category": prepared['category'],
+            "analysis": analysis,
+            "file_count": prepared['file_count'],
+            "patterns": prepared['patterns'],
+            "file_sample": prepared['file_sample']
+        }
+    
+    def analyze_cluster(self, cluster_id: str, ast_dir: str, max_files: Optional[int] = None) -> Dict[str, Any]:
+        """
+        Analyze a single cluster using the Fireworks.ai API.
+        
+        Args:
+            cluster_id: ID of the cluster to analyze
+            ast_dir: Base directory containing AST files
+            max_files: Maximum number of files to analyze
+            
+        Returns:
+            Dictionary with analysis results
+        """
+        prepared = self.prepare_cluster(cluster_id, ast_dir, max_files)
+        try:
+            return self._complete_cluster_once(prepared)
+        except CompletionError as e:
+            return self._build_result(prepared, str(e))
+    
     def analyze_multiple_clusters(self, cluster_ids: List[str], ast_dir: str, 
                                 max_files: Optional[int] = None) -> List[Dict[str, Any]]:
         """
         Analyze multiple clusters and store the results.
         
+        Throttled or failed requests are retried by a RetryScheduler, which
+        moves on to the next cluster while a failed one waits out its backoff.
+        
         Args:
             cluster_ids: List of cluster IDs to analyze
             ast_dir: Base directory containing AST files
@@ -406,13 +454,29 @@ Provide specific technical details where possible, focusing on identifying the m
             List of analysis results
         """
         self.results = []
-        for cluster_id in cluster_ids:
-            print(f"Analyzing cluster {cluster_id}...")
-            result = self.analyze_cluster(cluster_id, ast_dir, max_files)
-            self.results.append(result)
-            # Add a delay to avoid API rate limits
-            time.sleep(2)
-        
+        prepared_clusters = (
+            (position, self.prepare_cluster(cluster_id, ast_dir, max_files))
+            for position, cluster_id in enumerate(cluster_ids)
+        )
+        
+        def attempt(item):
+            position, prepared = item
+            print(f"Analyzing cluster {prepared['cluster_id']}...")
+            try:
+                return position, self._complete_cluster_once(prepared)
+            finally:
+                # Add a delay to avoid API rate limits
+                time.sleep(2)
+        
+        def give_up(item, error):
+            position, prepared = item
+            return position, self._build_result(prepared, str(error))
+        
+        scheduler = RetryScheduler(max_attempts=self.max_attempts, retry_budget=self.retry_budget)
+        completed = scheduler.run(prepared_clusters, attempt, give_up)
+        
+        ordered = sorted((position_result for _, position_result in completed), key=lambda item: item[0])
+        self.results = [result for _, result in ordered]
         return self.results
     
     def compile_report(self, output_file: str = "ast_analysis_report.md") -> str:
@@ -485,11 +549,14 @@ def main():
     parser.add_argument('--clusters', required=True, help='Comma-separated list of cluster IDs to analyze')
     parser.add_argument('--max-files', type=int, default=None, help='Maximum number of files to analyze per cluster')
     parser.add_argument('--output', default='ast_analysis_report.md', help='Output file for the report')
+    parser.add_argument('--max-attempts', type=int, default=5, help='Maximum API attempts per cluster')
+    parser.add_argument('--retry-budget', type=int, default=50, help='Total API retries allowed per run')
     
     args = parser.parse_args()
     
     # Create analyzer
-    analyzer = ASTClusterAnalyzer(api_key=args.api_key)
+    analyzer = ASTClusterAnalyzer(api_key=args.api_key, max_attempts=args.max_attempts,
+                                  retry_budget=args.retry_budget)
     
     # Parse cluster IDs
     cluster_ids = args.clusters.split(',')
@@ -1,21 +1,104 @@
 import os
-import json
-import requests
 import time
-from typing import List, Dict, Any, Optional, Set, Tuple
+import itertools
+import tracemalloc
+from typing import List, Dict, Any, Optional, Set, Tuple, Callable, Iterable, Iterator
 import argparse
+import asyncio
+from collections.abc import Mapping
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+
+from ast_loader import SubtreeInterner, DEFAULT_INTERNER_MAX_ENTRIES, load_ast_json
+from ast_index import ASTIndex
+from ast_store import ASTStore
+from ast_visitor import ASTCollector, ASTVisitor, CallSiteCollector, default_collectors, required_statement_types
+from near_duplicates import ClusterDeduplicator
+from llm_client import (AsyncCompletionClient, CompletionError, RetryScheduler,
+                        estimate_tokens, post_completion, stream_completion)
+from llm_cache import ResponseCache, DEFAULT_CACHE_PATH
+from report_writer import StreamingReportWriter, REPORT_FIELDS
+from run_checkpoint import RunCheckpoint, DEFAULT_CHECKPOINT_PATH, cluster_key
+from prompt_builder import (PromptBuilder, DEFAULT_PROMPT_TOKEN_BUDGET, BATCH_ANSWER_MARKER, BATCH_ANSWER_PATTERN,
+                            BATCH_TASK_HEADING, compact_json)
+from tracing import Tracer, NULL_TRACER
+
+# Files whose simplified ASTs are sampled in the analysis prompt
+PROMPT_AST_SAMPLES = 2
+# Statements simplify_ast reads arrays of (parameters); index headers drop arrays
+SIMPLIFIED_STATEMENT_TYPES = ('FunctionDeclaration',)
+
+# Completion tokens requested per cluster answer
+ANSWER_MAX_TOKENS = 2048
+# Completion tokens a single response of the default model may hold
+DEFAULT_MAX_OUTPUT_TOKENS = 8192
 
 class ASTClusterAnalyzer:
-    def __init__(self, api_key: str, model: str = "accounts/fireworks/models/deepseek-r1"):
+    def __init__(self, api_key: str, model: str = "accounts/fireworks/models/deepseek-r1",
+                 use_store: bool = True, cache_path: Optional[str] = None,
+                 max_attempts: int = 5, retry_budget: int = 50,
+                 prompt_token_budget: int = DEFAULT_PROMPT_TOKEN_BUDGET,
+                 tracer: Optional[Tracer] = None, max_memory_mb: Optional[float] = None,
+                 dedup_threshold: Optional[float] = None, intern_subtrees: bool = False,
+                 statements_only: bool = False, cache_max_entries: Optional[int] = None,
+                 cache_max_bytes: Optional[int] = None, cache_ttl: Optional[float] = None,
+                 max_output_tokens: int = DEFAULT_MAX_OUTPUT_TOKENS,
+                 intern_max_entries: int = DEFAULT_INTERNER_MAX_ENTRIES):
         """
         Initialize the analyzer with Fireworks API credentials.
         
         Args:
             api_key: Fireworks.ai API key
             model: Model ID to use for analysis
+            use_store: Read clusters from an up-to-date columnar AST store when one exists
+            cache_path: SQLite file for the response cache (None disables caching)
+            max_attempts: Maximum API attempts per cluster
+            retry_budget: Total API retries allowed per run
+            prompt_token_budget: Maximum estimated tokens per analysis prompt
+            tracer: Records per-stage spans (None disables tracing)
+            max_memory_mb: Enables bounded-memory mode: ASTs are processed one
+                file at a time, results keep only the report fields, and each
+                cluster's peak allocation is measured and checked against this limit
+            dedup_threshold: Collapse files whose node-type shingles have at least
+                this estimated Jaccard similarity into one representative
+                (see near_duplicates.py; None keeps every file)
+            intern_subtrees: Share identical subtrees between the JSON files
+                of every cluster this analyzer loads, and walk each shared
+                subtree once during feature extraction
+            statements_only: Skip call-site collection and parse only the
+                top-level statements the collectors need, through per-file
+                byte-offset indexes (see ast_index.py)
+            cache_max_entries: Evict least recently used responses beyond this count (None for no limit)
+            cache_max_bytes: Evict least recently used responses beyond this total size (None for no limit)
+            cache_ttl: Expire cached responses after this many seconds (None for no expiry)
+            max_output_tokens: Completion token limit of the model; batched
+                requests ask for at most this many and hold no more answers
+                than fit in it
+            intern_max_entries: Distinct subtrees kept for sharing between
+                clusters; the least recently used ones beyond this are
+                forgotten after each cluster
         """
         self.api_key = api_key
         self.model = model
+        self.use_store = use_store
+        self.collector_factories = {}
+        self.cache = ResponseCache(cache_path, max_entries=cache_max_entries, max_bytes=cache_max_bytes,
+                                   ttl=cache_ttl) if cache_path else None
+        self.last_request_sent = False
+        self.max_attempts = max_attempts
+        self.retry_budget = retry_budget
+        self.prompt_token_budget = prompt_token_budget
+        self.tracer = tracer or NULL_TRACER
+        self.max_memory_mb = max_memory_mb
+        self.max_output_tokens = max_output_tokens
+        self.dedup_threshold = dedup_threshold
+        self.intern_subtrees = intern_subtrees
+        self.statements_only = statements_only
+        self.intern_max_entries = intern_max_entries
+        self.interner = SubtreeInterner() if intern_subtrees else None
+        # Typed nodes per shared subtree digest, trimmed with the interner after each cluster
+        self.subtree_memo = {}
+        # Stores whose memory-mapped views may still be in use (see close_stores)
+        self.open_stores = []
         self.headers = {
             "Authorization": f"Bearer {self.api_key}",
             "Content-Type": "application/json"
@@ -27,6 +110,22 @@ class ASTClusterAnalyzer:
         """
         Load AST files from a specific cluster directory.
         
+        Files are streamed through load_ast_json, which drops position data,
+        tokens and comments so only the fields later stages read stay resident.
+        If the cluster has an up-to-date store (see ast_store.py), the ASTs are
+        read-only views over the memory-mapped store instead; they stay valid
+        until close_stores() is called. Either way files are taken in filename
+        order, so max_files selects the same files and the prompt is the same
+        with and without a store.
+        
+        With a dedup threshold, near-duplicate files are dropped and each
+        representative lists them under 'duplicates'.
+        
+        With statements_only, each JSON file is read through its sidecar
+        index and only the statements the collectors and simplify_ast need
+        are parsed; the others keep just their headers. Deduplication needs
+        whole files, so it turns this off.
+        
         Args:
             cluster_dir: Path to the cluster directory
             max_files: Maximum number of files to load (None for all)
@@ -34,28 +133,110 @@ class ASTClusterAnalyzer:
         Returns:
             List of AST objects
         """
-        ast_files = []
-        file_count = 0
+        with self.tracer.span('load_ast_files') as span:
+            stats = {}
+            ast_files = list(self.iter_ast_files(cluster_dir, max_files, stats))
+            span.set(**stats)
+        return ast_files
+    
+    def iter_ast_files(self, cluster_dir: str, max_files: Optional[int] = None,
+                       stats: Optional[Dict[str, int]] = None) -> Iterator[Dict[str, Any]]:
+        """
+        Yield the AST files of a cluster directory one at a time (see load_ast_files).
         
-        for filename in os.listdir(cluster_dir):
-            if filename.endswith('.ast.json'):
-                file_path = os.path.join(cluster_dir, filename)
-                try:
-                    with open(file_path, 'r', encoding='utf-8') as f:
-                        ast_data = json.load(f)
-                        ast_files.append({
-                            'filename': filename,
-                            'ast': ast_data
-                        })
-                        file_count += 1
-                        print(f"Loaded AST from {filename}")
-                        
-                        if max_files is not None and file_count >= max_files:
-                            break
-                except Exception as e:
-                    print(f"Error loading {filename}: {str(e)}")
+        Args:
+            cluster_dir: Path to the cluster directory
+            max_files: Maximum number of files to load (None for all)
+            stats: Dictionary to record the file count and bytes read in
+            
+        Yields:
+            Dictionaries with the filename and its AST
+        """
+        stats = {} if stats is None else stats
+        stats['files'] = 0
+        
+        dedup = None
+        if self.dedup_threshold is not None:
+            dedup = ClusterDeduplicator(cluster_dir, self.dedup_threshold)
+            stats['duplicates'] = 0
+        
+        store = ASTStore.open_for_cluster(cluster_dir) if self.use_store else None
+        if store is not None:
+            self.open_stores.append(store)
+            # The store is memory-mapped, so record its size rather than bytes paged in
+            stats['store_bytes'] = os.path.getsize(store.path)
+            for filename, root, _, _ in sorted(store.iter_files(), key=lambda entry: entry[0]):
+                if dedup is not None and (dedup.skip_before_load(filename) or dedup.add(filename, root)):
+                    stats['duplicates'] += 1
+                    continue
+                stats['files'] += 1
+                file_data = {
+                    'filename': filename,
+                    'ast': root
+                }
+                if dedup is not None:
+                    file_data['duplicates'] = dedup.duplicates_of(filename)
+                yield file_data
+                if max_files is not None and stats['files'] >= max_files:
+                    break
+            print(f"Loaded {stats['files']} ASTs from {store.path}")
+            return
         
-        return ast_files
+        statement_types = None
+        if self.statements_only and dedup is None:
+            statement_types = required_statement_types(self._new_collectors().values())
+            if statement_types is not None:
+                statement_types.update(SIMPLIFIED_STATEMENT_TYPES)
+        
+        stats['bytes_read'] = 0
+        filenames = sorted(name for name in os.listdir(cluster_dir) if name.endswith('.ast.json'))
+        skipped = set()
+        if dedup is not None:
+            # Duplicates of representatives that fail to load are loaded after all
+            filenames = itertools.chain(filenames, dedup.orphans())
+        for filename in filenames:
+            if dedup is not None and dedup.skip_before_load(filename):
+                stats['duplicates'] += 1
+                skipped.add(filename)
+                continue
+            if filename in skipped:
+                skipped.discard(filename)
+                stats['duplicates'] -= 1
+            
+            file_path = os.path.join(cluster_dir, filename)
+            try:
+                if statement_types is not None:
+                    index = ASTIndex.open(file_path)
+                    ast_data = index.load(statement_types, self.interner)
+                    bytes_read = index.bytes_needed(statement_types)
+                else:
+                    ast_data = load_ast_json(file_path, self.interner)
+                    bytes_read = os.path.getsize(file_path)
+            except Exception as e:
+                print(f"Error loading {filename}: {str(e)}")
+                if dedup is not None:
+                    dedup.fail(filename)
+                continue
+            
+            stats['bytes_read'] += bytes_read
+            representative = dedup.add(filename, ast_data) if dedup is not None else None
+            if representative is not None:
+                stats['duplicates'] += 1
+                print(f"Skipped {filename} (near-duplicate of {representative})")
+                continue
+            
+            stats['files'] += 1
+            print(f"Loaded AST from {filename}")
+            file_data = {
+                'filename': filename,
+                'ast': ast_data
+            }
+            if dedup is not None:
+                file_data['duplicates'] = dedup.duplicates_of(filename)
+            yield file_data
+            
+            if max_files is not None and stats['files'] >= max_files:
+                break
     
     def simplify_ast(self, ast_data: Dict[str, Any]) -> Dict[str, Any]:
         """
@@ -92,7 +273,7 @@ class ASTClusterAnalyzer:
                 for param in ast_data['params']:
                     if param is None:
                         simplified['params'].append('null_param')
-                    elif isinstance(param, dict) and 'name' in param:
+                    elif isinstance(param, Mapping) and 'name' in param:
                         simplified['params'].append(param['name'])
                     else:
                         simplified['params'].append('complex_param')
@@ -100,75 +281,108 @@ class ASTClusterAnalyzer:
         # For imports/exports
         if ast_data.get('type') in ['ImportDeclaration', 'ExportNamedDeclaration']:
             source = ast_data.get('source')
-            if source is not None and isinstance(source, dict):
+            if source is not None and isinstance(source, Mapping):
                 simplified['moduleSpecifier'] = source.get('value', '')
             else:
                 simplified['moduleSpecifier'] = ''
         
         return simplified
     
-    def extract_ast_patterns(self, ast_files: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    def register_collector(self, name: str, factory: Callable[[], ASTCollector]) -> None:
+        """
+        Register an additional collector to run in the shared AST traversal.
+        
+        Args:
+            name: Key of the collector in the extract_ast_features result
+            factory: Callable returning a fresh collector for each cluster
+        """
+        self.collector_factories[name] = factory
+    
+    def extract_ast_features(self, ast_files: List[Dict[str, Any]]) -> Dict[str, ASTCollector]:
+        """
+        Visit every AST once and run all collectors over it.
+        
+        Args:
+            ast_files: List of AST objects
+            
+        Returns:
+            Dictionary mapping collector names to filled collectors
+        """
+        collectors = self._new_collectors()
+        
+        with self.tracer.span('extract_ast_features') as span:
+            visitor = ASTVisitor(list(collectors.values()), self.interner, self.subtree_memo)
+            for file_data in ast_files:
+                visitor.visit_file(file_data['filename'], file_data['ast'])
+            span.set(files=len(ast_files), nodes=visitor.nodes_visited,
+                     subtrees_reused=visitor.subtrees_reused)
+        
+        return collectors
+    
+    def extract_ast_features_bounded(self, cluster_dir: str,
+                                     max_files: Optional[int] = None) -> Tuple[List[Dict[str, Any]], Dict[str, ASTCollector]]:
+        """
+        Load and visit a cluster's ASTs one file at a time.
+        
+        Each AST is released once the collectors have seen it, so peak memory
+        follows the largest file rather than the whole cluster. The returned
+        file entries hold the filename only, plus the simplified AST for the
+        files sampled in the prompt.
+        
+        Args:
+            cluster_dir: Path to the cluster directory
+            max_files: Maximum number of files to load (None for all)
+            
+        Returns:
+            Tuple of (file entries, dictionary mapping collector names to filled collectors)
+        """
+        collectors = self._new_collectors()
+        
+        with self.tracer.span('load_and_extract_features') as span:
+            stats = {}
+            visitor = ASTVisitor(list(collectors.values()), self.interner, self.subtree_memo)
+            ast_files = []
+            for file_data in self.iter_ast_files(cluster_dir, max_files, stats):
+                visitor.visit_file(file_data['filename'], file_data['ast'])
+                entry = {'filename': file_data['filename']}
+                if 'duplicates' in file_data:
+                    entry['duplicates'] = file_data['duplicates']
+                if len(ast_files) < PROMPT_AST_SAMPLES:
+                    entry['simplified_ast'] = self.simplify_ast(file_data['ast'])
+                ast_files.append(entry)
+            span.set(nodes=visitor.nodes_visited, subtrees_reused=visitor.subtrees_reused, **stats)
+        
+        return ast_files, collectors
+    
+    def _new_collectors(self) -> Dict[str, ASTCollector]:
+        collectors = default_collectors()
+        if self.statements_only:
+            del collectors['calls']
+        for name, factory in self.collector_factories.items():
+            collectors[name] = factory()
+        return collectors
+    
+    def extract_ast_patterns(self, ast_files: List[Dict[str, Any]],
+                             features: Optional[Dict[str, ASTCollector]] = None) -> List[Dict[str, Any]]:
         """
         Extract common patterns from AST files.
         
         Args:
             ast_files: List of AST objects
+            features: Output of extract_ast_features (computed if not given)
             
         Returns:
             List of common patterns found
         """
+        if features is None:
+            features = self.extract_ast_features(ast_files)
+        
         patterns = []
         
-        # Count declaration types
-        declaration_types = {}
-        import_modules = {}
-        export_types = {}
-        class_methods = {}
-        
-        for file_data in ast_files:
-            ast = file_data['ast']
-            filename = file_data['filename']
-            
-            # Process the Program body
-            if ast.get('type') == 'Program' and 'body' in ast:
-                for node in ast['body']:
-                    node_type = node.get('type', '')
-                    
-                    # Count declaration types
-                    if node_type in declaration_types:
-                        declaration_types[node_type] += 1
-                    else:
-                        declaration_types[node_type] = 1
-                    
-                    # Track imports
-                    if node_type == 'ImportDeclaration' and 'source' in node:
-                        module_name = node.get('source', {}).get('value', '')
-                        if module_name:
-                            if module_name in import_modules:
-                                import_modules[module_name] += 1
-                            else:
-                                import_modules[module_name] = 1
-                    
-                    # Track exports
-                    if node_type in ['ExportNamedDeclaration', 'ExportDefaultDeclaration']:
-                        if 'declaration' in node and node['declaration']:
-                            export_type = node['declaration'].get('type', '')
-                            if export_type:
-                                if export_type in export_types:
-                                    export_types[export_type] += 1
-                                else:
-                                    export_types[export_type] = 1
-                    
-                    # Track class methods
-                    if node_type == 'ClassDeclaration' and 'body' in node and 'body' in node['body']:
-                        for class_item in node['body']['body']:
-                            if class_item.get('type') == 'MethodDefinition':
-                                method_name = class_item.get('key', {}).get('name', '')
-                                if method_name:
-                                    if method_name in class_methods:
-                                        class_methods[method_name] += 1
-                                    else:
-                                        class_methods[method_name] = 1
+        declaration_types = features['declarations'].counts
+        import_modules = features['imports'].module_counts
+        export_types = features['exports'].type_counts
+        class_methods = features['class_methods'].counts
         
         # Add patterns to the result
         if declaration_types:
@@ -197,16 +411,25 @@ class ASTClusterAnalyzer:
         
         return patterns
     
-    def extract_service_relationships(self, ast_files: List[Dict[str, Any]]) -> Dict[str, Any]:
+    def extract_service_relationships(self, ast_files: List[Dict[str, Any]],
+                                      features: Optional[Dict[str, ASTCollector]] = None) -> Dict[str, Any]:
         """
         Extract relationships between services based on imports, method calls, and dependencies.
         
         Args:
             ast_files: List of AST objects
+            features: Output of extract_ast_features (computed if not given)
             
         Returns:
             Dictionary with service relationship data for flow chart generation
         """
+        if features is None:
+            features = self.extract_ast_features(ast_files)
+        
+        file_exports = features['exports'].file_exports
+        file_imports = features['imports'].file_imports
+        file_calls = features['calls'].file_calls if 'calls' in features else {}
+        
         # Extract service names from filenames
         service_names = []
         for file_data in ast_files:
@@ -220,58 +443,35 @@ class ASTClusterAnalyzer:
         service_methods = {}
         service_imports = {}
         
-        # First pass: collect all exported methods and classes
+        # Exported methods and classes per service
         for file_data in ast_files:
             filename = file_data['filename']
             service_name = filename.replace('.ast.json', '')
-            ast = file_data['ast']
-            
-            exported_items = set()
-            
-            # Process the Program body to find exports
-            if ast.get('type') == 'Program' and 'body' in ast:
-                for node in ast['body']:
-                    # Check for export declarations
-                    if node.get('type') in ['ExportNamedDeclaration', 'ExportDefaultDeclaration']:
-                        if node.get('declaration') and node['declaration'].get('id'):
-                            exported_name = node['declaration']['id'].get('name', '')
-                            if exported_name:
-                                exported_items.add(exported_name)
-            
-            service_methods[service_name] = exported_items
+            service_methods[service_name] = file_exports.get(filename, set())
         
-        # Second pass: find dependencies between services
+        # Dependencies between services from imports
         for file_data in ast_files:
             filename = file_data['filename']
             service_name = filename.replace('.ast.json', '')
-            ast = file_data['ast']
             
             imports = []
-            
-            # Process the Program body to find imports
-            if ast.get('type') == 'Program' and 'body' in ast:
-                for node in ast['body']:
-                    # Check for import declarations
-                    if node.get('type') == 'ImportDeclaration' and node.get('source'):
-                        import_path = node['source'].get('value', '')
-                        if import_path:
-                            # Extract the service name from the import path
-                            imported_service = self._extract_service_from_import(import_path)
-                            if imported_service and imported_service in service_names and imported_service != service_name:
-                                imports.append(imported_service)
-                                dependencies.append((service_name, imported_service))
+            for import_path in file_imports.get(filename, []):
+                # Extract the service name from the import path
+                imported_service = self._extract_service_from_import(import_path)
+                if imported_service and imported_service in service_names and imported_service != service_name:
+                    imports.append(imported_service)
+                    dependencies.append((service_name, imported_service))
             
             service_imports[service_name] = imports
         
         # Find method calls between services (this is a simplified approximation)
+        call_index = self._build_call_index(service_methods)
         method_calls = []
         for file_data in ast_files:
             filename = file_data['filename']
             service_name = filename.replace('.ast.json', '')
-            ast = file_data['ast']
-            
-            # Recursively search for method calls
-            self._find_method_calls(ast, service_name, service_methods, method_calls)
+            self._resolve_method_calls(file_calls.get(filename, set()), service_name,
+                                       call_index, method_calls)
         
         # Combine dependencies and method calls
         all_relationships = list(set(dependencies + method_calls))
@@ -313,7 +513,7 @@ class ASTClusterAnalyzer:
     def _find_method_calls(self, node: Any, service_name: str, service_methods: Dict[str, Set[str]], 
                           method_calls: List[Tuple[str, str]]) -> None:
         """
-        Recursively search for method calls in an AST node.
+        Search an AST node for method calls into other services.
         
         Args:
             node: AST node to search
@@ -321,31 +521,55 @@ class ASTClusterAnalyzer:
             service_methods: Dictionary mapping services to their exported methods
             method_calls: List to collect method call relationships
         """
-        if node is None or not isinstance(node, dict):
+        if node is None or not isinstance(node, Mapping):
             return
         
-        # Check for method calls (CallExpression)
-        if node.get('type') == 'CallExpression' and node.get('callee'):
-            callee = node['callee']
+        collector = CallSiteCollector()
+        ASTVisitor([collector]).visit_file(service_name, node)
+        self._resolve_method_calls(collector.file_calls[service_name], service_name,
+                                   self._build_call_index(service_methods), method_calls)
+    
+    def _build_call_index(self, service_methods: Dict[str, Set[str]]) -> Tuple[Dict[str, List[str]], Set[str]]:
+        """
+        Build inverted indexes for resolving call sites to services.
+        
+        Args:
+            service_methods: Dictionary mapping services to their exported methods
             
-            # Check for member expressions (e.g., serviceObj.method())
-            if callee.get('type') == 'MemberExpression' and callee.get('object') and callee.get('property'):
-                obj_name = callee['object'].get('name', '')
-                method_name = callee['property'].get('name', '')
-                
-                # Check if this might be a call to another service
-                for other_service, methods in service_methods.items():
-                    if other_service != service_name and (obj_name == other_service or method_name in methods):
-                        method_calls.append((service_name, other_service))
-        
-        # Recursively search in all properties that might contain AST nodes
-        for key, value in node.items():
-            if isinstance(value, dict):
-                self._find_method_calls(value, service_name, service_methods, method_calls)
-            elif isinstance(value, list):
-                for item in value:
-                    if isinstance(item, dict):
-                        self._find_method_calls(item, service_name, service_methods, method_calls)
+        Returns:
+            Tuple of (method name -> services exporting it, set of service names)
+        """
+        method_index = {}
+        for service, methods in service_methods.items():
+            for method_name in methods:
+                method_index.setdefault(method_name, []).append(service)
+        
+        return method_index, set(service_methods)
+    
+    def _resolve_method_calls(self, call_sites: Set[Tuple[str, str]], service_name: str,
+                              call_index: Tuple[Dict[str, List[str]], Set[str]],
+                              method_calls: List[Tuple[str, str]]) -> None:
+        """
+        Match member call sites against the other services.
+        
+        A call targets another service if the object is named after it or
+        the method is one of its exports; both are O(1) index lookups.
+        
+        Args:
+            call_sites: Set of (object name, method name) pairs found in the service
+            service_name: Name of the current service
+            call_index: Output of _build_call_index
+            method_calls: List to collect method call relationships
+        """
+        method_index, services = call_index
+        
+        for obj_name, method_name in call_sites:
+            if obj_name != service_name and obj_name in services:
+                method_calls.append((service_name, obj_name))
+            
+            for other_service in method_index.get(method_name, ()):
+                if other_service != service_name:
+                    method_calls.append((service_name, other_service))
     
     def generate_flow_chart(self, relationships_data: Dict[str, Any]) -> str:
         """
@@ -454,48 +678,67 @@ class ASTClusterAnalyzer:
         Returns:
             Prompt string
         """
-        filenames = [file_data['filename'] for file_data in ast_files]
-        
-        # Format patterns for the prompt
-        patterns_text = ""
+        # Format patterns for the prompt, one block per pattern type
+        pattern_blocks = []
         for pattern in patterns:
             pattern_type = pattern['pattern_type']
             pattern_data = pattern['data']
             
-            patterns_text += f"\n{pattern_type.replace('_', ' ').title()}:\n"
+            block = f"{pattern_type.replace('_', ' ').title()}:"
             for item, count in pattern_data[:5]:  # Limit to top 5
-                patterns_text += f"- {item}: {count}\n"
+                block += f"\n- {item}: {count}"
+            pattern_blocks.append(block)
         
         # Include simplified AST samples
         ast_samples = []
-        for file_data in ast_files[:2]:  # Limit to 2 files for brevity
-            simplified_ast = self.simplify_ast(file_data['ast'])
-            ast_samples.append({
+        for file_data in ast_files[:PROMPT_AST_SAMPLES]:  # Limit to 2 files for brevity
+            if 'simplified_ast' in file_data:
+                simplified_ast = file_data['simplified_ast']
+            else:
+                simplified_ast = self.simplify_ast(file_data['ast'])
+            ast_samples.append(compact_json({
                 'filename': file_data['filename'],
                 'simplified_ast': simplified_ast
-            })
+            }))
         
-        # Build the prompt
-        prompt = f"""
+        # Near-duplicates collapsed while loading are named next to their representative
+        file_lines = []
+        duplicate_count = 0
+        for file_data in ast_files:
+            duplicates = file_data.get('duplicates')
+            if duplicates:
+                duplicate_count += len(duplicates)
+                file_lines.append(f"{file_data['filename']} (near-duplicates: {', '.join(duplicates)})")
+            else:
+                file_lines.append(file_data['filename'])
+        file_count = f"{len(ast_files) + duplicate_count}"
+        if duplicate_count:
+            file_count += f" ({duplicate_count} near-duplicates collapsed into their representatives)"
+        
+        # Build the prompt; sections are filled in priority order within the budget
+        builder = PromptBuilder(self.prompt_token_budget)
+        builder.add_text(f"""
 You are an expert TypeScript code analyzer specialized in understanding Abstract Syntax Trees (ASTs) and identifying data sink services and data flow patterns.
 
 Task: Analyze the following cluster of AST files to generate a summarized AST representation and identify data sink patterns.
 
 Cluster ID: {cluster_id}
 Cluster Category: {category}
-Number of files: {len(ast_files)}
-
-Files in this cluster:
-{json.dumps(filenames, indent=2)}
-
-AST Patterns detected:
-{patterns_text}
+Number of files: {file_count}
 
-Service Relationship Flow Chart:
-{flow_chart}
-
-Sample simplified ASTs:
-{json.dumps(ast_samples, indent=2)}
+""")
+        builder.add_section("Files in this cluster:", file_lines,
+                            priority=0, omitted_label="files")
+        builder.add_text("\n\n")
+        builder.add_section("AST Patterns detected:", pattern_blocks, priority=1,
+                            omitted_label="pattern types")
+        builder.add_text("\n\n")
+        builder.add_section("Service Relationship Flow Chart:", [flow_chart], priority=2,
+                            omitted_label="flow chart", all_or_nothing=True)
+        builder.add_text("\n\n")
+        builder.add_section("Sample simplified ASTs:", ast_samples, priority=3,
+                            omitted_label="AST samples")
+        builder.add_text("""
 
 Based on this information, please provide:
 
@@ -508,12 +751,18 @@ Based on this information, please provide:
 7. Analyze the service relationships shown in the flow chart and explain the likely responsibilities of each service.
 
 Provide specific technical details where possible, focusing on identifying the main data sinks and the patterns of data flow within this cluster.
-"""
-        return prompt
+""")
+        return builder.build()
     
-    def analyze_cluster(self, cluster_id: str, ast_dir: str, max_files: Optional[int] = None) -> Dict[str, Any]:
+    def prepare_cluster(self, cluster_id: str, ast_dir: str, max_files: Optional[int] = None) -> Dict[str, Any]:
         """
-        Analyze a single cluster using the Fireworks.ai API.
+        Run the local stages for a cluster: load, patterns, relationships,
+        categorization and prompt construction. No API call is made, and the
+        returned dictionary holds no ASTs so it can be sent between processes.
+        
+        With max_memory_mb, the peak traced allocation is measured and a
+        warning is printed for a cluster that exceeds the limit. Every file
+        is still analyzed, one at a time (see extract_ast_features_bounded).
         
         Args:
             cluster_id: ID of the cluster to analyze
@@ -521,8 +770,67 @@ Provide specific technical details where possible, focusing on identifying the m
             max_files: Maximum number of files to analyze
             
         Returns:
-            Dictionary with analysis results
+            Dictionary with the local results and the prompt, or an error
+        """
+        with self.tracer.span('prepare_cluster', cluster_id=cluster_id) as span:
+            if self.max_memory_mb is None:
+                try:
+                    return self._prepare_cluster(cluster_id, ast_dir, max_files)
+                finally:
+                    self._trim_shared_subtrees()
+                    self.close_stores()
+            
+            # Trace only while preparing, unless the caller is tracing already
+            started_tracing = not tracemalloc.is_tracing()
+            if started_tracing:
+                tracemalloc.start()
+            try:
+                # Peak traced allocation while preparing, above what was already allocated
+                tracemalloc.reset_peak()
+                baseline = tracemalloc.get_traced_memory()[0]
+                try:
+                    prepared = self._prepare_cluster(cluster_id, ast_dir, max_files)
+                finally:
+                    self._trim_shared_subtrees()
+                    self.close_stores()
+                peak_mb = (tracemalloc.get_traced_memory()[1] - baseline) / (1024 * 1024)
+            finally:
+                if started_tracing:
+                    tracemalloc.stop()
+            
+            prepared['peak_memory_mb'] = round(peak_mb, 1)
+            span.set(peak_memory_mb=prepared['peak_memory_mb'])
+            if peak_mb > self.max_memory_mb:
+                print(f"Warning: cluster {cluster_id} peaked at {peak_mb:.1f} MB, "
+                      f"above the {self.max_memory_mb:g} MB limit")
+            return prepared
+    
+    def close_stores(self) -> None:
         """
+        Close the AST stores opened by load_ast_files and iter_ast_files.
+        
+        ASTs read from a store are views over its memory map and must not be
+        used afterwards. prepare_cluster calls this once a cluster is prepared.
+        """
+        while self.open_stores:
+            self.open_stores.pop().close()
+    
+    def _trim_shared_subtrees(self) -> None:
+        """
+        Bound the interned subtrees and memoized visits kept for later clusters.
+        
+        Subtrees shared between clusters (imports, decorators, boilerplate)
+        stay interned and their visits stay memoized for the rest of the run.
+        Beyond intern_max_entries the least recently used are forgotten,
+        with their memo entries, so the retained set does not grow with
+        the corpus.
+        """
+        if self.interner is None:
+            return
+        for digest in self.interner.trim(self.intern_max_entries):
+            self.subtree_memo.pop(digest, None)
+    
+    def _prepare_cluster(self, cluster_id: str, ast_dir: str, max_files: Optional[int]) -> Dict[str, Any]:
         cluster_dir = os.path.join(ast_dir, f"cluster_{cluster_id}")
         
         if not os.path.exists(cluster_dir):
@@ -531,8 +839,13 @@ Provide specific technical details where possible, focusing on identifying the m
                 "error": f"Cluster directory {cluster_dir} does not exist"
             }
         
-        # Load AST files
-        ast_files = self.load_ast_files(cluster_dir, max_files)
+        if self.max_memory_mb is not None:
+            # Visit each file as it loads; only filenames and prompt samples are kept
+            ast_files, features = self.extract_ast_features_bounded(cluster_dir, max_files)
+        else:
+            # Load AST files
+            ast_files = self.load_ast_files(cluster_dir, max_files)
+            features = None
         
         if not ast_files:
             return {
@@ -540,88 +853,734 @@ Provide specific technical details where possible, focusing on identifying the m
                 "error": f"No AST files found in {cluster_dir}"
             }
         
+        # Run all collectors in a single traversal
+        if features is None:
+            features = self.extract_ast_features(ast_files)
+        
+        tracer = self.tracer
+        
         # Extract patterns
-        patterns = self.extract_ast_patterns(ast_files)
+        with tracer.span('extract_ast_patterns'):
+            patterns = self.extract_ast_patterns(ast_files, features)
         
         # Extract service relationships
-        relationships_data = self.extract_service_relationships(ast_files)
+        with tracer.span('extract_service_relationships'):
+            relationships_data = self.extract_service_relationships(ast_files, features)
         
         # Generate flow chart
-        flow_chart = self.generate_flow_chart(relationships_data)
+        with tracer.span('generate_flow_chart'):
+            flow_chart = self.generate_flow_chart(relationships_data)
         
         # Categorize cluster
-        category = self.categorize_cluster(ast_files, patterns)
+        with tracer.span('categorize_cluster'):
+            category = self.categorize_cluster(ast_files, patterns)
         
         # Generate prompt
-        prompt = self.generate_analysis_prompt(ast_files, patterns, category, cluster_id, flow_chart)
+        with tracer.span('generate_analysis_prompt') as span:
+            prompt = self.generate_analysis_prompt(ast_files, patterns, category, cluster_id, flow_chart)
+            span.set(prompt_chars=len(prompt), prompt_tokens=estimate_tokens(prompt))
         
-        # Call the API
+        return {
+            "cluster_id": cluster_id,
+            "category": category,
+            "file_count": len(ast_files) + sum(len(file_data.get('duplicates', ())) for file_data in ast_files),
+            "patterns": patterns,
+            "flow_chart": flow_chart,
+            "relationships": relationships_data,
+            "file_sample": [file_data['filename'] for file_data in ast_files[:5]],  # First 5 files as sample
+            "prompt": prompt,
+            "prompt_tokens": estimate_tokens(prompt)
+        }
+    
+    def complete_cluster(self, prepared: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Call the Fireworks.ai API for a cluster prepared by prepare_cluster.
+        
+        Args:
+            prepared: Output of prepare_cluster
+            
+        Returns:
+            Dictionary with analysis results
+        """
         try:
-            response = requests.post(
+            return self._complete_cluster_once(prepared)
+        except CompletionError as e:
+            return self._build_result(prepared, str(e))
+    
+    def _complete_cluster_once(self, prepared: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Make a single completion attempt for a prepared cluster.
+        
+        Args:
+            prepared: Output of prepare_cluster
+            
+        Returns:
+            Dictionary with analysis results
+            
+        Raises:
+            RetryableError: If the request was throttled or hit a transient error
+            CompletionError: If the request failed otherwise
+        """
+        self.last_request_sent = False
+        if 'error' in prepared:
+            return prepared
+        
+        prompt = prepared['prompt']
+        
+        with self.tracer.span('completion', cluster_id=prepared['cluster_id'], mode='sync',
+                              prompt_chars=len(prompt), prompt_tokens=prepared['prompt_tokens']) as span:
+            # Reuse a cached response for an identical request
+            analysis = self.cache.get(self.model, prompt, ANSWER_MAX_TOKENS, 0.2) if self.cache else None
+            if analysis is not None:
+                span.set(cached=True, response_chars=len(analysis))
+                return self._build_result(prepared, analysis)
+            
+            # Call the API
+            self.last_request_sent = True
+            analysis = post_completion(
                 self.base_url,
-                headers=self.headers,
-                json={
+                self.headers,
+                {
                     "model": self.model,
                     "prompt": prompt,
-                    "max_tokens": 2048,
+                    "max_tokens": ANSWER_MAX_TOKENS,
                     "temperature": 0.2
                 },
                 timeout=60
             )
+            span.set(cached=False, response_chars=len(analysis))
+            if self.cache:
+                self.cache.put(self.model, prompt, ANSWER_MAX_TOKENS, 0.2, analysis)
+        
+        return self._build_result(prepared, analysis)
+    
+    def _stream_cluster_once(self, prepared: Dict[str, Any], writer: StreamingReportWriter) -> Dict[str, Any]:
+        """
+        Make a single streaming completion attempt and write it to the report.
+        
+        The cluster's section is opened when the first chunk arrives, so a
+        request that fails before producing output can be retried cleanly.
+        A stream that breaks part way keeps its partial text and notes the error.
+        
+        Args:
+            prepared: Output of prepare_cluster
+            writer: Report the cluster section is appended to
+            
+        Returns:
+            Dictionary with analysis results (with an error entry if the stream broke)
+            
+        Raises:
+            RetryableError: If the request was throttled before any output
+            CompletionError: If the request failed before any output
+        """
+        self.last_request_sent = False
+        if 'error' in prepared:
+            writer.write_cluster(prepared)
+            return prepared
+        
+        prompt = prepared['prompt']
+        
+        with self.tracer.span('completion', cluster_id=prepared['cluster_id'], mode='stream',
+                              prompt_chars=len(prompt), prompt_tokens=prepared['prompt_tokens']) as span:
+            # Reuse a cached response for an identical request
+            analysis = self.cache.get(self.model, prompt, ANSWER_MAX_TOKENS, 0.2) if self.cache else None
+            if analysis is not None:
+                span.set(cached=True, response_chars=len(analysis))
+                result = self._build_result(prepared, analysis)
+                writer.write_cluster(result)
+                return result
             
-            if response.status_code == 200:
-                result = response.json()
-                analysis = result['choices'][0]['text']
+            # Call the API
+            self.last_request_sent = True
+            chunks = []
+            try:
+                for chunk in stream_completion(
+                    self.base_url,
+                    self.headers,
+                    {
+                        "model": self.model,
+                        "prompt": prompt,
+                        "max_tokens": ANSWER_MAX_TOKENS,
+                        "temperature": 0.2
+                    },
+                    timeout=60
+                ):
+                    if not chunks:
+                        writer.begin_cluster(prepared)
+                    chunks.append(chunk)
+                    writer.write_analysis(chunk)
+            except CompletionError as e:
+                if not chunks:
+                    raise
+                interrupted = f"Stream interrupted: {str(e)}"
+                writer.write_analysis(f"\n\n[{interrupted}]")
+                result = self._build_result(prepared, "".join(chunks))
+                result['error'] = interrupted
+                span.set(error=type(e).__name__)
             else:
-                analysis = f"Error: {response.status_code}\n{response.text}"
-        except Exception as e:
-            analysis = f"Exception during API call: {str(e)}"
+                analysis = "".join(chunks)
+                if not chunks:
+                    writer.begin_cluster(prepared)
+                if self.cache:
+                    self.cache.put(self.model, prompt, ANSWER_MAX_TOKENS, 0.2, analysis)
+                result = self._build_result(prepared, analysis)
+            span.set(cached=False, response_chars=len(result['analysis']), chunks=len(chunks))
+        
+        writer.end_cluster(result)
+        return result
+    
+    def _compact_result(self, result: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Keep the fields the report reads, dropping patterns and relationships.
+        """
+        return {field: result[field] for field in REPORT_FIELDS if field in result}
+    
+    def _summarize_result(self, result: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Keep the fields the report summary needs, dropping analysis text and patterns.
+        """
+        return {key: result[key] for key in ('cluster_id', 'category', 'file_count', 'prompt_tokens', 'error')
+                if key in result}
+    
+    async def complete_cluster_async(self, prepared: Dict[str, Any], client: AsyncCompletionClient) -> Dict[str, Any]:
+        """
+        Async variant of complete_cluster using a shared AsyncCompletionClient.
         
-        # Return the results
-        return {
-            "cluster_id": cluster_id,
-            "category": category,
+        Args:
+            prepared: Output of prepare_cluster
+            client: Client providing connection pooling and rate limiting
+            
+        Returns:
+            Dictionary with analysis results
+        """
+        try:
+            return await self._complete_cluster_once_async(prepared, client)
+        except CompletionError as e:
+            return self._build_result(prepared, str(e))
+    
+    async def _complete_cluster_once_async(self, prepared: Dict[str, Any],
+                                           client: AsyncCompletionClient) -> Dict[str, Any]:
+        """
+        Complete a prepared cluster, raising CompletionError once the client gives up.
+        """
+        if 'error' in prepared:
+            return prepared
+        
+        prompt = prepared['prompt']
+        with self.tracer.span('completion', cluster_id=prepared['cluster_id'], mode='async',
+                              prompt_chars=len(prompt), prompt_tokens=prepared['prompt_tokens']) as span:
+            analysis = await client.request(prompt, max_tokens=ANSWER_MAX_TOKENS, temperature=0.2)
+            span.set(response_chars=len(analysis))
+        return self._build_result(prepared, analysis)
+    
+    def _build_result(self, prepared: Dict[str, Any], analysis: str) -> Dict[str, Any]:
+        """
+        Combine a prepared cluster with its API analysis.
+        
+        Args:
+            prepared: Output of prepare_cluster
+            analysis: Completion text or error message
+            
+        Returns:
+            Dictionary with analysis results
+        """
+        result = {
+            "cluster_id": prepared['cluster_id'],
+            "category": prepared['category'],
             "analysis": analysis,
-            "file_count": len(ast_files),
-            "patterns": patterns,
-            "flow_chart": flow_chart,
-            "relationships": relationships_data,
-            "file_sample": [file_data['filename'] for file_data in ast_files[:5]]  # First 5 files as sample
+            "file_count": prepared['file_count'],
+            "patterns": prepared['patterns'],
+            "flow_chart": prepared['flow_chart'],
+            "relationships": prepared['relationships'],
+            "file_sample": prepared['file_sample'],
+            "prompt_tokens": prepared['prompt_tokens']
         }
+        if 'peak_memory_mb' in prepared:
+            result['peak_memory_mb'] = prepared['peak_memory_mb']
+        return result
+    
+    def analyze_cluster(self, cluster_id: str, ast_dir: str, max_files: Optional[int] = None) -> Dict[str, Any]:
+        """
+        Analyze a single cluster using the Fireworks.ai API.
+        
+        Args:
+            cluster_id: ID of the cluster to analyze
+            ast_dir: Base directory containing AST files
+            max_files: Maximum number of files to analyze
+            
+        Returns:
+            Dictionary with analysis results
+        """
+        return self.complete_cluster(self.prepare_cluster(cluster_id, ast_dir, max_files))
     
     def analyze_multiple_clusters(self, cluster_ids: List[str], ast_dir: str, 
-                                max_files: Optional[int] = None) -> List[Dict[str, Any]]:
+                                max_files: Optional[int] = None, workers: int = 1,
+                                report_writer: Optional[StreamingReportWriter] = None,
+                                checkpoint: Optional[RunCheckpoint] = None,
+                                batch_tokens: int = 0) -> List[Dict[str, Any]]:
         """
         Analyze multiple clusters and store the results.
         
+        With workers > 1 the local stages run in a process pool across
+        clusters. Prepared clusters are sent to the API in completion order,
+        and the results are stored in the order of cluster_ids. Throttled or
+        failed requests are retried by a RetryScheduler without holding up
+        the other clusters.
+        
+        With a report_writer, completions are streamed and each cluster's
+        section is appended to the report as it arrives. Only result
+        summaries are kept in memory in that case.
+        
+        With a checkpoint, each successful analysis is recorded as soon as it
+        finishes and clusters already recorded for the same inputs are skipped.
+        
+        With batch_tokens > 0, small clusters are packed into shared requests
+        of up to batch_tokens prompt tokens (see _complete_batch_once).
+        Clusters whose answers cannot be split out of a batch response are
+        then sent on their own.
+        
         Args:
             cluster_ids: List of cluster IDs to analyze
             ast_dir: Base directory containing AST files
             max_files: Maximum number of files to analyze per cluster
+            workers: Number of processes for the local stages
+            report_writer: Streaming report to append clusters to
+            checkpoint: Checkpoint to resume from and record results in
+            batch_tokens: Prompt token limit for batched requests (0 disables batching)
             
         Returns:
-            List of analysis results
+            List of analysis results (summaries when streaming)
         """
         self.results = []
-        for cluster_id in cluster_ids:
+        completed, pending, keys = self._restore_from_checkpoint(cluster_ids, ast_dir, max_files, checkpoint,
+                                                                 batch_tokens)
+        if report_writer is not None:
+            for _, result in completed:
+                report_writer.write_cluster(result)
+            completed = [(position, self._summarize_result(result)) for position, result in completed]
+        
+        if workers > 1 and pending:
+            executor = ProcessPoolExecutor(max_workers=workers)
+            futures = {
+                executor.submit(_prepare_cluster_in_worker, self._worker_options(), cluster_id, ast_dir, max_files):
+                    (position, cluster_id)
+                for position, cluster_id in pending
+            }
+            prepared_clusters = self._iter_completed_preparations(futures)
+        else:
+            executor = None
+            prepared_clusters = (
+                (position, self.prepare_cluster(cluster_id, ast_dir, max_files))
+                for position, cluster_id in pending
+            )
+        
+        def attempt(item: Tuple[int, Dict[str, Any]]) -> Tuple[int, Dict[str, Any]]:
+            position, prepared = item
+            print(f"Analyzing cluster {prepared['cluster_id']}...")
+            try:
+                if report_writer is not None:
+                    result = self._stream_cluster_once(prepared, report_writer)
+                else:
+                    result = self._complete_cluster_once(prepared)
+            finally:
+                # Add a delay to avoid API rate limits
+                if self.last_request_sent:
+                    time.sleep(2)
+            return finish(position, result)
+        
+        def finish(position: int, result: Dict[str, Any]) -> Tuple[int, Dict[str, Any]]:
+            if checkpoint is not None and 'error' not in result:
+                checkpoint.record(keys[position], result)
+            if report_writer is not None:
+                result = self._summarize_result(result)
+            elif self.max_memory_mb is not None:
+                result = self._compact_result(result)
+            return position, result
+        
+        def give_up(item: Tuple[int, Dict[str, Any]], error: CompletionError) -> Tuple[int, Dict[str, Any]]:
+            position, prepared = item
+            result = self._build_result(prepared, str(error))
+            if report_writer is not None:
+                report_writer.write_cluster(result)
+                return position, self._summarize_result(result)
+            if self.max_memory_mb is not None:
+                return position, self._compact_result(result)
+            return position, result
+        
+        # Clusters that could not be split out of a batch response
+        unbatched = []
+        
+        def attempt_batch(batch: List[Tuple[int, Dict[str, Any]]]) -> List[Tuple[int, Dict[str, Any]]]:
+            if len(batch) == 1:
+                return [attempt(batch[0])]
+            
+            print(f"Analyzing clusters {', '.join(str(prepared['cluster_id']) for _, prepared in batch)} in one request...")
+            try:
+                answers = self._complete_batch_once([prepared for _, prepared in batch])
+            finally:
+                if self.last_request_sent:
+                    time.sleep(2)
+            
+            done = []
+            for position, prepared in batch:
+                if prepared['cluster_id'] in answers:
+                    result = self._build_result(prepared, answers[prepared['cluster_id']])
+                    if report_writer is not None:
+                        report_writer.write_cluster(result)
+                    done.append(finish(position, result))
+                else:
+                    unbatched.append((position, prepared))
+            return done
+        
+        def give_up_batch(batch: List[Tuple[int, Dict[str, Any]]],
+                          error: CompletionError) -> List[Tuple[int, Dict[str, Any]]]:
+            if len(batch) == 1:
+                return [give_up(batch[0], error)]
+            # Fall back to one request per cluster
+            unbatched.extend(batch)
+            return []
+        
+        # Throttled clusters are requeued behind the remaining work
+        scheduler = self.new_retry_scheduler()
+        try:
+            if batch_tokens > 0:
+                batches = self._pack_batches(prepared_clusters, batch_tokens)
+                for _, batch_results in scheduler.run(batches, attempt_batch, give_up_batch):
+                    completed += batch_results
+                prepared_clusters = unbatched
+            completed += [position_result for _, position_result in
+                          scheduler.run(prepared_clusters, attempt, give_up)]
+        finally:
+            if executor is not None:
+                executor.shutdown()
+        
+        self.results = [result for _, result in sorted(completed, key=lambda item: item[0])]
+        return self.results
+    
+    def _pack_batches(self, prepared_clusters: Iterable[Tuple[int, Dict[str, Any]]],
+                      batch_tokens: int) -> Iterator[List[Tuple[int, Dict[str, Any]]]]:
+        """
+        Group prepared clusters into batches of at most batch_tokens prompt tokens.
+        
+        Clusters are packed greedily in arrival order, and no batch holds
+        more answers of ANSWER_MAX_TOKENS than fit in max_output_tokens.
+        Clusters whose prompt takes more than half the limit, and clusters
+        that failed locally, are yielded on their own.
+        
+        Args:
+            prepared_clusters: (position, prepared cluster) pairs
+            batch_tokens: Prompt token limit per batch
+            
+        Yields:
+            Lists of (position, prepared cluster) pairs
+        """
+        max_clusters = max(1, self.max_output_tokens // ANSWER_MAX_TOKENS)
+        batch = []
+        batch_size = 0
+        for item in prepared_clusters:
+            prepared = item[1]
+            tokens = prepared.get('prompt_tokens')
+            if 'error' in prepared or tokens is None or tokens > batch_tokens // 2:
+                yield [item]
+                continue
+            
+            if batch and (batch_size + tokens > batch_tokens or len(batch) >= max_clusters):
+                yield batch
+                batch = []
+                batch_size = 0
+            batch.append(item)
+            batch_size += tokens
+        
+        if batch:
+            yield batch
+    
+    def _complete_batch_once(self, batch: List[Dict[str, Any]]) -> Dict[str, str]:
+        """
+        Answer several prepared clusters with a single completion request.
+        
+        Cached answers are reused, and the remaining prompts are sent together.
+        Each answer split out of the response is cached under its cluster's
+        own prompt.
+        
+        Args:
+            batch: Prepared clusters
+            
+        Returns:
+            Dictionary mapping cluster IDs to analyses (clusters whose answer
+            could not be found in the response are missing)
+            
+        Raises:
+            RetryableError: If the request was throttled or hit a transient error
+            CompletionError: If the request failed otherwise
+        """
+        self.last_request_sent = False
+        answers = {}
+        uncached = []
+        for prepared in batch:
+            cached = self.cache.get(self.model, prepared['prompt'], ANSWER_MAX_TOKENS, 0.2) if self.cache else None
+            if cached is not None:
+                answers[prepared['cluster_id']] = cached
+            else:
+                uncached.append(prepared)
+        
+        if not uncached:
+            return answers
+        
+        # Call the API
+        self.last_request_sent = True
+        prompt = self._generate_batch_prompt(uncached)
+        with self.tracer.span('batch_completion', clusters=[prepared['cluster_id'] for prepared in uncached],
+                              prompt_chars=len(prompt), prompt_tokens=estimate_tokens(prompt)) as span:
+            response = post_completion(
+                self.base_url,
+                self.headers,
+                {
+                    "model": self.model,
+                    "prompt": prompt,
+                    "max_tokens": min(ANSWER_MAX_TOKENS * len(uncached), self.max_output_tokens),
+                    "temperature": 0.2
+                },
+                timeout=60 * len(uncached)
+            )
+            span.set(response_chars=len(response))
+        
+        split = self._split_batch_response(response, [prepared['cluster_id'] for prepared in uncached])
+        for prepared in uncached:
+            analysis = split.get(prepared['cluster_id'])
+            if analysis is None:
+                continue
+            answers[prepared['cluster_id']] = analysis
+            if self.cache:
+                self.cache.put(self.model, prepared['prompt'], ANSWER_MAX_TOKENS, 0.2, analysis)
+        return answers
+    
+    def _generate_batch_prompt(self, batch: List[Dict[str, Any]]) -> str:
+        """
+        Combine several cluster prompts into one request with delimited answers.
+        """
+        prompt = f"""
+You will receive {len(batch)} independent analysis tasks, one per AST cluster. Complete every task.
+
+Start the answer to each task with a line containing only "{BATCH_ANSWER_MARKER.format('<cluster id>')}", using the cluster ID given in the task heading, and write that task's full answer below it. Do not use this marker line anywhere else.
+"""
+        for prepared in batch:
+            prompt += f"\n{BATCH_TASK_HEADING.format(prepared['cluster_id'])}\n{prepared['prompt']}"
+        return prompt
+    
+    def _split_batch_response(self, response: str, cluster_ids: List[str]) -> Dict[str, str]:
+        """
+        Split a batch response into per-cluster answers at the answer markers.
+        
+        When a marker appears more than once (e.g. in reasoning before the
+        answers), the last occurrence is used.
+        
+        Args:
+            response: Completion text for a batch prompt
+            cluster_ids: IDs of the clusters in the batch
+            
+        Returns:
+            Dictionary mapping cluster IDs to non-empty answers
+        """
+        wanted = {str(cluster_id): cluster_id for cluster_id in cluster_ids}
+        matches = list(BATCH_ANSWER_PATTERN.finditer(response))
+        
+        answers = {}
+        for i, match in enumerate(matches):
+            cluster_id = wanted.get(match.group(1).strip())
+            if cluster_id is None:
+                continue
+            end = matches[i + 1].start() if i + 1 < len(matches) else len(response)
+            answer = response[match.end():end].strip()
+            if answer:
+                answers[cluster_id] = answer
+        return answers
+    
+    def _restore_from_checkpoint(self, cluster_ids: List[str], ast_dir: str, max_files: Optional[int],
+                                 checkpoint: Optional[RunCheckpoint],
+                                 batch_tokens: int = 0) -> Tuple[List[Tuple[int, Dict[str, Any]]],
+                                                                 List[Tuple[int, str]], Dict[int, str]]:
+        """
+        Split clusters into ones already finished in the checkpoint and ones still to analyze.
+        
+        Args:
+            cluster_ids: List of cluster IDs to analyze
+            ast_dir: Base directory containing AST files
+            max_files: Maximum number of files to analyze per cluster
+            checkpoint: Checkpoint of earlier runs (None analyzes everything)
+            batch_tokens: Prompt token limit for batched requests (0 disables batching)
+            
+        Returns:
+            Tuple of (position, stored result) pairs, (position, cluster ID)
+            pairs still to analyze, and checkpoint keys by position
+        """
+        restored = []
+        pending = []
+        keys = {}
+        for position, cluster_id in enumerate(cluster_ids):
+            if checkpoint is not None:
+                cluster_dir = os.path.join(ast_dir, f"cluster_{cluster_id}")
+                keys[position] = cluster_key(self.model, cluster_id, cluster_dir, max_files,
+                                             self._checkpoint_settings(batch_tokens))
+                stored = checkpoint.get(keys[position])
+                if stored is not None:
+                    print(f"Skipping cluster {cluster_id} (already in checkpoint)")
+                    restored.append((position, stored))
+                    continue
+            pending.append((position, cluster_id))
+        return restored, pending, keys
+    
+    def _iter_completed_preparations(self, futures: Dict[Any, Tuple[int, str]]):
+        """
+        Yield (position, prepared cluster) pairs as process-pool futures complete.
+        
+        Args:
+            futures: Mapping of futures to (position, cluster ID)
+        """
+        for future in as_completed(futures):
+            position, cluster_id = futures[future]
+            try:
+                prepared = future.result()
+                self.tracer.add_records(prepared.pop('spans', []))
+            except Exception as e:
+                prepared = {
+                    "cluster_id": cluster_id,
+                    "error": f"Local analysis failed: {str(e)}"
+                }
+            yield position, prepared
+    
+    def _checkpoint_settings(self, batch_tokens: int = 0) -> Dict[str, Any]:
+        """
+        Options besides the model and max_files that change a cluster's result (see cluster_key).
+        
+        Args:
+            batch_tokens: Prompt token limit for batched requests (0 disables batching)
+        """
+        return {
+            'dedup_threshold': self.dedup_threshold,
+            'prompt_token_budget': self.prompt_token_budget,
+            'batch_tokens': batch_tokens,
+            'max_output_tokens': self.max_output_tokens if batch_tokens > 0 else None,
+            'statements_only': self.statements_only,
+            'collectors': sorted(self.collector_factories)
+        }
+    
+    def _worker_options(self) -> Dict[str, Any]:
+        """
+        Settings a process-pool worker needs to prepare clusters like this analyzer.
+        """
+        return {
+            'use_store': self.use_store,
+            'collector_factories': self.collector_factories,
+            'prompt_token_budget': self.prompt_token_budget,
+            'max_memory_mb': self.max_memory_mb,
+            'dedup_threshold': self.dedup_threshold,
+            'intern_subtrees': self.intern_subtrees,
+            'intern_max_entries': self.intern_max_entries,
+            'statements_only': self.statements_only,
+            'trace': self.tracer.enabled
+        }
+    
+    def new_retry_scheduler(self) -> RetryScheduler:
+        """
+        Create the retry scheduler (and its retry budget) for one run.
+        """
+        return RetryScheduler(max_attempts=self.max_attempts, retry_budget=self.retry_budget)
+    
+    async def analyze_multiple_clusters_async(self, cluster_ids: List[str], ast_dir: str,
+                                              max_files: Optional[int] = None, workers: int = 1,
+                                              max_concurrency: int = 4,
+                                              requests_per_minute: Optional[float] = 60,
+                                              tokens_per_minute: Optional[float] = None,
+                                              checkpoint: Optional[RunCheckpoint] = None) -> List[Dict[str, Any]]:
+        """
+        Analyze multiple clusters with several API requests in flight.
+        
+        Local stages run in a process pool (workers > 1) or a single
+        background thread, and each prepared cluster is sent to the API as
+        soon as it is ready. Pacing comes from the client's token buckets
+        rather than fixed sleeps. Results are stored in the order of cluster_ids.
+        
+        Args:
+            cluster_ids: List of cluster IDs to analyze
+            ast_dir: Base directory containing AST files
+            max_files: Maximum number of files to analyze per cluster
+            workers: Number of processes for the local stages
+            max_concurrency: Maximum number of API requests in flight
+            requests_per_minute: Request rate limit (None to disable)
+            tokens_per_minute: Token rate limit (None to disable)
+            checkpoint: Checkpoint to resume from and record results in
+            
+        Returns:
+            List of analysis results
+        """
+        client = AsyncCompletionClient(
+            self.api_key, self.model, base_url=self.base_url, max_concurrency=max_concurrency,
+            requests_per_minute=requests_per_minute, tokens_per_minute=tokens_per_minute,
+            cache=self.cache, retry=self.new_retry_scheduler()
+        )
+        loop = asyncio.get_running_loop()
+        if workers > 1:
+            executor = ProcessPoolExecutor(max_workers=workers)
+        else:
+            executor = ThreadPoolExecutor(max_workers=1)
+        
+        async def run(position: int, cluster_id: str) -> Tuple[int, Dict[str, Any]]:
+            try:
+                if workers > 1:
+                    prepared = await loop.run_in_executor(
+                        executor, _prepare_cluster_in_worker, self._worker_options(), cluster_id, ast_dir, max_files
+                    )
+                    self.tracer.add_records(prepared.pop('spans', []))
+                else:
+                    prepared = await loop.run_in_executor(
+                        executor, self.prepare_cluster, cluster_id, ast_dir, max_files
+                    )
+            except Exception as e:
+                prepared = {
+                    "cluster_id": cluster_id,
+                    "error": f"Local analysis failed: {str(e)}"
+                }
+            
             print(f"Analyzing cluster {cluster_id}...")
-            result = self.analyze_cluster(cluster_id, ast_dir, max_files)
-            self.results.append(result)
-            # Add a delay to avoid API rate limits
-            time.sleep(2)
+            try:
+                result = await self._complete_cluster_once_async(prepared, client)
+            except CompletionError as e:
+                result = self._build_result(prepared, str(e))
+            else:
+                if checkpoint is not None and 'error' not in result:
+                    checkpoint.record(keys[position], result)
+            
+            if self.max_memory_mb is not None:
+                result = self._compact_result(result)
+            return position, result
         
+        completed, pending, keys = self._restore_from_checkpoint(cluster_ids, ast_dir, max_files, checkpoint)
+        try:
+            tasks = [run(position, cluster_id) for position, cluster_id in pending]
+            for next_done in asyncio.as_completed(tasks):
+                completed.append(await next_done)
+        finally:
+            executor.shutdown()
+            client.close()
+        
+        self.results = [result for _, result in sorted(completed, key=lambda item: item[0])]
         return self.results
     
-    def compile_report(self, output_file: str = "ast_analysis_report.md") -> str:
+    def compile_report(self, output_file: str = "ast_analysis_report.md",
+                       checkpoint_path: Optional[str] = None) -> str:
         """
         Compile a comprehensive report of the analysis results.
         
         Args:
             output_file: File path to save the report
+            checkpoint_path: Checkpoint to build the report from when there are no results in memory
             
         Returns:
             Path to the saved report file
         """
+        if not self.results and checkpoint_path:
+            self.results = RunCheckpoint.load_results(checkpoint_path)
+        
         if not self.results:
             return "No results to compile. Run analyze_multiple_clusters first."
         
@@ -632,6 +1591,11 @@ Provide specific technical details where possible, focusing on identifying the m
             f.write("## Summary\n\n")
             f.write(f"Total Clusters Analyzed: {len(self.results)}\n\n")
             
+            if self.cache:
+                stats = self.cache.stats()
+                f.write(f"Response Cache: {stats['hits']} hits, {stats['misses']} misses, "
+                        f"{stats['evictions']} evictions ({stats['entries']} entries)\n\n")
+            
             # Write category distribution
             categories = {}
             for result in self.results:
@@ -652,12 +1616,18 @@ Provide specific technical details where possible, focusing on identifying the m
                 cluster_id = result.get('cluster_id', 'Unknown')
                 category = result.get('category', 'Unknown')
                 file_count = result.get('file_count', 0)
+                prompt_tokens = result.get('prompt_tokens')
+                peak_memory_mb = result.get('peak_memory_mb')
                 file_sample = result.get('file_sample', [])
                 analysis = result.get('analysis', '')
                 flow_chart = result.get('flow_chart', '')
                 
                 f.write(f"### Cluster {cluster_id} ({category})\n\n")
                 f.write(f"Files: {file_count}\n\n")
+                if prompt_tokens:
+                    f.write(f"Prompt Tokens (estimated): {prompt_tokens}\n\n")
+                if peak_memory_mb is not None:
+                    f.write(f"Peak Memory (traced): {peak_memory_mb} MB\n\n")
                 
                 if file_sample:
                     f.write("Sample Files:\n")
@@ -675,33 +1645,173 @@ Provide specific technical details where possible, focusing on identifying the m
                 
                 f.write("---\n\n")
             
+            # Where the time went, per stage (only when tracing)
+            timing_table = self.tracer.timing_table()
+            if timing_table:
+                f.write("\n## Stage Timing\n\n")
+                f.write(timing_table)
+            
             f.write("\n## Conclusion\n\n")
             f.write("This report provides an analysis of AST clusters, identifying common patterns, data sinks, and data flow within each cluster.\n")
         
         print(f"Report saved to {output_file}")
         return output_file
 
+def _prepare_cluster_in_worker(options: Dict[str, Any], cluster_id: str, ast_dir: str,
+                               max_files: Optional[int]) -> Dict[str, Any]:
+    """
+    Process-pool entry point for ASTClusterAnalyzer.prepare_cluster.
+    
+    When tracing, the worker's spans are returned under 'spans' for the
+    parent's tracer to record.
+    
+    Args:
+        options: Output of ASTClusterAnalyzer._worker_options
+        cluster_id: ID of the cluster to prepare
+        ast_dir: Base directory containing AST files
+        max_files: Maximum number of files to analyze
+    """
+    tracer = Tracer() if options['trace'] else None
+    analyzer = ASTClusterAnalyzer(api_key='', use_store=options['use_store'],
+                                  prompt_token_budget=options['prompt_token_budget'],
+                                  tracer=tracer, max_memory_mb=options['max_memory_mb'],
+                                  dedup_threshold=options['dedup_threshold'],
+                                  intern_subtrees=options['intern_subtrees'],
+                                  statements_only=options['statements_only'],
+                                  intern_max_entries=options['intern_max_entries'])
+    analyzer.collector_factories.update(options['collector_factories'])
+    prepared = analyzer.prepare_cluster(cluster_id, ast_dir, max_files)
+    if tracer is not None:
+        prepared['spans'] = tracer.drain()
+    return prepared
+
 def main():
     parser = argparse.ArgumentParser(description='Analyze AST clusters using Fireworks.ai API')
-    parser.add_argument('--api-key', required=True, help='Fireworks.ai API key')
+    parser.add_argument('--api-key', help='Fireworks.ai API key')
     parser.add_argument('--ast-dir', default='AST_v2', help='Directory containing AST files')
-    parser.add_argument('--clusters', required=True, help='Comma-separated list of cluster IDs to analyze')
+    parser.add_argument('--clusters', help='Comma-separated list of cluster IDs to analyze')
     parser.add_argument('--max-files', type=int, default=None, help='Maximum number of files to analyze per cluster')
     parser.add_argument('--output', default='ast_analysis_report.md', help='Output file for the report')
+    parser.add_argument('--no-store', action='store_true', help='Ignore columnar AST stores and parse the JSON files')
+    parser.add_argument('--workers', type=int, default=1, help='Number of processes for the local analysis stages')
+    parser.add_argument('--concurrency', type=int, default=0,
+                        help='Number of API requests in flight (enables the async client; 0 keeps sequential requests)')
+    parser.add_argument('--rpm', type=float, default=60, help='Requests per minute limit for the async client')
+    parser.add_argument('--tpm', type=float, default=None, help='Tokens per minute limit for the async client')
+    parser.add_argument('--cache-file', default=DEFAULT_CACHE_PATH, help='SQLite file for cached API responses')
+    parser.add_argument('--no-cache', action='store_true', help='Always call the API instead of using cached responses')
+    parser.add_argument('--cache-max-entries', type=int, default=None,
+                        help='Evict least recently used cached responses beyond this many entries')
+    parser.add_argument('--cache-max-bytes', type=int, default=None,
+                        help='Evict least recently used cached responses beyond this total size in bytes')
+    parser.add_argument('--cache-ttl', type=float, default=None, metavar='SECONDS',
+                        help='Expire cached responses after this many seconds')
+    parser.add_argument('--max-attempts', type=int, default=5, help='Maximum API attempts per cluster')
+    parser.add_argument('--retry-budget', type=int, default=50, help='Total API retries allowed per run')
+    parser.add_argument('--prompt-budget', type=int, default=DEFAULT_PROMPT_TOKEN_BUDGET,
+                        help='Maximum estimated tokens per analysis prompt')
+    parser.add_argument('--batch-tokens', type=int, default=0,
+                        help='Pack small clusters into shared requests of up to this many prompt tokens (0 disables)')
+    parser.add_argument('--max-output-tokens', type=int, default=DEFAULT_MAX_OUTPUT_TOKENS,
+                        help='Completion token limit of the model; caps batched requests and their size')
+    parser.add_argument('--stream', action='store_true',
+                        help='Stream completions and append each cluster to the report (and a .jsonl sidecar) as it arrives')
+    
+    parser.add_argument('--checkpoint', nargs='?', const=DEFAULT_CHECKPOINT_PATH, default=None,
+                        help=f'Record each finished cluster in this JSONL file (default {DEFAULT_CHECKPOINT_PATH} '
+                             f'when given without a path; off unless given)')
+    parser.add_argument('--resume', action='store_true',
+                        help='Skip clusters already in the checkpoint for the same inputs and model')
+    parser.add_argument('--fresh', action='store_true',
+                        help='Discard the results in an existing checkpoint and start over')
+    parser.add_argument('--report-only', action='store_true',
+                        help='Compile the report from the checkpoint without calling the API')
+    parser.add_argument('--max-memory', type=float, default=None, metavar='MB',
+                        help='Process ASTs one file at a time, keep only report fields and warn about '
+                             'clusters whose peak allocation exceeds this many MB')
+    parser.add_argument('--trace', default=None,
+                        help='Write per-stage spans as JSONL to this file and add a timing table to the report')
+    parser.add_argument('--dedup', type=float, default=None, metavar='THRESHOLD',
+                        help='Collapse near-duplicate files (estimated Jaccard similarity of node-type shingles '
+                             'at least THRESHOLD, e.g. 0.9) into one representative before analysis')
+    parser.add_argument('--intern', action='store_true',
+                        help='Share identical AST subtrees between the JSON files of all clusters and walk '
+                             'each shared subtree once')
+    parser.add_argument('--intern-max-entries', type=int, default=DEFAULT_INTERNER_MAX_ENTRIES,
+                        help='With --intern, distinct subtrees kept between clusters; the least recently '
+                             f'used are forgotten beyond this (default {DEFAULT_INTERNER_MAX_ENTRIES})')
+    parser.add_argument('--statements-only', action='store_true',
+                        help='Skip call-site collection and parse only the top-level statements the analysis '
+                             'needs, using per-file byte-offset indexes (*.ast.json.index)')
     
     args = parser.parse_args()
+    if (args.resume or args.fresh or args.report_only) and not args.checkpoint:
+        parser.error('--resume, --fresh and --report-only need --checkpoint')
+    if args.report_only:
+        ASTClusterAnalyzer(api_key='', cache_path=None).compile_report(args.output, args.checkpoint)
+        return
+    if not args.api_key or not args.clusters:
+        parser.error('--api-key and --clusters are required unless --report-only is given')
+    if args.stream and args.concurrency > 0:
+        parser.error('--stream writes one cluster at a time and cannot be combined with --concurrency')
+    if args.batch_tokens and args.concurrency > 0:
+        parser.error('--batch-tokens applies to sequential requests and cannot be combined with --concurrency')
     
     # Create analyzer
-    analyzer = ASTClusterAnalyzer(api_key=args.api_key)
+    analyzer = ASTClusterAnalyzer(api_key=args.api_key, use_store=not args.no_store,
+                                  cache_path=None if args.no_cache else args.cache_file,
+                                  max_attempts=args.max_attempts, retry_budget=args.retry_budget,
+                                  prompt_token_budget=args.prompt_budget,
+                                  tracer=Tracer(args.trace) if args.trace else None,
+                                  max_memory_mb=args.max_memory, dedup_threshold=args.dedup,
+                                  intern_subtrees=args.intern, intern_max_entries=args.intern_max_entries,
+                                  statements_only=args.statements_only,
+                                  cache_max_entries=args.cache_max_entries, cache_max_bytes=args.cache_max_bytes,
+                                  cache_ttl=args.cache_ttl, max_output_tokens=args.max_output_tokens)
     
     # Parse cluster IDs
     cluster_ids = args.clusters.split(',')
     
+    if args.resume and args.fresh:
+        parser.error('--resume and --fresh cannot be combined')
+    checkpoint = None
+    if args.checkpoint:
+        try:
+            checkpoint = RunCheckpoint(args.checkpoint, resume=args.resume, fresh=args.fresh)
+        except FileExistsError as e:
+            parser.error(f"{e}; pass --resume to continue it or --fresh to discard it")
+    
     # Analyze clusters
-    analyzer.analyze_multiple_clusters(cluster_ids, args.ast_dir, args.max_files)
+    try:
+        if args.concurrency > 0:
+            asyncio.run(analyzer.analyze_multiple_clusters_async(
+                cluster_ids, args.ast_dir, args.max_files, args.workers,
+                max_concurrency=args.concurrency, requests_per_minute=args.rpm, tokens_per_minute=args.tpm,
+                checkpoint=checkpoint
+            ))
+        elif args.stream:
+            writer = StreamingReportWriter(args.output)
+            try:
+                results = analyzer.analyze_multiple_clusters(cluster_ids, args.ast_dir, args.max_files,
+                                                             args.workers, report_writer=writer,
+                                                             checkpoint=checkpoint, batch_tokens=args.batch_tokens)
+            except BaseException:
+                writer.close()
+                raise
+            writer.finish(results, analyzer.cache.stats() if analyzer.cache else None,
+                          analyzer.tracer.timing_table())
+            analyzer.tracer.close()
+            return
+        else:
+            analyzer.analyze_multiple_clusters(cluster_ids, args.ast_dir, args.max_files, args.workers,
+                                               checkpoint=checkpoint, batch_tokens=args.batch_tokens)
+    finally:
+        if checkpoint is not None:
+            checkpoint.close()
     
     # Compile report
     analyzer.compile_report(args.output)
+    analyzer.tracer.close()
 
 if __name__ == '__main__':
     main()
\ No newline at end of file